@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv, find_dotenv
 
 # Load environment variables from .env file
@@ -12,9 +13,18 @@ TEST_DB_URL = os.getenv('TEST_DB_URL')
 # Environment flag
 HOME_DB = os.getenv('HOME_DB', False)
 
+# Worker processes serving the app; uvicorn starts WEB_CONCURRENCY workers when --workers is not given. State kept in
+# a worker's memory is not seen by the others
+WORKERS = int(os.getenv('WEB_CONCURRENCY', 1))
+
 # Base directory and main photo folder
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MAIN_PHOTO_FOLDER = os.path.join(BASE_DIR, 'img')
+# Served when a photo is not found; a file of MAIN_PHOTO_FOLDER itself
+DEFAULT_PHOTO = os.getenv('DEFAULT_PHOTO', 'default_cafe_04.jpeg')
+# Keep the in-memory image catalogue up to date by watching MAIN_PHOTO_FOLDER; otherwise it is re-scanned
+# every IMAGE_CACHE_TTL seconds
+IMAGE_WATCH_ENABLED = os.getenv('IMAGE_WATCH_ENABLED', 'true').lower() == 'true'
 
 # MIME types for image files
 MIME_TYPES = {
@@ -25,4 +35,174 @@ MIME_TYPES = {
     "bmp": "image/bmp",
     "tiff": "image/tiff",
     "webp": "image/webp",
-}
\ No newline at end of file
+}
+
+# Kitchen queue long-polling: how often a waiting screen re-checks the database
+# (changes made by other workers are only seen on these re-checks) and the longest wait a client may ask for
+KITCHEN_POLL_INTERVAL = float(os.getenv('KITCHEN_POLL_INTERVAL', 2.0))
+KITCHEN_MAX_WAIT = float(os.getenv('KITCHEN_MAX_WAIT', 30.0))
+
+# Seconds the in-memory restaurant directory (/all_restaurants) is served before it is re-synced with the database
+RESTAURANT_DIRECTORY_TTL = float(os.getenv('RESTAURANT_DIRECTORY_TTL', 60.0))
+
+# Seconds a restaurant's menu stays in the per-worker menu cache
+MENU_CACHE_TTL = float(os.getenv('MENU_CACHE_TTL', 60.0))
+
+# Dish search backend: "memory" (inverted index built from the cached menu) or "postgres" (tsvector + GIN index)
+DISH_SEARCH_BACKEND = os.getenv('DISH_SEARCH_BACKEND', 'memory')
+
+# Per-worker cache of photo bytes: total size limit and seconds before a cached file is re-read
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+IMAGE_CACHE_TTL = float(os.getenv('IMAGE_CACHE_TTL', 300.0))
+
+# Image bundles (all photos of a menu in one file, /images/bundle) are built once and kept in IMAGE_BUNDLE_DIR,
+# shared by the workers of a host. With Pillow installed, photos larger than IMAGE_BUNDLE_THUMBNAIL_SIZE pixels
+# are downscaled (0 keeps the originals). A bundle is removed an hour after a newer version replaced it, so clients
+# may cache a manifest for IMAGE_BUNDLE_MANIFEST_MAX_AGE seconds only, well below that.
+IMAGE_BUNDLE_DIR = os.getenv('IMAGE_BUNDLE_DIR', os.path.join(tempfile.gettempdir(), 'cafe-image-bundles'))
+IMAGE_BUNDLE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_BUNDLE_THUMBNAIL_SIZE', 320))
+IMAGE_BUNDLE_MANIFEST_MAX_AGE = int(os.getenv('IMAGE_BUNDLE_MANIFEST_MAX_AGE', 60))
+
+# Startup warm-up: fill the connection pool, prepare the hot statements and preload the menus and images of
+# the best rated restaurants before the worker is reported ready. With WARMUP_BLOCKING the worker does not accept
+# traffic until warm-up is done; otherwise it runs in the background and /ready answers 503 meanwhile.
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_BLOCKING = os.getenv('WARMUP_BLOCKING', 'true').lower() == 'true'
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 30.0))
+WARMUP_POOL_CONNECTIONS = int(os.getenv('WARMUP_POOL_CONNECTIONS', 10))
+WARMUP_TOP_RESTAURANTS = int(os.getenv('WARMUP_TOP_RESTAURANTS', 20))
+WARMUP_IMAGES = int(os.getenv('WARMUP_IMAGES', 500))
+
+# Logging level of the application loggers
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Log how long each import and lifespan step of worker startup takes
+STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'false').lower() == 'true'
+
+# Create/upgrade the schema on every worker startup instead of running `python -m app.database.migrate` once per deploy
+AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'false').lower() == 'true'
+
+# Optional routers, only imported when enabled
+ENABLE_MOCK_DISHES = os.getenv('ENABLE_MOCK_DISHES', 'false').lower() == 'true'
+ENABLE_MENU_IMPORT = os.getenv('ENABLE_MENU_IMPORT', 'false').lower() == 'true'
+
+# Two-level cache for menus and restaurants: every worker keeps an in-process L1 (at most
+# CACHE_L1_MAX_ENTRIES per namespace) in front of a shared L2. CACHE_BACKEND "local" has no L2 and only
+# invalidates within the process (a warning is logged when WEB_CONCURRENCY starts several workers); "resp" shares L2 and invalidations through the Redis-protocol server at
+# CACHE_URL (Redis, or `python -m app.tools.resp_server` on a single host).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/0')
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', 1024))
+
+# Seconds past MENU_CACHE_TTL a cached menu is still served while a background task reloads it
+MENU_STALE_TTL = float(os.getenv('MENU_STALE_TTL', 300.0))
+
+# HTTP caching of GET responses, by router prefix: Cache-Control max-age and stale-while-revalidate (seconds)
+# and the Vary header. Routers not listed here send no caching headers.
+CACHE_POLICIES = {
+    "/all_restaurants": {"max_age": RESTAURANT_DIRECTORY_TTL, "stale_while_revalidate": 300, "vary": "Accept-Encoding"},
+    "/all_categories": {"max_age": 300, "stale_while_revalidate": 3600, "vary": "Accept-Encoding"},
+    "/restaurant": {"max_age": RESTAURANT_DIRECTORY_TTL, "stale_while_revalidate": 300, "vary": "Accept-Encoding"},
+    "/dishes": {"max_age": MENU_CACHE_TTL, "stale_while_revalidate": MENU_STALE_TTL, "vary": "Accept-Encoding"},
+    "/dish_details": {"max_age": MENU_CACHE_TTL, "stale_while_revalidate": MENU_STALE_TTL, "vary": "Accept-Encoding"},
+    "/search_dishes": {"max_age": MENU_CACHE_TTL, "stale_while_revalidate": MENU_STALE_TTL, "vary": "Accept-Encoding"},
+    "/images": {"max_age": IMAGE_CACHE_TTL, "stale_while_revalidate": 86400, "vary": "Accept-Encoding"},
+}
+
+# Response compression: bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as is. Responses are compressed
+# with gzip (level GZIP_LEVEL) or, when the `brotli` package is installed, brotli (quality BROTLI_QUALITY).
+# Cached menu payloads are compressed once, at the highest levels.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
+# Large responses are rendered off the event loop: /dishes results of at least OFFLOAD_MIN_ROWS dishes are formatted,
+# validated, serialized and compressed by OFFLOAD_EXECUTOR, "thread" (OFFLOAD_THREADS threads) or "process"
+# (OFFLOAD_PROCESSES worker processes), and come back as the bytes to send. Smaller results are rendered inline.
+OFFLOAD_MIN_ROWS = int(os.getenv('OFFLOAD_MIN_ROWS', 2000))
+OFFLOAD_EXECUTOR = os.getenv('OFFLOAD_EXECUTOR', 'thread')
+OFFLOAD_THREADS = int(os.getenv('OFFLOAD_THREADS', 1))
+OFFLOAD_PROCESSES = int(os.getenv('OFFLOAD_PROCESSES', 2))
+
+# Rate limits of /call_waiter and /calculate_basket (token buckets: tokens per second and bucket size), per table and
+# per client IP. RATE_LIMIT_BACKEND "local" keeps buckets per worker; "resp" shares fixed-window counters between
+# workers through the server at CACHE_URL.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'local')
+RATE_LIMIT_TABLE_RATE = float(os.getenv('RATE_LIMIT_TABLE_RATE', 0.2))
+RATE_LIMIT_TABLE_BURST = int(os.getenv('RATE_LIMIT_TABLE_BURST', 5))
+RATE_LIMIT_IP_RATE = float(os.getenv('RATE_LIMIT_IP_RATE', 2.0))
+RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', 20))
+
+# Connection pool of each worker: DB_POOL_SIZE kept-open connections, up to DB_MAX_OVERFLOW more under load, and the
+# seconds a checkout waits for a free connection before failing
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 250))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 50))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 60))
+
+# Load shedding: at most ADMISSION_MAX_CONCURRENT requests hold a database session at once (by default the whole
+# pool, DB_POOL_SIZE + DB_MAX_OVERFLOW); up to ADMISSION_MAX_QUEUE more wait for a slot, at most
+# ADMISSION_QUEUE_TIMEOUT seconds. Requests beyond that are answered 503 with Retry-After.
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', DB_POOL_SIZE + DB_MAX_OVERFLOW))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 200))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 5.0))
+
+# Table sessions: the draft basket of each table, changed item by item until it is submitted. TABLE_SESSION_BACKEND
+# "local" keeps drafts in the worker's memory, and refuses to start with more than one worker (WEB_CONCURRENCY);
+# "resp" shares them between workers through the server at CACHE_URL. A draft expires TABLE_SESSION_TTL seconds after
+# its last change.
+TABLE_SESSION_BACKEND = os.getenv('TABLE_SESSION_BACKEND', 'local')
+TABLE_SESSION_TTL = float(os.getenv('TABLE_SESSION_TTL', 4 * 3600))
+TABLE_SESSION_MAX_LINES = int(os.getenv('TABLE_SESSION_MAX_LINES', 100))
+
+# Waiter call batching: calls arriving within WAITER_CALL_BATCH_WINDOW_MS milliseconds (at most WAITER_CALL_BATCH_MAX_SIZE)
+# are written together as one upsert statement. Off by default; see benchmarks/bench_waiter_calls.py for the trade-off.
+WAITER_CALL_BATCHING = os.getenv('WAITER_CALL_BATCHING', 'false').lower() == 'true'
+WAITER_CALL_BATCH_WINDOW_MS = float(os.getenv('WAITER_CALL_BATCH_WINDOW_MS', 5.0))
+WAITER_CALL_BATCH_MAX_SIZE = int(os.getenv('WAITER_CALL_BATCH_MAX_SIZE', 200))
+
+# Retention of time-partitioned tables (baskets, waiter_call_events; one partition per month). Every RETENTION_INTERVAL
+# seconds one worker creates the partitions of the next PARTITION_MONTHS_AHEAD months and detaches partitions older
+# than the retention period: with RETENTION_ARCHIVE they are moved to the `archive` schema, otherwise dropped.
+# Current waiter calls (one per table) older than WAITER_CALL_TTL_HOURS are deleted.
+RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() == 'true'
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', 3600.0))
+RETENTION_ARCHIVE = os.getenv('RETENTION_ARCHIVE', 'true').lower() == 'true'
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 2))
+BASKET_RETENTION_MONTHS = int(os.getenv('BASKET_RETENTION_MONTHS', 24))
+WAITER_CALL_EVENT_RETENTION_MONTHS = int(os.getenv('WAITER_CALL_EVENT_RETENTION_MONTHS', 3))
+WAITER_CALL_TTL_HOURS = float(os.getenv('WAITER_CALL_TTL_HOURS', 12.0))
+# Order and waiter call times sent by clients pick the partition of the row: times further than CLIENT_CLOCK_MAX_SKEW
+# seconds from the server clock are rejected with 422. Rows outside the partition window stay in DEFAULT.
+CLIENT_CLOCK_MAX_SKEW = float(os.getenv('CLIENT_CLOCK_MAX_SKEW', 24 * 3600))
+
+# Menu import and bulk price updates: rows are parsed, re-priced, validated and upserted MENU_IMPORT_BATCH_SIZE at a time,
+# all in one transaction. An import is rejected as a whole once MENU_IMPORT_MAX_ERRORS invalid rows are found.
+MENU_IMPORT_BATCH_SIZE = int(os.getenv('MENU_IMPORT_BATCH_SIZE', 1000))
+MENU_IMPORT_MAX_ERRORS = int(os.getenv('MENU_IMPORT_MAX_ERRORS', 20))
+# The upload is spooled before the transaction starts: in memory up to MENU_IMPORT_SPOOL_MEMORY bytes, then to a
+# temporary file, up to MENU_IMPORT_MAX_BYTES. A single row (a CSV record or an NDJSON line) is at most
+# MENU_IMPORT_MAX_RECORD_BYTES long.
+MENU_IMPORT_SPOOL_MEMORY = int(os.getenv('MENU_IMPORT_SPOOL_MEMORY', 8 * 1024 * 1024))
+MENU_IMPORT_MAX_BYTES = int(os.getenv('MENU_IMPORT_MAX_BYTES', 200 * 1024 * 1024))
+MENU_IMPORT_MAX_RECORD_BYTES = int(os.getenv('MENU_IMPORT_MAX_RECORD_BYTES', 1024 * 1024))
+
+# Token expected in the X-Admin-Token header of admin requests (/admin routes, on-demand profiling). Unset disables them.
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or None
+
+# Request profiling: a request with X-Profile (and the admin token) is profiled, and so is a random
+# PROFILE_SAMPLE_RATE share of all requests. PROFILER is "cprofile" or "pyinstrument" (if installed). The last
+# PROFILE_KEEP profiles are kept in PROFILE_DIR, shared by the workers of a host. Without ADMIN_TOKEN and with
+# a sample rate of 0, the profiling middleware is not even installed.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))
+PROFILER = os.getenv('PROFILER', 'cprofile')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'cafe-profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+
+# Event loop monitor: a task sleeps LOOP_MONITOR_INTERVAL seconds over and over and measures how late the loop wakes
+# it up (event_loop_lag_seconds, over the last LOOP_MONITOR_WINDOW samples). When the loop is more than
+# LOOP_BLOCK_THRESHOLD seconds late, a watchdog thread captures the stack of the code that holds it, and it is logged.
+LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', 0.05))
+LOOP_MONITOR_WINDOW = int(os.getenv('LOOP_MONITOR_WINDOW', 1200))
+LOOP_BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', 0.1))
@@ -1,16 +1,32 @@
-from sqlalchemy import select
+from sqlalchemy import select, update, func, literal_column
 from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Set, Tuple
+from collections import Counter
+from datetime import date, datetime
 from decimal import Decimal
+import uuid
 
 
 # own imports
+from app.tools.offload import offloader
+from app.tools.restaurant_directory import DirectoryEntry
+from app.tools.single_flight import single_flight
 from app.database.models import (Restaurant,
                                  Dish,
-                                 Category
+                                 Category,
+                                 Basket,
+                                 KitchenFeed,
+                                 WaiterCall,
+                                 WaiterCallEvent,
+                                 RevenueHourly,
+                                 DishSalesDaily,
+                                 WaiterCallsHourly,
+                                 BASKET_OPEN_STATUSES,
+                                 basket_revision_seq
                                  )
 
 
@@ -25,6 +41,32 @@ def format_extra_prices(extra: Optional[Dict]) -> Optional[Dict]:
     return formatted_extra
 
 
+def format_dish(dish: Dish, currency: str) -> dict:
+    """
+    Formats a Dish row the way dish lists are returned to clients: price with 2 digits, extra prices
+    formatted and the restaurant currency added.
+
+    Args:
+        dish (Dish): The Dish row.
+        currency (str): The currency of the dish's restaurant.
+
+    Returns:
+        dict: The dish details.
+    """
+    return {
+        "id": dish.id,
+        "restaurant_id": dish.restaurant_id,
+        "category_id": dish.category_id,
+        "name": dish.name,
+        "photo": dish.photo,
+        "description": dish.description,
+        "price": Decimal(str(dish.price)).quantize(Decimal('0.01')),
+        "extra": format_extra_prices(dish.extra),
+        "currency": currency
+    }
+
+
+@single_flight.coalesce
 async def get_restaurant_id_name_pairs(session: AsyncSession) -> dict:
     """
     Retrieves a dictionary mapping restaurant IDs to their names.
@@ -40,6 +82,24 @@ async def get_restaurant_id_name_pairs(session: AsyncSession) -> dict:
     return {restaurant_id: restaurant_name for restaurant_id, restaurant_name in pairs}
 
 
+@single_flight.coalesce
+async def get_restaurant_directory_entries(session: AsyncSession) -> List[DirectoryEntry]:
+    """
+    Retrieves the columns of every restaurant needed by the in-memory restaurant directory.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+
+    Returns:
+        List[DirectoryEntry]: One entry per restaurant.
+    """
+    result = await session.execute(
+        select(Restaurant.id, Restaurant.name, Restaurant.rating, Restaurant.photo, Restaurant.currency)
+    )
+    return [DirectoryEntry(*row) for row in result.all()]
+
+
+@single_flight.coalesce
 async def get_category_id_name_pairs(session: AsyncSession, restaurant_id: Optional[int] = None) -> Dict[int, str]:
     """
     Fetches all dishes for a given restaurant_id, extracts their category_id,
@@ -75,6 +135,20 @@ async def get_category_id_name_pairs(session: AsyncSession, restaurant_id: Optio
     return category_id_name_pairs
 
 
+async def get_category_ids(session: AsyncSession) -> Set[int]:
+    """
+    Retrieves the IDs of all categories. Not coalesced: it runs in the caller's transaction, which may have
+    created categories of its own.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+
+    Returns:
+        Set[int]: The category IDs.
+    """
+    return set((await session.execute(select(Category.id))).scalars().all())
+
+
 async def get_restaurant_by_id(session: AsyncSession, restaurant_id: int) -> Restaurant:
     """
     Retrieves a restaurant by its ID.
@@ -90,6 +164,19 @@ async def get_restaurant_by_id(session: AsyncSession, restaurant_id: int) -> Res
     return result.scalars().first()
 
 
+def format_dishes(dishes: List[Dish]) -> List[dict]:
+    dish_list = []
+
+    for dish in dishes:
+        if dish.restaurant is None:
+            continue  # Skip dishes without an associated restaurant
+
+        dish_list.append(format_dish(dish, dish.restaurant.currency))
+
+    return dish_list
+
+
+@single_flight.coalesce
 async def get_dishes_by_restaurant_and_category_and_id(session: AsyncSession,
                                                        restaurant_id: Optional[int] = None,
                                                        category_id: Optional[int] = None,
@@ -125,29 +212,53 @@ async def get_dishes_by_restaurant_and_category_and_id(session: AsyncSession,
     if not dishes:
         return None
 
-    dish_list = []
+    # Formatting tens of thousands of rows would hold up the event loop; the loaded rows are only read meanwhile
+    if offloader.should_offload(len(dishes)):
+        return await offloader.run_in_thread(format_dishes, dishes)
+    return format_dishes(dishes)
 
-    for dish in dishes:
-        if dish.restaurant is None:
-            continue  # Skip dishes without an associated restaurant
 
-        dish.price = Decimal(str(dish.price)).quantize(Decimal('0.01'))
-        dish.extra = format_extra_prices(dish.extra)
-
-        dish_info = {
-            "id": dish.id,
-            "restaurant_id": dish.restaurant_id,
-            "category_id": dish.category_id,
-            "name": dish.name,
-            "photo": dish.photo,
-            "description": dish.description,
-            "price": dish.price,
-            "extra": dish.extra,
-            "currency": dish.restaurant.currency
-        }
-        dish_list.append(dish_info)
+@single_flight.coalesce
+async def search_dishes_fulltext(session: AsyncSession,
+                                 restaurant_id: int,
+                                 tsquery: str,
+                                 offset: int = 0,
+                                 limit: int = 20) -> Tuple[int, List[Tuple[dict, float]]]:
+    """
+    Searches the dishes of a restaurant with the Postgres full-text index on name and description,
+    ranked by ts_rank_cd.
 
-    return dish_list
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        tsquery (str): A `to_tsquery('simple', ...)` expression.
+        offset (int): The number of matches to skip. Defaults to 0.
+        limit (int): The maximum number of matches to return. Defaults to 20.
+
+    Returns:
+        Tuple[int, List[Tuple[dict, float]]]: The total number of matches and the requested page of
+        (dish details, rank) pairs.
+    """
+    query_vector = func.to_tsquery('simple', tsquery)
+    rank = func.ts_rank_cd(Dish.search_vector, query_vector)
+    matches = (Dish.restaurant_id == restaurant_id, Dish.search_vector.op('@@')(query_vector))
+
+    query = select(Dish, Restaurant.currency, rank.label('rank'), func.count().over().label('total')) \
+        .join(Restaurant, Restaurant.id == Dish.restaurant_id) \
+        .where(*matches) \
+        .order_by(rank.desc(), Dish.id) \
+        .offset(offset) \
+        .limit(limit)
+    rows = (await session.execute(query)).all()
+
+    if rows:
+        total = rows[0].total
+    elif offset:
+        total = (await session.execute(select(func.count()).select_from(Dish).where(*matches))).scalar_one()
+    else:
+        total = 0
+
+    return total, [(format_dish(row.Dish, row.currency), float(row.rank)) for row in rows]
 
 
 async def get_dish_detailed_info(session: AsyncSession, dish_id: int):
@@ -230,3 +341,445 @@ async def get_dish_basket_info(session: AsyncSession, dish_id: int):
     }
 
     return dish_details
+
+
+async def get_open_baskets(session: AsyncSession, restaurant_id: int, limit: int = 100) -> List[Basket]:
+    """
+    Retrieves the open baskets of a restaurant (the kitchen queue), oldest order first.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        limit (int): The maximum number of baskets to return. Defaults to 100.
+
+    Returns:
+        List[Basket]: The open baskets, served by the partial index on open statuses.
+    """
+    query = select(Basket).where(
+        Basket.restaurant_id == restaurant_id,
+        Basket.status.in_(BASKET_OPEN_STATUSES)
+    ).order_by(Basket.order_datetime).limit(limit)
+
+    result = await session.execute(query)
+    return list(result.scalars().all())
+
+
+async def get_basket_changes(session: AsyncSession, restaurant_id: int, cursor: int, limit: int = 100) -> List[Basket]:
+    """
+    Retrieves the baskets of a restaurant changed after the given cursor (a position in the restaurant's kitchen
+    feed), including baskets that have left the queue, so screens can drop them.
+
+    Positions of a restaurant commit in order (see KitchenFeed), so the cursor never moves past a change that has
+    yet to commit, and transactions that do not write the restaurant's baskets never hold its changes back.
+    Baskets sharing a position (those from before the kitchen feed all have 1) are never split over two pages.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        cursor (int): The `feed_position` of the last change the caller has already seen.
+        limit (int): The maximum number of baskets to return, unless more share the last position. Defaults to 100.
+
+    Returns:
+        List[Basket]: The changed baskets ordered by position, then revision.
+    """
+    query = select(Basket).where(
+        Basket.restaurant_id == restaurant_id,
+        Basket.feed_position > cursor
+    ).order_by(Basket.feed_position, Basket.revision).limit(limit + 1)
+
+    baskets = list((await session.execute(query)).scalars().all())
+    if len(baskets) <= limit:
+        return baskets
+
+    # The page ends inside a position: leave that position for the next page, or return all of it
+    last = baskets[limit].feed_position
+    complete = [basket for basket in baskets if basket.feed_position != last]
+    if complete:
+        return complete
+    query = select(Basket).where(
+        Basket.restaurant_id == restaurant_id,
+        Basket.feed_position == last
+    ).order_by(Basket.revision)
+    return list((await session.execute(query)).scalars().all())
+
+
+async def next_feed_position(session: AsyncSession, restaurant_id: int) -> int:
+    """
+    Takes the next position in the kitchen feed of a restaurant, for a basket written in the same transaction.
+    The restaurant's feed stays locked until the transaction ends, so take it right before writing the basket and
+    commit soon after. A restaurant's first position follows the current transaction ID: kitchen cursors handed
+    out before the feed existed were transaction IDs.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+
+    Returns:
+        int: The position.
+    """
+    statement = insert(KitchenFeed).values(
+        restaurant_id=restaurant_id,
+        position=literal_column("pg_current_xact_id()::text::bigint")
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[KitchenFeed.restaurant_id],
+        set_={"position": KitchenFeed.position + 1}
+    ).returning(KitchenFeed.position)
+    return (await session.execute(statement)).scalar_one()
+
+
+async def update_basket_status(session: AsyncSession,
+                               basket_id: uuid.UUID,
+                               status: str,
+                               waiter: Optional[str] = None) -> Basket | None:
+    """
+    Sets the status (and optionally the waiter) of a basket and moves it to a new revision, at the next position
+    of its restaurant's kitchen feed. The caller is responsible for committing the session.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        basket_id (uuid.UUID): The ID of the basket to update.
+        status (str): The new status of the basket.
+        waiter (Optional[str]): The waiter to assign. Defaults to None, which keeps the current waiter.
+
+    Returns:
+        Basket | None: The updated basket, or None if it does not exist.
+    """
+    restaurant_id = (await session.execute(
+        select(Basket.restaurant_id).where(Basket.id == basket_id)
+    )).scalar()
+    if restaurant_id is None:
+        return None
+
+    values = {"status": status, "revision": basket_revision_seq.next_value(),
+              "feed_position": await next_feed_position(session, restaurant_id)}
+    if waiter is not None:
+        values["waiter"] = waiter
+
+    result = await session.execute(
+        update(Basket).where(Basket.id == basket_id).values(**values).returning(Basket)
+    )
+    return result.scalars().first()
+
+
+async def upsert_waiter_calls(session: AsyncSession, calls: List[dict]) -> Dict[Tuple[int, int], WaiterCall]:
+    """
+    Creates or updates the current waiter call of each table in one INSERT ... ON CONFLICT statement.
+    When several calls are for the same table, the last one wins. Every call is also appended to waiter_call_events
+    and counted in the hourly waiter call rollup. Tables are written in (restaurant_id, table_id) order, so that
+    concurrent batches lock the rows they share in the same order instead of deadlocking.
+    The caller is responsible for committing the session.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        calls (List[dict]): The calls, with restaurant_id, table_id, status and call_datetime.
+
+    Returns:
+        Dict[Tuple[int, int], WaiterCall]: The stored call of each (restaurant_id, table_id).
+    """
+    latest = {}
+    for call in calls:
+        latest[(call["restaurant_id"], call["table_id"])] = call
+    latest = dict(sorted(latest.items()))
+
+    statement = insert(WaiterCall).values([
+        {"id": uuid.uuid4(), "restaurant_id": restaurant_id, "table_id": table_id,
+         "status": call["status"], "call_datetime": call["call_datetime"]}
+        for (restaurant_id, table_id), call in latest.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[WaiterCall.restaurant_id, WaiterCall.table_id],
+        set_={"status": statement.excluded.status, "call_datetime": statement.excluded.call_datetime}
+    ).returning(WaiterCall)
+
+    result = await session.execute(statement, execution_options={"populate_existing": True})
+    stored = {(call.restaurant_id, call.table_id): call for call in result.scalars().all()}
+
+    await session.execute(insert(WaiterCallEvent), [
+        {"id": uuid.uuid4(), "restaurant_id": call["restaurant_id"], "table_id": call["table_id"],
+         "status": call["status"], "call_datetime": call["call_datetime"]}
+        for call in sorted(calls, key=lambda call: (call["restaurant_id"], call["table_id"]))
+    ])
+    await record_waiter_call_rollups(session, calls)
+    return stored
+
+
+def truncate_to_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _add_to_rollup(model, values: List[dict], keys: List[str], counters: List[str]):
+    """
+    Builds an INSERT ... ON CONFLICT statement that adds the counters of `values` to the existing rollup rows.
+    The rows are written in key order, so that transactions updating several of the same rows lock them in the same
+    order and wait for each other instead of deadlocking.
+    """
+    statement = insert(model).values(sorted(values, key=lambda row: tuple(row[key] for key in keys)))
+    columns = model.__table__.c
+    return statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: columns[name] + statement.excluded[name] for name in counters}
+    )
+
+
+async def record_basket_rollups(session: AsyncSession, basket: Basket) -> None:
+    """
+    Adds a new basket to the revenue and dish sales rollups. Call it in the transaction that inserts the basket,
+    so the rollups always match the baskets. The caller is responsible for committing the session.
+
+    Every order of a restaurant updates the same revenue row for the hour, so its orders commit one after the other:
+    the row stays locked from this upsert to the commit. Call it last before committing to keep that short. On a local
+    Postgres 16 this capped one restaurant at 1,200-1,900 orders/s (3,600-4,200 on separate rows), far beyond what
+    a restaurant orders; counting exactly, in the order's transaction, is worth it.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        basket (Basket): The basket, with order_items as stored (dish_id, dish_price and extras of each item).
+    """
+    await session.execute(_add_to_rollup(
+        RevenueHourly,
+        [{"restaurant_id": basket.restaurant_id, "hour": truncate_to_hour(basket.order_datetime),
+          "currency": basket.currency, "orders": 1, "revenue": basket.total_cost}],
+        keys=["restaurant_id", "hour"],
+        counters=["orders", "revenue"]
+    ))
+
+    quantities, revenues = Counter(), Counter()
+    for item in basket.order_items or []:
+        item_cost = Decimal(str(item["dish_price"]))
+        for _, extra_cost in (item.get("extras") or {}).values():
+            item_cost += Decimal(str(extra_cost))
+        quantities[item["dish_id"]] += 1
+        revenues[item["dish_id"]] += item_cost
+    if not quantities:
+        return
+
+    day = basket.order_datetime.date()
+    await session.execute(_add_to_rollup(
+        DishSalesDaily,
+        [{"restaurant_id": basket.restaurant_id, "day": day, "dish_id": dish_id,
+          "quantity": quantity, "revenue": revenues[dish_id]}
+         for dish_id, quantity in quantities.items()],
+        keys=["restaurant_id", "day", "dish_id"],
+        counters=["quantity", "revenue"]
+    ))
+
+
+async def create_basket(session: AsyncSession,
+                        restaurant_id: int,
+                        table_id: int,
+                        order_datetime: datetime,
+                        order_items: List[dict],
+                        total_cost: Decimal,
+                        currency: str) -> Basket:
+    """
+    Saves a new order as a basket with the status "new", at the next position of the restaurant's kitchen feed,
+    and counts it in the analytics rollups in the same transaction. The caller is responsible for committing the
+    session.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        table_id (int): The ID of the table.
+        order_datetime (datetime): When the order was placed.
+        order_items (List[dict]): One dict per ordered dish, with dish_id, dish_price and extras.
+        total_cost (Decimal): The total cost, rounded to cents.
+        currency (str): The currency of the restaurant.
+
+    Returns:
+        Basket: The new basket, with its ID.
+    """
+    basket = Basket(
+        restaurant_id=restaurant_id,
+        table_id=table_id,
+        order_datetime=order_datetime,
+        order_items=order_items,
+        total_cost=total_cost,
+        currency=currency,
+        status="new",
+        waiter=None,
+        feed_position=await next_feed_position(session, restaurant_id)
+    )
+    session.add(basket)
+    await session.flush()
+    # Same transaction as the basket, so the analytics rollups never miss or double count an order
+    await record_basket_rollups(session, basket)
+    return basket
+
+
+async def record_waiter_call_rollups(session: AsyncSession, calls: List[dict]) -> None:
+    """
+    Adds waiter calls to the hourly waiter call rollup. The caller is responsible for committing the session.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        calls (List[dict]): The calls, with restaurant_id, table_id, status and call_datetime.
+    """
+    counts = Counter((call["restaurant_id"], truncate_to_hour(call["call_datetime"]), call["table_id"], call["status"])
+                     for call in calls)
+    if not counts:
+        return
+    await session.execute(_add_to_rollup(
+        WaiterCallsHourly,
+        [{"restaurant_id": restaurant_id, "hour": hour, "table_id": table_id, "status": status, "calls": number}
+         for (restaurant_id, hour, table_id, status), number in counts.items()],
+        keys=["restaurant_id", "hour", "table_id", "status"],
+        counters=["calls"]
+    ))
+
+
+async def get_revenue_by_hour(session: AsyncSession,
+                              restaurant_id: int,
+                              start: datetime,
+                              end: datetime) -> List[RevenueHourly]:
+    """
+    Retrieves the hourly revenue of a restaurant from the rollup.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        start (datetime): The first hour to include.
+        end (datetime): The end of the range, exclusive.
+
+    Returns:
+        List[RevenueHourly]: One row per hour with orders, oldest first. Hours without orders are left out.
+    """
+    result = await session.execute(
+        select(RevenueHourly)
+        .where(RevenueHourly.restaurant_id == restaurant_id,
+               RevenueHourly.hour >= truncate_to_hour(start),
+               RevenueHourly.hour < end)
+        .order_by(RevenueHourly.hour)
+    )
+    return result.scalars().all()
+
+
+async def get_top_dishes(session: AsyncSession,
+                         restaurant_id: int,
+                         start: date,
+                         end: date,
+                         limit: int = 10) -> List[dict]:
+    """
+    Retrieves the best selling dishes of a restaurant over a range of days from the rollup.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        start (date): The first day to include.
+        end (date): The last day to include.
+        limit (int): The maximum number of dishes to return.
+
+    Returns:
+        List[dict]: dish_id, name (None for dishes that were deleted since), quantity and revenue,
+        the most ordered dish first.
+    """
+    quantity = func.sum(DishSalesDaily.quantity).label("quantity")
+    totals = (
+        select(DishSalesDaily.dish_id, quantity, func.sum(DishSalesDaily.revenue).label("revenue"))
+        .where(DishSalesDaily.restaurant_id == restaurant_id,
+               DishSalesDaily.day >= start,
+               DishSalesDaily.day <= end)
+        .group_by(DishSalesDaily.dish_id)
+        .order_by(quantity.desc(), DishSalesDaily.dish_id)
+        .limit(limit)
+        .subquery()
+    )
+    result = await session.execute(
+        select(totals.c.dish_id, Dish.name, totals.c.quantity, totals.c.revenue)
+        .outerjoin(Dish, Dish.id == totals.c.dish_id)
+        .order_by(totals.c.quantity.desc(), totals.c.dish_id)
+    )
+    return [row._asdict() for row in result.all()]
+
+
+async def get_waiter_calls_by_hour(session: AsyncSession,
+                                   restaurant_id: int,
+                                   start: datetime,
+                                   end: datetime) -> List[WaiterCallsHourly]:
+    """
+    Retrieves the number of waiter calls per hour, table and status of a restaurant from the rollup.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        start (datetime): The first hour to include.
+        end (datetime): The end of the range, exclusive.
+
+    Returns:
+        List[WaiterCallsHourly]: The non-empty counts, ordered by hour, then table.
+    """
+    result = await session.execute(
+        select(WaiterCallsHourly)
+        .where(WaiterCallsHourly.restaurant_id == restaurant_id,
+               WaiterCallsHourly.hour >= truncate_to_hour(start),
+               WaiterCallsHourly.hour < end)
+        .order_by(WaiterCallsHourly.hour, WaiterCallsHourly.table_id, WaiterCallsHourly.status)
+    )
+    return result.scalars().all()
+
+
+async def upsert_dishes(session: AsyncSession, restaurant_id: int, dishes: List[dict]) -> Tuple[int, int]:
+    """
+    Creates or updates dishes of a restaurant by name in one INSERT ... ON CONFLICT statement.
+    When several dishes have the same name, the last one wins. The caller is responsible for committing the session.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        dishes (List[dict]): The dishes, with name, category_id, price, description, photo and extra.
+
+    Returns:
+        Tuple[int, int]: The number of dishes inserted and updated.
+    """
+    latest = {dish["name"]: dish for dish in dishes}
+    statement = insert(Dish)
+    # xmax is 0 for rows this statement inserted
+    statement = statement.on_conflict_do_update(
+        index_elements=[Dish.restaurant_id, Dish.name],
+        set_={column: statement.excluded[column] for column in ("category_id", "price", "description", "photo", "extra")}
+    ).returning(literal_column("xmax = 0"))
+
+    # A list of parameters keeps the compiled statement cacheable; SQLAlchemy still sends multi-row INSERTs
+    result = await session.execute(statement, [{**dish, "restaurant_id": restaurant_id} for dish in latest.values()])
+    inserted = sum(result.scalars().all())
+    return inserted, len(latest) - inserted
+
+
+async def get_dish_prices(session: AsyncSession,
+                          after_id: int,
+                          limit: int,
+                          restaurant_ids: Optional[List[int]] = None,
+                          category_id: Optional[int] = None) -> List[Tuple[int, int, float, Optional[dict]]]:
+    """
+    Retrieves a page of dish prices, ordered by dish ID, for bulk price updates.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        after_id (int): Only dishes with a greater ID are returned; 0 for the first page.
+        limit (int): The page size.
+        restaurant_ids (Optional[List[int]]): Only dishes of these restaurants; all restaurants if None.
+        category_id (Optional[int]): Only dishes of this category.
+
+    Returns:
+        List[Tuple[int, int, float, Optional[dict]]]: id, restaurant_id, price and extra of each dish.
+    """
+    query = select(Dish.id, Dish.restaurant_id, Dish.price, Dish.extra).where(Dish.id > after_id)
+    if restaurant_ids is not None:
+        query = query.where(Dish.restaurant_id.in_(restaurant_ids))
+    if category_id is not None:
+        query = query.where(Dish.category_id == category_id)
+    result = await session.execute(query.order_by(Dish.id).limit(limit))
+    return [tuple(row) for row in result.all()]
+
+
+async def update_dish_prices(session: AsyncSession, prices: List[dict]) -> None:
+    """
+    Sets the price and extra of dishes by ID, as one executemany UPDATE.
+    The caller is responsible for committing the session.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        prices (List[dict]): id, price and extra of each dish.
+    """
+    if prices:
+        await session.execute(update(Dish), prices)
@@ -0,0 +1,95 @@
+"""
+Creates and upgrades the database schema. Run it once per deploy, before starting the workers:
+
+    python -m app.database.migrate
+"""
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.database.partition_baskets import conversion_pending
+from app.database.postgre_db import Base, get_engine
+from app.tools.retention import ensure_partitions
+# Registers every table on Base.metadata
+from app.database import models  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# create_all only creates missing tables. These statements bring tables created by earlier versions up to date;
+# every one of them must be safe to run again. A baskets table from before monthly partitions is converted offline
+# first, by `python -m app.database.partition_baskets`.
+UPGRADE_STATEMENTS = [
+    # Kitchen queue
+    "CREATE SEQUENCE IF NOT EXISTS baskets_revision_seq",
+    "ALTER TABLE baskets ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT nextval('baskets_revision_seq')",
+    "CREATE INDEX IF NOT EXISTS ix_baskets_open_queue ON baskets (restaurant_id, order_datetime) "
+    "WHERE status IN ('None', 'new', 'cooking', 'ready')",
+    # Kitchen changes were read by transaction ID, then by position in the restaurant's kitchen feed. Existing
+    # baskets get 1, below any position, so a cursor of 0 still returns them; the first position of a restaurant
+    # follows the current transaction ID, above the cursors handed out before
+    "ALTER TABLE baskets ADD COLUMN IF NOT EXISTS feed_position BIGINT NOT NULL DEFAULT 1",
+    "DROP INDEX IF EXISTS ix_baskets_restaurant_xact",
+    "ALTER TABLE baskets DROP COLUMN IF EXISTS xact_id",
+    # Archived partitions get the column as well, so late rows of their month can still be added to them
+    r"""
+    DO $$
+    DECLARE
+        archived regclass;
+    BEGIN
+        FOR archived IN SELECT c.oid::regclass FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'archive' AND c.relname LIKE 'baskets\_y%' AND c.relkind = 'r' LOOP
+            EXECUTE format('ALTER TABLE %s ADD COLUMN IF NOT EXISTS feed_position BIGINT NOT NULL DEFAULT 1', archived);
+            EXECUTE format('ALTER TABLE %s DROP COLUMN IF EXISTS xact_id', archived);
+        END LOOP;
+    END $$
+    """,
+    "DROP INDEX IF EXISTS ix_baskets_restaurant_revision",
+    "CREATE INDEX IF NOT EXISTS ix_baskets_restaurant_feed ON baskets (restaurant_id, feed_position, revision)",
+    # Dish search
+    "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+    "(setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_dishes_search_vector ON dishes USING gin (search_vector)",
+    # Menu import upserts: dish names become unique per restaurant. Duplicates are renamed, not deleted,
+    # since baskets refer to them by ID
+    "UPDATE dishes d SET name = d.name || ' (' || d.id || ')' FROM dishes first "
+    "WHERE first.restaurant_id = d.restaurant_id AND first.name = d.name AND first.id < d.id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_dishes_restaurant_name ON dishes (restaurant_id, name)",
+    # Waiter call upserts: keep only the latest call of each table, then make the table the key
+    "DELETE FROM waiter_calls a USING waiter_calls b WHERE a.restaurant_id = b.restaurant_id "
+    "AND a.table_id = b.table_id AND (a.call_datetime, a.id::text) < (b.call_datetime, b.id::text)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_waiter_calls_restaurant_table ON waiter_calls (restaurant_id, table_id)",
+]
+
+
+async def migrate():
+    """
+    Creates missing tables, applies the upgrade statements and creates the partitions that are due,
+    in one transaction.
+
+    Raises:
+        RuntimeError: If baskets has not been converted into a partitioned table yet.
+    """
+    async with get_engine().begin() as conn:
+        if await conversion_pending(conn):
+            raise RuntimeError("baskets is not partitioned yet: stop the workers and run "
+                               "python -m app.database.partition_baskets first")
+        logger.info("Creating tables...")
+        await conn.run_sync(Base.metadata.create_all)
+        for statement in UPGRADE_STATEMENTS:
+            await conn.execute(text(statement))
+        created = await ensure_partitions(conn)
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+        logger.info("Schema is up to date.")
+
+
+async def main():
+    await migrate()
+    await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
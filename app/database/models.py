@@ -1,13 +1,21 @@
-from sqlalchemy import (Integer,
+from sqlalchemy import (DDL,
+                        event,
+                        Integer,
+                        BigInteger,
                         ForeignKey,
+                        Date,
                         DateTime,
                         JSON,
                         String,
-                        Numeric
+                        Numeric,
+                        Index,
+                        Sequence,
+                        Computed,
+                        text
                         )
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from decimal import Decimal
 import uuid
 
@@ -16,6 +24,16 @@ import uuid
 from app.database.postgre_db import Base
 
 
+# Kitchen queue statuses of a basket, in the order a basket moves through them
+BASKET_STATUSES = ("new", "cooking", "ready", "served", "cancelled")
+# Statuses shown on kitchen screens; "None" is what baskets were created with before the kitchen queue existed
+BASKET_OPEN_STATUSES = ("None", "new", "cooking", "ready")
+
+# Every insert and status change takes the next value, so clients can tell which version of a basket is newer
+basket_revision_seq = Sequence('baskets_revision_seq')
+
+
+
 class Restaurant(Base):
 
     __tablename__ = 'restaurants'
@@ -52,24 +70,81 @@ class Dish(Base):
     description: Mapped[str] = mapped_column(nullable=False)
     price: Mapped[float] = mapped_column(nullable=False)
     extra: Mapped[dict] = mapped_column(JSON, nullable=True)
+    # Maintained by Postgres for full-text dish search; name matches rank above description matches
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                 "setweight(to_tsvector('simple', coalesce(description, '')), 'B')", persisted=True),
+        deferred=True
+    )
 
     restaurant: Mapped['Restaurant'] = relationship('Restaurant', back_populates='dishes')
     category: Mapped['Category'] = relationship('Category', back_populates='dishes')
 
+    __table_args__ = (
+        Index('ix_dishes_search_vector', 'search_vector', postgresql_using='gin'),
+        # Menu imports upsert dishes by name
+        Index('uq_dishes_restaurant_name', 'restaurant_id', 'name', unique=True),
+    )
+
+
+def add_default_partition(table) -> None:
+    """
+    Creates the DEFAULT partition of a table partitioned by month together with the table, so rows can be
+    inserted before the retention job has created the monthly partitions (see app/tools/retention.py).
+    """
+    event.listen(table, "after_create", DDL(f"CREATE TABLE {table.name}_default PARTITION OF {table.name} DEFAULT"))
+
 
 class Basket(Base):
 
     __tablename__ = 'baskets'
+    # Monthly partitions; the partition key has to be part of the primary key
+    __table_args__ = {'postgresql_partition_by': 'RANGE (order_datetime)'}
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     restaurant_id: Mapped[int] = mapped_column(Integer, nullable=False)
     table_id: Mapped[int] = mapped_column(Integer, nullable=False)
-    order_datetime: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+    order_datetime: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
     order_items: Mapped[dict] = mapped_column(JSONB, nullable=True)
     total_cost: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     currency: Mapped[str] = mapped_column(nullable=False, default='USD')
     status: Mapped[str] = mapped_column(String, nullable=True)
     waiter: Mapped[str] = mapped_column(String, nullable=True)
+    revision: Mapped[int] = mapped_column(BigInteger,
+                                          basket_revision_seq,
+                                          server_default=basket_revision_seq.next_value(),
+                                          nullable=False)
+    # Position of the basket's last change in its restaurant's kitchen feed, see KitchenFeed. Baskets from before
+    # the feed (or written around crud) have 1
+    feed_position: Mapped[int] = mapped_column(BigInteger, server_default=text("1"), nullable=False)
+
+
+add_default_partition(Basket.__table__)
+
+# Partial index: kitchen screens only ever list open baskets, so closed history does not bloat the index
+Index('ix_baskets_open_queue',
+      Basket.restaurant_id,
+      Basket.order_datetime,
+      postgresql_where=Basket.status.in_(BASKET_OPEN_STATUSES))
+
+# Serves "changes since cursor" polling with an index range scan
+Index('ix_baskets_restaurant_feed', Basket.restaurant_id, Basket.feed_position, Basket.revision)
+
+
+class KitchenFeed(Base):
+    """
+    The last position handed out in the kitchen feed of each restaurant. Every insert and status change of a basket
+    takes the next one, and keeps the restaurant's row locked until its transaction ends: the baskets of a restaurant
+    are written one transaction at a time, so their positions commit in order. Kitchen screens ask for "changes
+    since position N", which never skips a change still to commit, whereas revisions are taken before commit, and
+    can commit out of order. Unlike a transaction ID horizon, this only waits for writers of the same restaurant.
+    """
+
+    __tablename__ = 'kitchen_feeds'
+
+    restaurant_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    position: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
 
 class WaiterCall(Base):
@@ -82,3 +157,65 @@ class WaiterCall(Base):
     table_id: Mapped[int] = mapped_column(Integer, nullable=False)
     status: Mapped[str] = mapped_column(String, nullable=False)
 
+    # One current call per table; waiter calls are written as upserts on this key
+    __table_args__ = (
+        Index('uq_waiter_calls_restaurant_table', 'restaurant_id', 'table_id', unique=True),
+    )
+
+
+class WaiterCallEvent(Base):
+    """
+    Append-only history of waiter calls; WaiterCall only keeps the current call of each table.
+    """
+
+    __tablename__ = 'waiter_call_events'
+    __table_args__ = (
+        Index('ix_waiter_call_events_restaurant_time', 'restaurant_id', 'call_datetime'),
+        {'postgresql_partition_by': 'RANGE (call_datetime)'},
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    call_datetime: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    restaurant_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    table_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False)
+
+
+add_default_partition(WaiterCallEvent.__table__)
+
+
+# Analytics rollups, updated in the transaction that writes a basket or a waiter call. Dashboards read only these,
+# never baskets.order_items. `python -m app.tools.rollups` rebuilds them from the history. Orders of a restaurant
+# serialize on its hourly revenue row until they commit (see record_basket_rollups()).
+
+class RevenueHourly(Base):
+
+    __tablename__ = 'rollup_revenue_hourly'
+
+    restaurant_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    hour: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    currency: Mapped[str] = mapped_column(String, nullable=False)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False)
+
+
+class DishSalesDaily(Base):
+
+    __tablename__ = 'rollup_dish_sales_daily'
+
+    restaurant_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[Date] = mapped_column(Date, primary_key=True)
+    dish_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False)
+
+
+class WaiterCallsHourly(Base):
+
+    __tablename__ = 'rollup_waiter_calls_hourly'
+
+    restaurant_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    hour: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    table_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    status: Mapped[str] = mapped_column(String, primary_key=True)
+    calls: Mapped[int] = mapped_column(Integer, nullable=False)
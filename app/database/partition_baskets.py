@@ -0,0 +1,117 @@
+"""
+Converts a plain baskets table, from before baskets were partitioned by month, into a partitioned one.
+
+The rows are moved in batches of `--batch-size`, each in its own short transaction, instead of in one transaction as
+large as the table; interrupted, it resumes where it stopped. Run it with the workers stopped (until the last batch,
+their queries would miss the baskets not moved yet), then run the migration:
+
+    python -m app.database.partition_baskets --batch-size 10000
+    python -m app.database.migrate
+"""
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import PARTITION_MONTHS_AHEAD
+from app.database.postgre_db import get_engine
+from app.tools.retention import add_months, create_partition
+
+logger = logging.getLogger(__name__)
+
+# The indexes of the partitioned table are created by the migration; the old ones would take their names
+PREPARE_STATEMENTS = [
+    "ALTER TABLE baskets RENAME TO baskets_unpartitioned",
+    "ALTER TABLE baskets_unpartitioned RENAME CONSTRAINT baskets_pkey TO baskets_unpartitioned_pkey",
+    "DROP INDEX IF EXISTS ix_baskets_open_queue",
+    "DROP INDEX IF EXISTS ix_baskets_restaurant_revision",
+    "DROP INDEX IF EXISTS ix_baskets_restaurant_xact",
+    "DROP INDEX IF EXISTS ix_baskets_restaurant_feed",
+    "CREATE TABLE baskets (LIKE baskets_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (order_datetime)",
+    "ALTER TABLE baskets ADD PRIMARY KEY (id, order_datetime)",
+    "CREATE TABLE baskets_default PARTITION OF baskets DEFAULT",
+]
+
+# baskets has the columns of baskets_unpartitioned in the same order (CREATE TABLE ... LIKE)
+MOVE_BATCH = """
+WITH batch AS (
+    DELETE FROM baskets_unpartitioned
+    WHERE id IN (SELECT id FROM baskets_unpartitioned ORDER BY id LIMIT :batch_size)
+    RETURNING *
+)
+INSERT INTO baskets SELECT * FROM batch
+"""
+
+
+async def relkind(conn: AsyncConnection, table: str):
+    """Returns the kind of a table ("r" for a plain table, "p" for a partitioned one), or None if it does not exist."""
+    result = await conn.execute(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"),
+                                {"table": table})
+    return result.scalar()
+
+
+async def conversion_pending(conn: AsyncConnection) -> bool:
+    """Whether baskets still has to be converted, or its conversion was interrupted."""
+    return await relkind(conn, "baskets") == "r" or await relkind(conn, "baskets_unpartitioned") is not None
+
+
+async def partition_baskets(engine: AsyncEngine, batch_size: int = 10_000) -> int:
+    """
+    Renames the plain baskets table, creates the partitioned one with the monthly partitions its rows need, and
+    moves the rows over a batch at a time.
+
+    Args:
+        engine (AsyncEngine): The engine of the database.
+        batch_size (int): Rows moved per transaction.
+
+    Returns:
+        int: The number of baskets moved.
+    """
+    async with engine.begin() as conn:
+        if await relkind(conn, "baskets") == "r":
+            for statement in PREPARE_STATEMENTS:
+                await conn.execute(text(statement))
+            # So that the rows are moved into their partition at once, not into the DEFAULT partition first. The whole
+            # history gets partitions, for retention to archive; rows dated beyond the months retention creates ahead
+            # are left to the DEFAULT partition
+            end = add_months(date.today().replace(day=1), PARTITION_MONTHS_AHEAD + 1)
+            months = await conn.execute(text(
+                "SELECT DISTINCT date_trunc('month', order_datetime)::date FROM baskets_unpartitioned "
+                "WHERE order_datetime < :end"
+            ), {"end": datetime.combine(end, datetime.min.time())})
+            for (month,) in months.all():
+                await create_partition(conn, "baskets", "order_datetime", month)
+            logger.info("Created the partitioned baskets table")
+        elif await relkind(conn, "baskets_unpartitioned") is None:
+            logger.info("baskets is already partitioned")
+            return 0
+
+    moved = 0
+    while True:
+        async with engine.begin() as conn:
+            batch = (await conn.execute(text(MOVE_BATCH), {"batch_size": batch_size})).rowcount
+        if not batch:
+            break
+        moved += batch
+        logger.info(f"Moved {moved} baskets")
+
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE baskets_unpartitioned"))
+    return moved
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Rows moved per transaction")
+    args = parser.parse_args()
+    moved = await partition_baskets(get_engine(), args.batch_size)
+    logger.info(f"Done: {moved} baskets moved. Now run python -m app.database.migrate")
+    await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,41 +1,64 @@
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from sqlalchemy.ext.asyncio import (AsyncSession,
+from sqlalchemy.ext.asyncio import (AsyncEngine,
+                                    AsyncSession,
                                     async_sessionmaker,
                                     create_async_engine)
 from sqlalchemy.orm import declarative_base
 
-from app.config import HOME_DB, WORK_DATABASE_URL, LOCAL_DATABASE_URL
+from app.config import (DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT, HOME_DB, LOCAL_DATABASE_URL,
+                        WORK_DATABASE_URL)
+from app.tools.admission import admission
 
 if HOME_DB is True:
     DATABASE_URL = LOCAL_DATABASE_URL
 else:
     DATABASE_URL = WORK_DATABASE_URL
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-engine = create_async_engine(DATABASE_URL, pool_timeout=60, pool_size=250, max_overflow=50, echo=False)
+_engine: AsyncEngine | None = None
 
-async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Bound to the engine by get_engine(), so importing this module does not create the engine
+async_session = async_sessionmaker(class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-async def init_db():
-    try:
-        engine = create_async_engine(DATABASE_URL, pool_timeout=60, pool_size=250, max_overflow=50, echo=False)
-        async with engine.begin() as conn:
-            logger.debug("Creating tables...")
-            await conn.run_sync(Base.metadata.create_all)
-            logger.debug("Tables created successfully.")
-    except Exception as e:
-        logger.error(f"Error creating tables: {e}")
+def get_engine() -> AsyncEngine:
+    """
+    Returns the application engine, creating it and binding `async_session` to it on first use.
 
+    Returns:
+        AsyncEngine: The SQLAlchemy asynchronous engine.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(DATABASE_URL, pool_timeout=DB_POOL_TIMEOUT, pool_size=DB_POOL_SIZE,
+                                      max_overflow=DB_MAX_OVERFLOW, echo=False)
+        async_session.configure(bind=_engine)
+        logger.info(f"Database engine created for {_engine.url.render_as_string(hide_password=True)}")
+    return _engine
 
-async def get_session() -> AsyncSession:
-    async with async_session() as session:
-        yield session
 
+@asynccontextmanager
+async def admitted_session() -> AsyncIterator[AsyncSession]:
+    """
+    Opens a session holding an admission slot until it is closed. Requests that mostly wait, such as long-polls,
+    open one per database round-trip instead of using get_session, so they do not hold a slot while waiting.
+
+    Raises:
+        HTTPException: 503 error with Retry-After when too many requests are already waiting for the database.
+    """
+    get_engine()
+    async with admission.slot():
+        async with async_session() as session:
+            yield session
 
-logger.info(DATABASE_URL)
+
+async def get_session() -> AsyncSession:
+    # Sheds load with 503 when too many requests are already waiting for the database
+    async with admitted_session() as session:
+        yield session
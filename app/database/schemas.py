@@ -1,9 +1,28 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Dict, Tuple
-from datetime import datetime
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, PlainSerializer, field_validator
+from typing import Annotated, Optional, List, Dict, Tuple
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 import uuid
 
+# own import
+from app.config import CLIENT_CLOCK_MAX_SKEW
+from app.database.models import BASKET_STATUSES
+
+# Decimals are sent as strings with a fixed number of digits, e.g. "12.50"; model_dump() keeps them as Decimal
+Price = Annotated[Decimal, PlainSerializer(lambda value: f"{value:.2f}", return_type=str, when_used="json")]
+Rating = Annotated[Decimal, PlainSerializer(lambda value: f"{value:.1f}", return_type=str, when_used="json")]
+
+
+def near_server_clock(value: datetime) -> datetime:
+    # A time sent by a client decides the monthly partition of the row; a wrong clock must not reach another month
+    if abs(value - datetime.now(value.tzinfo)) > timedelta(seconds=CLIENT_CLOCK_MAX_SKEW):
+        raise ValueError(f"must be within {CLIENT_CLOCK_MAX_SKEW / 3600:g} hours of the server time")
+    return value
+
+
+# A time set by a client's clock, such as the time of an order
+ClientTime = Annotated[datetime, AfterValidator(near_server_clock)]
+
 
 class DishSchema(BaseModel):
     id: int
@@ -12,30 +31,36 @@ class DishSchema(BaseModel):
     name: str
     photo: Optional[str] = None
     description: Optional[str] = None
-    price: Decimal = Field(..., description="Price in decimal with 2 digits precision")
+    price: Price = Field(..., description="Price in decimal with 2 digits precision")
     currency: Optional[str] = None
     extra: Optional[Dict] = None
 
-    class Config:
-        from_attributes = True
-        json_encoders = {
-            Decimal: lambda v: f"{v:.2f}"  # Ensure Decimal values are formatted to 2 decimal places
-        }
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DishSearchHit(DishSchema):
+    score: float = Field(..., description="Relevance of the dish to the query; higher is better")
+
+
+class DishSearchResponse(BaseModel):
+    total: int = Field(..., description="Number of dishes matching the query")
+    offset: int
+    limit: int
+    items: List[DishSearchHit]
 
 
 class CategorySchema(BaseModel):
     id: int
     name: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RestaurantSchema(BaseModel):
     id: int
     name: str
     photo: Optional[str]
-    rating: Optional[Decimal]
+    rating: Optional[Rating]
     tables_amount: Optional[int]
     restaurant_currency: Optional[str]
 
@@ -46,8 +71,24 @@ class RestaurantSchema(BaseModel):
             return round(value, 1)
         return value
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RestaurantDirectoryItem(BaseModel):
+    id: int
+    name: str
+    photo: Optional[str] = None
+    rating: Optional[Rating] = None
+    currency: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RestaurantSearchResponse(BaseModel):
+    total: int = Field(..., description="Number of restaurants matching the query")
+    offset: int
+    limit: int
+    items: List[RestaurantDirectoryItem]
 
 
 class OrderItem(BaseModel):
@@ -58,7 +99,7 @@ class OrderItem(BaseModel):
 class OrderRequest(BaseModel):
     restaurant_id: int
     table_id: int
-    order_datetime: datetime
+    order_datetime: ClientTime
     order_items: List[OrderItem]
 
 
@@ -79,7 +120,7 @@ class CalculateCostResponse(BaseModel):
 
 
 class WaiterCallCreateRequest(BaseModel):
-    call_datetime: datetime = Field(..., description="Date and time of the waiter call")
+    call_datetime: ClientTime = Field(..., description="Date and time of the waiter call")
     restaurant_id: int = Field(..., description="ID of the restaurant")
     table_id: int = Field(..., description="ID of the table")
     status: str = Field(..., description="Status of the waiter call")
@@ -98,3 +139,145 @@ class WaiterCallResponse(BaseModel):
     restaurant_id: int = Field(..., description="ID of the restaurant")
     table_id: int = Field(..., description="ID of the table")
     status: str = Field(..., description="Status of the waiter call")
+
+
+class KitchenBasketSchema(BaseModel):
+    id: uuid.UUID = Field(..., description="Unique identifier of the basket")
+    restaurant_id: int
+    table_id: int
+    order_datetime: datetime
+    order_items: Optional[List[OrderItemResponse]] = None
+    total_cost: Price
+    currency: str
+    status: Optional[str] = None
+    waiter: Optional[str] = None
+    revision: int = Field(..., description="Revision of the last change; a higher revision is a newer version of the basket")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BasketStatusUpdateRequest(BaseModel):
+    basket_id: uuid.UUID = Field(..., description="ID of the basket")
+    status: str = Field(..., description="New status of the basket")
+    waiter: Optional[str] = Field(None, description="Waiter serving the basket")
+
+    @field_validator('status')
+    def check_status(cls, v):
+        if v not in BASKET_STATUSES:
+            raise ValueError(f"Invalid status: {v}. Allowed statuses are: {', '.join(BASKET_STATUSES)}")
+        return v
+
+
+class KitchenChangesResponse(BaseModel):
+    cursor: int = Field(..., description="Pass this value as the cursor of the next request")
+    baskets: List[KitchenBasketSchema]
+
+
+class RevenueHourSchema(BaseModel):
+    hour: datetime = Field(..., description="Start of the hour")
+    orders: int
+    revenue: Price
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RevenueResponse(BaseModel):
+    restaurant_id: int
+    start: datetime
+    end: datetime
+    currency: Optional[str] = Field(None, description="Currency of the restaurant, None when there were no orders")
+    orders: int
+    revenue: Price
+    hours: List[RevenueHourSchema] = Field(..., description="Hours with orders, oldest first")
+
+
+class TopDishSchema(BaseModel):
+    dish_id: int
+    name: Optional[str] = Field(None, description="Name of the dish, None if it was deleted")
+    quantity: int
+    revenue: Price
+
+
+class TopDishesResponse(BaseModel):
+    restaurant_id: int
+    start: date
+    end: date
+    dishes: List[TopDishSchema]
+
+
+class WaiterCallsHourSchema(BaseModel):
+    hour: datetime = Field(..., description="Start of the hour")
+    table_id: int
+    status: str
+    calls: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MenuImportResponse(BaseModel):
+    rows: int = Field(..., description="Rows read")
+    inserted: int = Field(..., description="Dishes created")
+    updated: int = Field(..., description="Dishes changed")
+    seconds: float
+    rows_per_second: float
+
+
+class PriceUpdateRequest(BaseModel):
+    restaurant_ids: Optional[List[int]] = Field(None, description="Restaurants to update, all restaurants if omitted")
+    category_id: Optional[int] = Field(None, description="Only update dishes of this category")
+    factor: float = Field(1.0, gt=0, description="Price multiplier, e.g. 1.05 for +5%")
+    delta: float = Field(0.0, description="Amount added to every dish price after multiplying")
+    include_extras: bool = Field(True, description="Multiply the prices of extras by the factor too")
+
+
+class BundledImageSchema(BaseModel):
+    offset: int = Field(..., description="Position of the photo in the bundle, in bytes")
+    length: int = Field(..., description="Size of the photo in bytes")
+    media_type: str
+
+
+class ImageBundleResponse(BaseModel):
+    restaurant_id: int
+    category_id: Optional[int] = None
+    version: str = Field(..., description="Changes whenever the menu or one of its photos does")
+    size: int = Field(..., description="Size of the bundle in bytes")
+    url: str = Field(..., description="Where to download the bundle")
+    images: Dict[str, BundledImageSchema] = Field(..., description="The photos of the bundle, by photo name")
+
+
+class TableSessionChange(BaseModel):
+    dish_id: int
+    extras: List[str] = Field([], description="Keys of the dish's extras")
+    quantity: int = Field(1, ge=-100, le=100, description="Quantity to add, or to remove when negative")
+
+
+class TableSessionChangeRequest(BaseModel):
+    restaurant_id: int
+    table_id: int
+    revision: Optional[int] = Field(None, description="Revision the client last saw; 409 if the basket has changed since")
+    changes: List[TableSessionChange] = Field(..., min_length=1, max_length=100)
+
+
+class TableSessionSubmitRequest(BaseModel):
+    restaurant_id: int
+    table_id: int
+    revision: Optional[int] = Field(None, description="Revision the client last saw; 409 if the basket has changed since")
+    order_datetime: Optional[ClientTime] = Field(None, description="Time of the order, now if omitted")
+
+
+class TableSessionLine(BaseModel):
+    line_id: str = Field(..., description="The dish and its extras")
+    dish_id: int
+    dish_price: str
+    extras: Dict[str, Tuple[str, str]]
+    unit_price: str = Field(..., description="Price of the dish with its extras")
+    quantity: int
+
+
+class TableSessionResponse(BaseModel):
+    restaurant_id: int
+    table_id: int
+    revision: int = Field(..., description="Increases with every change of the basket")
+    currency: Optional[str] = None
+    total: str
+    lines: List[TableSessionLine]
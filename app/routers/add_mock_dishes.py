@@ -8,6 +8,7 @@ from app.database.models import Dish
 from app.database.crud import (get_dishes_by_restaurant_and_category_and_id,
                                get_restaurant_by_id,
                                get_category_id_name_pairs)
+from app.tools.menu_cache import menu_cache
 
 router = APIRouter()
 
@@ -42,7 +43,7 @@ async def add_mock_dishes(restaurant_id: int, i: int, session: AsyncSession = De
 
     # Fetch the existing dishes for the restaurant
     dishes = await get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=restaurant_id)
-    existing_dish_names = {dish.name for dish in dishes} if dishes else set()
+    existing_dish_names = {dish["name"] for dish in dishes} if dishes else set()
 
     # Define adjectives, main ingredients, cuisine styles, cooking methods, accompaniments, and flavors
     adjectives = ["delicious", "exquisite", "mouth-watering", "succulent", "flavorful"]
@@ -91,5 +92,6 @@ async def add_mock_dishes(restaurant_id: int, i: int, session: AsyncSession = De
             dish_count += 1
 
     await session.commit()
+    await menu_cache.invalidate(restaurant_id)
 
     return {"message": f"Added {dish_count} dishes in {categories_amount} categories in restaurant {restaurant_name}"}
@@ -0,0 +1,50 @@
+import asyncio
+import os
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+
+# own imports
+from app.tools.admin_auth import require_admin_token
+from app.tools.profiling import profile_store
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/", response_model=List[dict], description="List the stored request profiles, newest first.")
+async def list_profiles():
+    """
+    Lists the stored request profiles of this host.
+
+    Returns:
+        List[dict]: The ID and the summary line (request, wall, CPU and database time) of each profile.
+    """
+    return await asyncio.to_thread(profile_store.list)
+
+
+@router.get("/{profile_id}", description="Download a stored request profile.")
+async def get_profile(
+        profile_id: str,
+        fmt: str = Query("text", alias="format", description="text for the report, pstats for the raw cProfile data")
+):
+    """
+    Returns a stored profile: the text report, or the raw cProfile data for tools such as snakeviz.
+
+    Args:
+        profile_id (str): The ID from the X-Profile-Id response header.
+        fmt (str): "text" or "pstats".
+
+    Returns:
+        FileResponse: The profile file.
+
+    Raises:
+        HTTPException: 404 error if there is no such profile (or no pstats data for a pyinstrument profile).
+    """
+    extension = "prof" if fmt == "pstats" else "txt"
+    path = profile_store.path(profile_id, extension)
+    if path is None or not await asyncio.to_thread(os.path.exists, path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if extension == "prof":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"profile-{profile_id}.prof")
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
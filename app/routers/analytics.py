@@ -0,0 +1,127 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# own imports
+from app.database.postgre_db import get_session
+from app.database.crud import get_revenue_by_hour, get_top_dishes, get_waiter_calls_by_hour
+from app.database.schemas import RevenueResponse, TopDishesResponse, WaiterCallsHourSchema
+
+router = APIRouter()
+
+# Longest range one request may cover; rollups keep queries cheap, but responses still grow with the range
+MAX_RANGE = timedelta(days=366)
+
+
+def resolve_range(start: Optional[datetime], end: Optional[datetime], default: timedelta) -> tuple:
+    """
+    Fills in a missing end (now) or start (`default` before the end) and validates the range.
+
+    Raises:
+        HTTPException: 400 error if the range is empty or longer than MAX_RANGE.
+    """
+    end = end or datetime.now()
+    start = start or end - default
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > MAX_RANGE:
+        raise HTTPException(status_code=400, detail=f"The range can not be longer than {MAX_RANGE.days} days")
+    return start, end
+
+
+@router.get("/revenue", response_model=RevenueResponse, description="Retrieve the revenue of a restaurant per hour.")
+async def get_revenue(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        start: Optional[datetime] = Query(None, description="Start of the range, 24 hours before the end by default"),
+        end: Optional[datetime] = Query(None, description="End of the range (exclusive), now by default"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieves the number of orders and the revenue of a restaurant per hour, with totals over the range.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        start (Optional[datetime]): Start of the range.
+        end (Optional[datetime]): End of the range, exclusive.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        RevenueResponse: The hourly revenue and the totals.
+
+    Raises:
+        HTTPException: 400 error if the range is invalid.
+    """
+    start, end = resolve_range(start, end, timedelta(days=1))
+    hours = await get_revenue_by_hour(session, restaurant_id, start, end)
+    return RevenueResponse(
+        restaurant_id=restaurant_id,
+        start=start,
+        end=end,
+        currency=hours[0].currency if hours else None,
+        orders=sum(hour.orders for hour in hours),
+        revenue=sum((hour.revenue for hour in hours), Decimal("0.00")),
+        hours=hours
+    )
+
+
+@router.get("/top_dishes", response_model=TopDishesResponse, description="Retrieve the best selling dishes of a restaurant.")
+async def get_best_selling_dishes(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        start: Optional[date] = Query(None, description="First day of the range, 7 days before the end by default"),
+        end: Optional[date] = Query(None, description="Last day of the range (inclusive), today by default"),
+        limit: int = Query(10, ge=1, le=100, description="The maximum number of dishes to return"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieves the most ordered dishes of a restaurant over a range of days.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        start (Optional[date]): First day of the range.
+        end (Optional[date]): Last day of the range, inclusive.
+        limit (int): The maximum number of dishes to return.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        TopDishesResponse: The dishes with the quantity ordered and their revenue, the most ordered first.
+
+    Raises:
+        HTTPException: 400 error if the range is invalid.
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if end - start > MAX_RANGE:
+        raise HTTPException(status_code=400, detail=f"The range can not be longer than {MAX_RANGE.days} days")
+    dishes = await get_top_dishes(session, restaurant_id, start, end, limit)
+    return TopDishesResponse(restaurant_id=restaurant_id, start=start, end=end, dishes=dishes)
+
+
+@router.get("/waiter_calls", response_model=List[WaiterCallsHourSchema], description="Retrieve the waiter calls of a restaurant per hour and table.")
+async def get_waiter_calls(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        start: Optional[datetime] = Query(None, description="Start of the range, 24 hours before the end by default"),
+        end: Optional[datetime] = Query(None, description="End of the range (exclusive), now by default"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieves the number of waiter calls of a restaurant per hour, table and status.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        start (Optional[datetime]): Start of the range.
+        end (Optional[datetime]): End of the range, exclusive.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        List[WaiterCallsHourSchema]: The hours and tables with calls, oldest hour first.
+
+    Raises:
+        HTTPException: 400 error if the range is invalid.
+    """
+    start, end = resolve_range(start, end, timedelta(days=1))
+    return await get_waiter_calls_by_hour(session, restaurant_id, start, end)
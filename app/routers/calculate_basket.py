@@ -1,31 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal, ROUND_HALF_UP
 
 from app.database.postgre_db import get_session
-from app.database.models import Basket, Restaurant
+from app.database.models import Restaurant
 from app.database.schemas import (OrderRequest,
                                   OrderItemResponse,
                                   CalculateCostResponse)
-from app.database.crud import get_dish_detailed_info, get_dish_basket_info
+from app.database.crud import get_dish_detailed_info, get_dish_basket_info, create_basket
+from app.tools.kitchen_feed import kitchen_feed
+from app.tools.rate_limit import limit_table_requests
 
 router = APIRouter()
 
 
 @router.post("/", response_model=CalculateCostResponse, description="Calculates the total cost of an order and returns detailed order information.")
-async def calculate_cost(order_request: OrderRequest, session: AsyncSession = Depends(get_session)):
+async def calculate_cost(order_request: OrderRequest, request: Request, session: AsyncSession = Depends(get_session)):
     """
     Calculates the total cost of an order and returns detailed order information.
 
     Args:
         order_request (OrderRequestSave): The request body containing order details.
+        request (Request): The request, for the client IP used by the rate limit.
         session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
 
     Returns:
         CalculateCostResponse: A response object containing the basket ID, restaurant ID, table ID, order datetime,
         detailed order items with dish prices, total cost, and currency.
+
+    Raises:
+        HTTPException: 429 error if the table or the client submits too often.
     """
+    await limit_table_requests(request, order_request.restaurant_id, order_request.table_id, scope="calculate_basket")
+
     total_cost = Decimal('0.0')
     restaurant_currency = None
     order_items_response = []
@@ -55,21 +63,18 @@ async def calculate_cost(order_request: OrderRequest, session: AsyncSession = De
             extras=order.extras
         ))
 
-    basket = Basket(
+    basket = await create_basket(
+        session,
         restaurant_id=order_request.restaurant_id,
         table_id=order_request.table_id,
         order_datetime=order_request.order_datetime,
         order_items=jsonable_encoder(order_items_response),
         total_cost=total_cost.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-        currency=restaurant_currency,
-        status="None",
-        waiter=None
+        currency=restaurant_currency
     )
-    session.add(basket)
-    await session.flush()
     await session.commit()
 
-    print(order_items_response)
+    kitchen_feed.notify(order_request.restaurant_id)
 
     return CalculateCostResponse(
         basket_id=basket.id,
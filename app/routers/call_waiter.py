@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from app.database.models import WaiterCall
+from app.config import WAITER_CALL_BATCHING
+from app.database.crud import upsert_waiter_calls
 from app.database.schemas import WaiterCallCreateRequest, WaiterCallResponse
 from app.database.postgre_db import get_session
+from app.tools.waiter_call_batcher import waiter_call_batcher
+from app.tools.rate_limit import limit_table_requests
 
 router = APIRouter()
 
@@ -11,10 +13,12 @@ router = APIRouter()
 @router.post("/", response_model=WaiterCallResponse)
 async def create_or_update_waiter_call(
     waiter_call_request: WaiterCallCreateRequest,
+    request: Request,
     session: AsyncSession = Depends(get_session)
 ):
     """
         Creates a new waiter call or updates the status of an existing waiter call for a specific table in a restaurant.
+        With WAITER_CALL_BATCHING, calls arriving within a few milliseconds are written together in one statement.
 
         Args:
             waiter_call_request (WaiterCallCreateRequest): The request body containing the details of the waiter call.
@@ -24,33 +28,22 @@ async def create_or_update_waiter_call(
                 "status": "call" or "clean" or "check"
                 "call_datetime": "2021-08-02T00:00:00Z",
             }
+            request (Request): The request, for the client IP used by the rate limit.
             session (AsyncSession): The SQLAlchemy asynchronous session.
 
         Returns:
             WaiterCallResponse: A response model containing the details of the created or updated waiter call.
+
+        Raises:
+            HTTPException: 429 error if the table or the client calls too often.
         """
+    await limit_table_requests(request, waiter_call_request.restaurant_id, waiter_call_request.table_id,
+                               scope="call_waiter")
+
+    call = waiter_call_request.model_dump()
+    if WAITER_CALL_BATCHING:
+        return await waiter_call_batcher.submit(call)
 
-    query = select(WaiterCall).where(
-        WaiterCall.restaurant_id == waiter_call_request.restaurant_id,
-        WaiterCall.table_id == waiter_call_request.table_id
-    )
-    result = await session.execute(query)
-    existing_call = result.scalar_one_or_none()
-
-    if existing_call:
-        existing_call.call_datetime = waiter_call_request.call_datetime
-        existing_call.status = waiter_call_request.status
-        await session.commit()
-        await session.refresh(existing_call)
-        return existing_call
-    else:
-        new_call = WaiterCall(
-            call_datetime = waiter_call_request.call_datetime,
-            restaurant_id=waiter_call_request.restaurant_id,
-            table_id=waiter_call_request.table_id,
-            status=waiter_call_request.status
-        )
-        session.add(new_call)
-        await session.commit()
-        await session.refresh(new_call)
-        return new_call
+    stored = await upsert_waiter_calls(session, [call])
+    await session.commit()
+    return stored[(call["restaurant_id"], call["table_id"])]
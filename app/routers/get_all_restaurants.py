@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal
 
 # own import
 from app.database.postgre_db import get_session
-from app.database.crud import get_restaurant_id_name_pairs
+from app.database.crud import get_restaurant_directory_entries
+from app.database.schemas import RestaurantDirectoryItem, RestaurantSearchResponse
+from app.tools.responses import ModelResponse
+from app.tools.restaurant_directory import restaurant_directory
 
 router = APIRouter()
 
@@ -11,13 +15,47 @@ router = APIRouter()
 @router.get("/", description="Retrieves a dictionary mapping restaurant IDs to their names.")
 async def get_id_name_pairs(session: AsyncSession = Depends(get_session)):
     """
-    Retrieves a dictionary mapping restaurant IDs to their names.
+    Retrieves a dictionary mapping restaurant IDs to their names from the in-memory restaurant directory.
 
     Args:
         session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+            Only used when the directory is due for a re-sync.
 
     Returns:
         dict: A dictionary where keys are restaurant IDs and values are restaurant names.
     """
-    pairs = await get_restaurant_id_name_pairs(session)
-    return pairs
+    await restaurant_directory.refresh_if_stale(lambda: get_restaurant_directory_entries(session))
+    return restaurant_directory.id_name_pairs()
+
+
+@router.get("/search", response_model=RestaurantSearchResponse, description="Search restaurants by name, sorted by rating or name, one page at a time.")
+async def search_restaurants(
+        q: str = Query("", max_length=100, description="Text the restaurant name contains (case-insensitive)"),
+        sort: Literal["rating", "name"] = Query("rating", description="Sort order: best rated first, or by name"),
+        offset: int = Query(0, ge=0, description="The number of matches to skip"),
+        limit: int = Query(20, ge=1, le=100, description="The maximum number of matches to return"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Searches restaurants whose name contains the query. Served from the in-memory restaurant directory,
+    so search-as-you-type does not reach the database.
+
+    Args:
+        q (str): The text to look for. Empty returns every restaurant.
+        sort (str): "rating" or "name".
+        offset (int): The number of matches to skip.
+        limit (int): The maximum number of matches to return.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+            Only used when the directory is due for a re-sync.
+
+    Returns:
+        RestaurantSearchResponse: The total number of matches and the requested page.
+    """
+    await restaurant_directory.refresh_if_stale(lambda: get_restaurant_directory_entries(session))
+    total, entries = restaurant_directory.search(q, sort=sort, offset=offset, limit=limit)
+    return ModelResponse(RestaurantSearchResponse(
+        total=total,
+        offset=offset,
+        limit=limit,
+        items=[RestaurantDirectoryItem.model_validate(entry._asdict()) for entry in entries]
+    ))
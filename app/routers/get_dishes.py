@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from decimal import Decimal
@@ -9,12 +9,17 @@ from app.database.crud import (format_extra_prices,
                                get_dishes_by_restaurant_and_category_and_id)
 from app.database.models import Dish
 from app.database.schemas import DishSchema
+from app.tools.compression import negotiate
+from app.tools.menu_cache import dish_list_adapter, menu_cache, render_dishes
+from app.tools.offload import offloader
+from app.tools.responses import ModelResponse
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[DishSchema])
 async def get_dishes(
+        request: Request,
         restaurant_id: Optional[int] = Query(None, description="The ID of the restaurant (optional)"),
         category_id: Optional[int] = Query(None, description="The ID of the category (optional)"),
         dish_id: Optional[int] = Query(None, description="The ID of the specific dish to retrieve (optional)"),
@@ -23,8 +28,12 @@ async def get_dishes(
     """
     Retrieves a list of dishes based on the provided restaurant ID, optionally filtered by category ID and/or dish ID.
     If restaurant_id is not provided, all dishes are returned.
+    A restaurant's menu is read from the menu cache and filtered in memory; a whole menu is sent as the
+    cached response body, compressed once per encoding. Other results are validated and serialized in one pass,
+    off the event loop when they have at least OFFLOAD_MIN_ROWS dishes.
 
     Args:
+        request (Request): The request, for its Accept-Encoding header.
         restaurant_id (Optional[int]): The ID of the restaurant to retrieve dishes from. Defaults to None.
         category_id (Optional[int]): The ID of the category to filter dishes by. Defaults to None.
         dish_id (Optional[int]): The ID of the specific dish to retrieve. Defaults to None.
@@ -36,8 +45,31 @@ async def get_dishes(
     Raises:
         HTTPException: 404 error if no dishes are found for the given criteria.
     """
-    dishes = await get_dishes_by_restaurant_and_category_and_id(session, restaurant_id, category_id, dish_id)
+    if restaurant_id is not None:
+        menu = await menu_cache.get(
+            restaurant_id,
+            lambda: get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=restaurant_id)
+        )
+        if category_id is None and dish_id is None and menu.dishes:
+            return json_response(*await menu.payload.get(request.headers.get("accept-encoding")))
+        dishes = [dish for dish in menu.dishes
+                  if (category_id is None or dish["category_id"] == category_id)
+                  and (dish_id is None or dish["id"] == dish_id)]
+    else:
+        dishes = await get_dishes_by_restaurant_and_category_and_id(session, restaurant_id, category_id, dish_id)
+
     if not dishes:
         raise HTTPException(status_code=404, detail="No dishes found for the given criteria")
 
-    return dishes
+    if offloader.should_offload(len(dishes)):
+        encoding = negotiate(request.headers.get("accept-encoding"))
+        return json_response(*await offloader.run(render_dishes, dishes, encoding))
+    return ModelResponse(dish_list_adapter.validate_python(dishes), dish_list_adapter)
+
+
+def json_response(body: bytes, encoding: Optional[str]) -> Response:
+    """A response with an already rendered (and possibly compressed) JSON body."""
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,66 +1,137 @@
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import StreamingResponse
+import asyncio
 import os
-import io
 
-from app.tools.functions import read_photo
-from app.config import MIME_TYPES
-from app.config import MAIN_PHOTO_FOLDER
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.config import IMAGE_BUNDLE_MANIFEST_MAX_AGE
+from app.database.postgre_db import get_session
+from app.database.crud import get_dishes_by_restaurant_and_category_and_id
+from app.database.schemas import ImageBundleResponse
+from app.tools.image_bundles import image_bundles
+from app.tools.image_cache import image_cache
+from app.tools.image_catalog import image_catalog
+from app.tools.menu_cache import menu_cache
 
 router = APIRouter()
 
-default_avatar_path = os.path.join(MAIN_PHOTO_FOLDER, 'default_cafe_04.jpeg')
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Tells whether an If-None-Match header matches an ETag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
 
 @router.get("/")
 async def get_image(
     restaurant_id: int = Query(None, description="The ID of the restaurant"),
-    photo: str = Query(None, description="The filename of the photo")
+    photo: str = Query(None, description="The filename of the photo"),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Retrieves a photo from the static photo folder or returns a default photo if the specified photo is not found.
+    The photo is looked up in the in-memory image catalogue, so only files of the restaurant's folder can be served;
+    its bytes come from the image cache. Responses carry an ETag, and a matching If-None-Match gets 304.
 
     Args:
         restaurant_id (int): The ID of the restaurant.
         photo (str): The filename of the photo to retrieve. If not provided, the default photo will be returned.
+        if_none_match (Optional[str]): The ETags the client has cached.
 
     Returns:
-        StreamingResponse: A streaming response containing the photo bytes.
+        Response: The photo bytes, or 304 Not Modified.
 
     Raises:
         HTTPException: 404 error if the default photo is not found.
     """
-    if restaurant_id and photo:
-        restaurant_id = str(restaurant_id)
-        full_path = os.path.join(MAIN_PHOTO_FOLDER, restaurant_id, photo)
-    else:
-        full_path = default_avatar_path
-
-    if os.path.exists(full_path):
-        print('path exists', full_path)
-        photo_bytes = await read_photo(full_path)
-    else:
-        print('path NOT exists', full_path)
-        photo_bytes = None
+    image = image_catalog.lookup(restaurant_id, photo) or image_catalog.default()
+    if image is None:
+        raise HTTPException(status_code=404, detail="Default photo not found")
+    if etag_matches(if_none_match, image.etag):
+        return Response(status_code=304, headers={"ETag": image.etag})
 
+    photo_bytes = await image_cache.read(image.path)
     if photo_bytes is None:
-        print('Loading default photo due to previous error or non-existence')
-        photo_bytes = await read_photo(default_avatar_path)
-
+        # Removed since the catalogue was updated
+        image = image_catalog.default()
+        photo_bytes = await image_cache.read(image.path) if image is not None else None
     if photo_bytes is None:
         raise HTTPException(status_code=404, detail="Default photo not found")
 
-    # Determine the media type based on the file extension
-    _, default_extension = os.path.splitext(default_avatar_path)
-    default_extension = default_extension[1:].lower()  # Remove the leading dot and convert to lowercase
+    return Response(content=photo_bytes, media_type=image.media_type, headers={"ETag": image.etag})
 
-    if photo:
-        _, file_extension = os.path.splitext(photo)
-        file_extension = file_extension[1:].lower() if file_extension else default_extension
-    else:
-        file_extension = default_extension
 
-    print('photo', photo, 'file_extension', file_extension)
+@router.get("/bundle", response_model=ImageBundleResponse)
+async def get_image_bundle(
+    request: Request,
+    response: Response,
+    restaurant_id: int = Query(..., description="The ID of the restaurant"),
+    category_id: Optional[int] = Query(None, description="Only bundle the photos of this category (optional)"),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieves the manifest of the bundle of a restaurant's dish photos: one file with all of them, downloaded from
+    `url`. Each photo is the `length` bytes at `offset` of the bundle. The bundle is built on the first request for
+    its version and then served from disk. The manifest is cached briefly and never served stale: the bundle it
+    points to is removed a while after a newer version replaced it.
 
-    media_type = MIME_TYPES.get(file_extension, "application/octet-stream")
+    Args:
+        request (Request): The request, to build the bundle URL.
+        response (Response): The response, for its Cache-Control header.
+        restaurant_id (int): The ID of the restaurant.
+        category_id (Optional[int]): The ID of the category to bundle. Defaults to the whole menu.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        ImageBundleResponse: The bundle version, size and URL, and the position of each photo.
 
-    return StreamingResponse(io.BytesIO(photo_bytes), media_type=media_type)
+    Raises:
+        HTTPException: 404 error if the restaurant has no dishes.
+    """
+    menu = await menu_cache.get(
+        restaurant_id,
+        lambda: get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=restaurant_id)
+    )
+    if not menu.dishes:
+        raise HTTPException(status_code=404, detail="No dishes found for the given criteria")
+    manifest = await image_bundles.get(restaurant_id, menu.dishes, category_id)
+    url = request.url_for("get_image_bundle_data", version=manifest["version"]).include_query_params(
+        restaurant_id=restaurant_id, **({} if category_id is None else {"category_id": category_id})
+    )
+    response.headers["Cache-Control"] = f"public, max-age={IMAGE_BUNDLE_MANIFEST_MAX_AGE}"
+    return {"restaurant_id": restaurant_id, "category_id": category_id, "url": str(url), **manifest}
+
+
+@router.get("/bundle/{version}")
+async def get_image_bundle_data(
+    version: str,
+    restaurant_id: int = Query(..., description="The ID of the restaurant"),
+    category_id: Optional[int] = Query(None, description="The category of the bundle (optional)"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Retrieves a bundle of photos, as listed by /images/bundle. A version never changes, so it may be cached for good.
+
+    Args:
+        version (str): The bundle version, from the manifest.
+        restaurant_id (int): The ID of the restaurant.
+        category_id (Optional[int]): The ID of the category of the bundle.
+        if_none_match (Optional[str]): The ETags the client has cached.
+
+    Returns:
+        FileResponse: The bundle, or 304 Not Modified.
+
+    Raises:
+        HTTPException: 404 error if the version does not exist (any more); fetch the manifest again.
+    """
+    headers = {"ETag": f'"{version}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    path = image_bundles.path(restaurant_id, category_id, version)
+    if path is None or not await asyncio.to_thread(os.path.isfile, path):
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
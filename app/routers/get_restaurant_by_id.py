@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.postgre_db import get_session
 from app.database.crud import get_restaurant_by_id
 from app.database.schemas import RestaurantSchema
+from app.tools.restaurant_directory import restaurant_cache
 
 router = APIRouter()
 
@@ -13,7 +14,7 @@ router = APIRouter()
 async def get_restaurant(restaurant_id: int = Query(..., description="The ID of the restaurant"),
                          session: AsyncSession = Depends(get_session)):
     """
-    Retrieves a restaurant by its ID.
+    Retrieves a restaurant by its ID. Restaurants are served from the restaurant cache.
 
     Args:
         restaurant_id (int): The ID of the restaurant to retrieve.
@@ -26,21 +27,21 @@ async def get_restaurant(restaurant_id: int = Query(..., description="The ID of
         HTTPException: 400 error if restaurant_id is not provided.
         HTTPException: 404 error if the restaurant is not found.
     """
-    if restaurant_id is not None:
-        restaurant = await get_restaurant_by_id(session, restaurant_id)
-    else:
+    if restaurant_id is None:
         raise HTTPException(status_code=400, detail="Restaurant_id must be provided")
 
-    if restaurant is None:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-
-    restaurant_data = {
-        "id": restaurant.id,
-        "name": restaurant.name,
-        "photo": restaurant.photo,
-        "rating": '%.1f' % restaurant.rating,
-        "tables_amount": restaurant.tables_amount,
-        "restaurant_currency": restaurant.currency  # Include the currency in the response
-    }
-
-    return restaurant_data
+    async def load_restaurant():
+        restaurant = await get_restaurant_by_id(session, restaurant_id)
+        if restaurant is None:
+            # Raised inside the loader so that missing restaurants are not cached
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        return {
+            "id": restaurant.id,
+            "name": restaurant.name,
+            "photo": restaurant.photo,
+            "rating": '%.1f' % restaurant.rating,
+            "tables_amount": restaurant.tables_amount,
+            "restaurant_currency": restaurant.currency  # Include the currency in the response
+        }
+
+    return await restaurant_cache.get_or_load(restaurant_id, load_restaurant)
@@ -0,0 +1,107 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+# own imports
+from app.config import KITCHEN_POLL_INTERVAL, KITCHEN_MAX_WAIT
+from app.database.postgre_db import admitted_session, get_session
+from app.database.crud import get_open_baskets, get_basket_changes, update_basket_status
+from app.database.schemas import KitchenBasketSchema, BasketStatusUpdateRequest, KitchenChangesResponse
+from app.tools.kitchen_feed import kitchen_feed
+from app.tools.responses import ModelResponse
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[KitchenBasketSchema], description="Retrieve the open baskets of a restaurant, oldest order first.")
+async def get_kitchen_queue(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        limit: int = Query(100, ge=1, le=500, description="The maximum number of baskets to return"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieves the kitchen queue: baskets of a restaurant that are new, cooking or ready.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        limit (int): The maximum number of baskets to return.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        List[KitchenBasketSchema]: The open baskets.
+    """
+    return await get_open_baskets(session, restaurant_id, limit)
+
+
+@router.get("/changes", response_model=KitchenChangesResponse, description="Retrieve baskets changed since a cursor, optionally waiting for changes (long-poll).")
+async def get_kitchen_changes(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        cursor: int = Query(0, ge=0, description="The cursor returned by the previous request, 0 for everything"),
+        wait: float = Query(0, ge=0, le=KITCHEN_MAX_WAIT, description="Seconds to wait for a change when there is none yet"),
+        limit: int = Query(100, ge=1, le=500, description="The maximum number of baskets to return")
+):
+    """
+    Retrieves the baskets of a restaurant created or changed after the cursor. When nothing changed and
+    `wait` is given, the request is held until a change arrives or the wait expires. Each check of the database
+    opens its own session, so a waiting request holds neither a connection nor an admission slot; the database is
+    re-checked when this worker changes a basket of the restaurant, and every KITCHEN_POLL_INTERVAL seconds to
+    catch changes made by other workers.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        cursor (int): The cursor returned by the previous request.
+        wait (float): The maximum number of seconds to wait for a change.
+        limit (int): The maximum number of baskets to return.
+
+    Returns:
+        KitchenChangesResponse: The changed baskets and the cursor for the next request.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+
+    while True:
+        async with admitted_session() as session:
+            changes = await get_basket_changes(session, restaurant_id, cursor, limit)
+            baskets = [KitchenBasketSchema.model_validate(basket) for basket in changes]
+            next_cursor = changes[-1].feed_position if changes else cursor
+
+        remaining = deadline - loop.time()
+        if baskets or remaining <= 0:
+            break
+        await kitchen_feed.wait(restaurant_id, min(KITCHEN_POLL_INTERVAL, remaining))
+
+    return ModelResponse(KitchenChangesResponse(cursor=next_cursor, baskets=baskets))
+
+
+@router.post("/status", response_model=KitchenBasketSchema, description="Update the status of a basket in the kitchen queue.")
+async def set_basket_status(
+        status_request: BasketStatusUpdateRequest,
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Updates the status (and optionally the waiter) of a basket and wakes the kitchen screens of its restaurant.
+
+    Args:
+        status_request (BasketStatusUpdateRequest): The request body containing the basket ID and its new status.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        KitchenBasketSchema: The updated basket.
+
+    Raises:
+        HTTPException: 404 error if the basket is not found.
+    """
+    basket = await update_basket_status(session,
+                                        status_request.basket_id,
+                                        status_request.status,
+                                        status_request.waiter)
+    if basket is None:
+        raise HTTPException(status_code=404, detail=f"Basket with ID {status_request.basket_id} not found")
+
+    response = KitchenBasketSchema.model_validate(basket)
+    await session.commit()
+
+    kitchen_feed.notify(basket.restaurant_id)
+    return response
@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# own imports
+from app.database.postgre_db import admitted_session, get_session
+from app.database.crud import get_restaurant_by_id
+from app.database.schemas import MenuImportResponse, PriceUpdateRequest
+from app.tools.menu_cache import menu_cache
+from app.tools.menu_import import (FORMATS, ImportTooLarge, MenuImportError, import_menu, read_spooled, reprice_dishes,
+                                   spool)
+
+router = APIRouter()
+
+
+def stats_response(stats) -> MenuImportResponse:
+    return MenuImportResponse(rows=stats.rows, inserted=stats.inserted, updated=stats.updated,
+                              seconds=round(stats.seconds, 3), rows_per_second=round(stats.rows_per_second, 1))
+
+
+@router.post("/prices", response_model=MenuImportResponse, description="Change the prices of many dishes at once.")
+async def update_prices(price_update: PriceUpdateRequest, session: AsyncSession = Depends(get_session)):
+    """
+    Changes dish prices of some or all restaurants in one transaction, e.g. +5% on every dish of a chain:
+    each price becomes `price * factor + delta`, extras `price * factor`.
+
+    Args:
+        price_update (PriceUpdateRequest): Which dishes to update and how.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        MenuImportResponse: The number of dishes updated and the throughput.
+
+    Raises:
+        HTTPException: 422 error if a new price would be negative; nothing is changed then.
+    """
+    try:
+        stats, restaurant_ids = await reprice_dishes(session,
+                                                     restaurant_ids=price_update.restaurant_ids,
+                                                     category_id=price_update.category_id,
+                                                     factor=price_update.factor,
+                                                     delta=price_update.delta,
+                                                     include_extras=price_update.include_extras)
+    except MenuImportError as e:
+        await session.rollback()
+        raise HTTPException(status_code=422, detail=e.errors)
+    await session.commit()
+
+    for restaurant_id in restaurant_ids:
+        await menu_cache.invalidate(restaurant_id)
+    return stats_response(stats)
+
+
+@router.post("/{restaurant_id}", response_model=MenuImportResponse, description="Import the dishes of a restaurant from CSV or NDJSON.")
+async def import_dishes(
+        restaurant_id: int,
+        request: Request,
+        fmt: str = Query("csv", alias="format", description=f"The format of the request body: {' or '.join(FORMATS)}"),
+        price_factor: float = Query(1.0, gt=0, description="Multiplier applied to the imported prices"),
+        price_delta: float = Query(0.0, description="Amount added to the imported dish prices"),
+):
+    """
+    Imports dishes from the request body. Dishes are matched by name: existing dishes of the restaurant are updated,
+    others are created. The import is applied in one transaction, or not at all. The body is spooled before the
+    session is opened, so a slow upload holds neither a transaction nor an admission slot.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        request (Request): The request, whose body is the file to import.
+        fmt (str): "csv" (with a header row) or "ndjson".
+        price_factor (float): Multiplier of the imported prices.
+        price_delta (float): Amount added to the imported dish prices.
+
+    Returns:
+        MenuImportResponse: The number of rows read, dishes inserted and updated, and the throughput.
+
+    Raises:
+        HTTPException: 404 error if the restaurant is not found, 400 for an unknown format, 413 for a file larger
+        than MENU_IMPORT_MAX_BYTES, 422 error listing the invalid rows.
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {fmt}, use one of {', '.join(FORMATS)}")
+    try:
+        body = await spool(request.stream())
+    except ImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        async with admitted_session() as session:
+            if not await get_restaurant_by_id(session, restaurant_id):
+                raise HTTPException(status_code=404, detail="Restaurant not found")
+            try:
+                stats = await import_menu(session, restaurant_id, read_spooled(body), fmt, price_factor, price_delta)
+            except MenuImportError as e:
+                await session.rollback()
+                raise HTTPException(status_code=422, detail=e.errors)
+            await session.commit()
+    finally:
+        body.close()
+
+    await menu_cache.invalidate(restaurant_id)
+    return stats_response(stats)
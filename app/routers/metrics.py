@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.tools.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Exposes the metrics of the worker that serves the request, in the Prometheus text format.
+    With several workers every scrape reaches one of them; scrape each worker directly for complete numbers.
+
+    Returns:
+        PlainTextResponse: The metrics.
+    """
+    return metrics.render()
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# own imports
+from app.database.postgre_db import get_session
+from app.database.schemas import DishSearchHit, DishSearchResponse
+from app.tools.dish_search import dish_search
+from app.tools.responses import ModelResponse
+
+router = APIRouter()
+
+
+@router.get("/", response_model=DishSearchResponse, description="Search the dishes of a restaurant by name and description, best match first.")
+async def search_dishes(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        q: str = Query(..., min_length=1, max_length=200, description="The words to search for; the last one may be incomplete"),
+        offset: int = Query(0, ge=0, description="The number of matches to skip"),
+        limit: int = Query(20, ge=1, le=100, description="The maximum number of matches to return"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Searches the dishes of a restaurant. Every word of the query must appear in the dish name or description;
+    the last word also matches as a prefix. Matches in the name rank above matches in the description.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        q (str): The search query.
+        offset (int): The number of matches to skip.
+        limit (int): The maximum number of matches to return.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        DishSearchResponse: The total number of matches and the requested page.
+    """
+    total, hits = await dish_search.search(session, restaurant_id, q, offset, limit)
+    return ModelResponse(DishSearchResponse(
+        total=total,
+        offset=offset,
+        limit=limit,
+        items=[DishSearchHit(**dish, score=score) for dish, score in hits]
+    ))
@@ -0,0 +1,150 @@
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.postgre_db import get_session
+from app.database.crud import create_basket
+from app.database.schemas import (CalculateCostResponse,
+                                  TableSessionChangeRequest,
+                                  TableSessionResponse,
+                                  TableSessionSubmitRequest)
+from app.tools.kitchen_feed import kitchen_feed
+from app.tools.rate_limit import limit_table_requests
+from app.tools.table_sessions import order_items, reprice, table_sessions
+
+router = APIRouter()
+
+
+def draft_response(draft: dict) -> dict:
+    return {**draft, "lines": [{"line_id": key, **line} for key, line in draft["lines"].items()]}
+
+
+@router.get("/", response_model=TableSessionResponse, description="Retrieve the draft basket of a table.")
+async def get_table_session(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        table_id: int = Query(..., description="The ID of the table")
+):
+    """
+    Retrieves the draft basket of a table, empty if nothing was added yet (or the draft expired).
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        table_id (int): The ID of the table.
+
+    Returns:
+        TableSessionResponse: The lines of the draft, its total and its revision.
+    """
+    return draft_response(await table_sessions.get(restaurant_id, table_id))
+
+
+@router.post("/changes", response_model=TableSessionResponse, description="Add or remove items of the draft basket of a table.")
+async def change_table_session(change_request: TableSessionChangeRequest, session: AsyncSession = Depends(get_session)):
+    """
+    Adds or removes items of the draft basket of a table. Only the dishes changed are priced, from the cached
+    menu, and the total is updated by the difference.
+
+    Args:
+        change_request (TableSessionChangeRequest): The table and the quantity changes, e.g.
+            {"restaurant_id": 7, "table_id": 15, "changes": [{"dish_id": 12, "extras": ["1"], "quantity": 1}]}
+        session (AsyncSession): The SQLAlchemy asynchronous session, used when the menu is not cached.
+
+    Returns:
+        TableSessionResponse: The new draft.
+
+    Raises:
+        HTTPException: 404 error if a dish is not on the menu of the restaurant, 409 error if `revision` is outdated,
+        422 error for unknown extras or too many lines.
+    """
+    dishes = await table_sessions.dishes(session, change_request.restaurant_id)
+    draft = await table_sessions.change(
+        change_request.restaurant_id,
+        change_request.table_id,
+        [change.model_dump() for change in change_request.changes],
+        dishes,
+        change_request.revision
+    )
+    return draft_response(draft)
+
+
+@router.delete("/", response_model=TableSessionResponse, description="Empty the draft basket of a table.")
+async def clear_table_session(
+        restaurant_id: int = Query(..., description="The ID of the restaurant"),
+        table_id: int = Query(..., description="The ID of the table")
+):
+    """
+    Empties the draft basket of a table.
+
+    Args:
+        restaurant_id (int): The ID of the restaurant.
+        table_id (int): The ID of the table.
+
+    Returns:
+        TableSessionResponse: The empty draft.
+    """
+    await table_sessions.clear(restaurant_id, table_id)
+    return draft_response(await table_sessions.get(restaurant_id, table_id))
+
+
+@router.post("/submit", response_model=CalculateCostResponse, description="Order the draft basket of a table.")
+async def submit_table_session(submit_request: TableSessionSubmitRequest,
+                               request: Request,
+                               session: AsyncSession = Depends(get_session)):
+    """
+    Saves the draft basket of a table as an order and empties the draft. The draft is checked against the current
+    menu first: if prices changed or dishes were removed since they were added, the updated draft is put back and the
+    guest has to confirm it. If the order cannot be saved, the draft is put back.
+
+    Args:
+        submit_request (TableSessionSubmitRequest): The table, and optionally the revision the guest confirmed.
+        request (Request): The request, for the client IP used by the rate limit.
+        session (AsyncSession): The SQLAlchemy asynchronous session, obtained from the dependency.
+
+    Returns:
+        CalculateCostResponse: The saved basket, as returned by /calculate_basket.
+
+    Raises:
+        HTTPException: 400 error if the draft is empty, 409 error if `revision` is outdated or the menu changed, 429
+        error if the table or the client submits too often.
+    """
+    restaurant_id, table_id = submit_request.restaurant_id, submit_request.table_id
+    await limit_table_requests(request, restaurant_id, table_id, scope="calculate_basket")
+
+    dishes = await table_sessions.dishes(session, restaurant_id)
+    draft = await table_sessions.take(restaurant_id, table_id, submit_request.revision)
+    if not draft["lines"]:
+        raise HTTPException(status_code=400, detail="The basket is empty")
+    current = reprice(draft, dishes)
+    if current is not draft:
+        await table_sessions.restore(current)
+        raise HTTPException(status_code=409, detail=f"The menu has changed, the basket was updated "
+                                                    f"(revision {current['revision']})")
+
+    order_datetime = submit_request.order_datetime or datetime.now()
+    items = order_items(draft)
+    try:
+        basket = await create_basket(
+            session,
+            restaurant_id=restaurant_id,
+            table_id=table_id,
+            order_datetime=order_datetime,
+            order_items=items,
+            total_cost=Decimal(draft["total"]),
+            currency=draft["currency"]
+        )
+        await session.commit()
+    except Exception:
+        await table_sessions.restore(draft)
+        raise
+    kitchen_feed.notify(restaurant_id)
+
+    return CalculateCostResponse(
+        basket_id=basket.id,
+        restaurant_id=restaurant_id,
+        table_id=table_id,
+        order_datetime=order_datetime,
+        order_items=items,
+        total_cost=draft["total"],
+        currency=draft["currency"]
+    )
@@ -0,0 +1,17 @@
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from app.config import ADMIN_TOKEN
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None, description="The ADMIN_TOKEN of the deployment")):
+    """
+    Dependency of admin routes: rejects requests without the admin token.
+
+    Raises:
+        HTTPException: 403 error if ADMIN_TOKEN is not set or the X-Admin-Token header does not match it.
+    """
+    if not ADMIN_TOKEN or x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,68 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app.config import ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+from app.tools.metrics import metrics
+
+metrics.describe("admission_in_flight", "gauge", "Requests holding a database session")
+metrics.describe("admission_queued", "gauge", "Requests waiting for a database session")
+metrics.describe("admission_shed_total", "counter", "Requests rejected with 503 by load shedding")
+
+
+class AdmissionController:
+    """
+    Bounds the requests that use the database at once. Requests beyond `max_concurrent` wait in a queue of at most
+    `max_queue`; when the queue is full, or a request waited `queue_timeout` seconds, it is rejected with 503 right
+    away instead of piling up on the connection pool.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    def _shed(self, reason: str) -> HTTPException:
+        metrics.inc("admission_shed_total", reason=reason)
+        return HTTPException(status_code=503,
+                             detail="Server is busy, please try again later",
+                             headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout)))})
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds one slot for the enclosed block.
+
+        Raises:
+            HTTPException: 503 error with Retry-After if no slot can be had.
+        """
+        if self._slots.locked():
+            if self.queued >= self.max_queue:
+                raise self._shed("queue_full")
+            self.queued += 1
+            metrics.set("admission_queued", self.queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._shed("queue_timeout")
+            finally:
+                self.queued -= 1
+                metrics.set("admission_queued", self.queued)
+        else:
+            await self._slots.acquire()
+
+        self.in_flight += 1
+        metrics.set("admission_in_flight", self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            metrics.set("admission_in_flight", self.in_flight)
+            self._slots.release()
+
+
+admission = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
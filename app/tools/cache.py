@@ -0,0 +1,408 @@
+import abc
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+from app.config import CACHE_BACKEND, CACHE_URL, CACHE_L1_MAX_ENTRIES, WORKERS
+from app.tools.resp import RespClient, RespConnection, parse_message, read_reply
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def _encode_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """Serializes a value for the shared cache. Decimals are stored as strings."""
+    return orjson.dumps(value, default=_encode_default)
+
+
+class Subscription(abc.ABC):
+    """Messages published on one channel, in order."""
+
+    @abc.abstractmethod
+    async def next(self) -> bytes:
+        """Waits for the next message."""
+
+    async def close(self) -> None:
+        pass
+
+
+class CacheBackend(abc.ABC):
+    """
+    Shared (L2) cache storage and invalidation channel. Values are opaque bytes.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Returns the value of a key, or None."""
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Stores a value for `ttl` seconds."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """Removes a key."""
+
+    @abc.abstractmethod
+    async def publish(self, channel: str, message: bytes) -> None:
+        """Sends a message to every subscriber of a channel."""
+
+    @abc.abstractmethod
+    async def subscribe(self, channel: str) -> Subscription:
+        """Subscribes to a channel; returns once messages published from now on are guaranteed to be delivered."""
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalBackend(CacheBackend):
+    """
+    No shared storage; invalidation messages are only delivered inside this process.
+    Used when a single worker runs, or when no shared server is configured.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        return _LocalSubscription(self._subscribers.setdefault(channel, []))
+
+
+class _LocalSubscription(Subscription):
+
+    def __init__(self, subscribers: List[asyncio.Queue]):
+        self.queue = asyncio.Queue()
+        self.subscribers = subscribers
+        subscribers.append(self.queue)
+
+    async def next(self) -> bytes:
+        return await self.queue.get()
+
+    async def close(self) -> None:
+        self.subscribers.remove(self.queue)
+
+
+class RespBackend(CacheBackend):
+    """
+    Shared storage and pub/sub on a Redis-protocol server: Redis itself, or `python -m app.tools.resp_server`
+    as a stand-in on a single host.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = RespClient(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str) -> None:
+        await self.client.command("DEL", key)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.command("PUBLISH", channel, message)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        connection = await RespConnection.open(self.url)
+        try:
+            # The reply confirms the subscription
+            await connection.command("SUBSCRIBE", channel)
+        except BaseException:
+            await connection.close()
+            raise
+        return _RespSubscription(connection)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class _RespSubscription(Subscription):
+
+    def __init__(self, connection: RespConnection):
+        self.connection = connection
+
+    async def next(self) -> bytes:
+        while True:
+            message = parse_message(await read_reply(self.connection.reader))
+            if message is not None:
+                return message
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+
+def create_backend(name: str = CACHE_BACKEND, url: str = CACHE_URL) -> CacheBackend:
+    if name == "local":
+        return LocalBackend()
+    if name == "resp":
+        return RespBackend(url)
+    raise ValueError(f"Unknown cache backend: {name}. Use 'local' or 'resp'")
+
+
+class CacheBus:
+    """
+    Connects the two-level caches of this process to the shared backend, and evicts their L1 entries
+    when any worker invalidates a key.
+    """
+
+    CHANNEL = "cache-invalidation"
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._caches: Dict[str, "TwoLevelCache"] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, cache: "TwoLevelCache") -> None:
+        self._caches[cache.namespace] = cache
+
+    async def start(self) -> None:
+        """Starts listening for invalidations. Call once per process, from the application lifespan."""
+        if isinstance(self.backend, LocalBackend) and WORKERS > 1:
+            logger.warning(f"CACHE_BACKEND=local with {WORKERS} workers: each worker caches on its own, and an "
+                           f"invalidation only reaches the worker that made it; the others serve the old value "
+                           f"until it expires. Use CACHE_BACKEND=resp")
+        if self._task is None:
+            ready = asyncio.Event()
+            self._task = asyncio.create_task(self._listen(ready))
+            await ready.wait()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.backend.close()
+
+    async def publish(self, namespace: str, key: Optional[str]) -> None:
+        message = f"{namespace}\n{'' if key is None else key}".encode()
+        try:
+            await self.backend.publish(self.CHANNEL, message)
+        except Exception as e:
+            logger.error(f"Could not publish cache invalidation {message!r}: {e!r}")
+
+    async def _listen(self, ready: asyncio.Event) -> None:
+        while True:
+            subscription = None
+            try:
+                subscription = await self.backend.subscribe(self.CHANNEL)
+                ready.set()
+                while True:
+                    self._apply(await subscription.next())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation channel lost, retrying: {e!r}")
+                # Invalidations may have been missed while disconnected
+                for cache in self._caches.values():
+                    cache.evict_local()
+            finally:
+                ready.set()
+                if subscription is not None:
+                    await subscription.close()
+            await asyncio.sleep(1)
+
+    def _apply(self, message: bytes) -> None:
+        namespace, _, key = message.decode().partition("\n")
+        cache = self._caches.get(namespace)
+        if cache is not None:
+            cache.evict_local(key or None)
+
+
+cache_bus = CacheBus(create_backend())
+
+
+class TwoLevelCache:
+    """
+    A namespace of cached values with an in-process LRU (L1) in front of the shared backend (L2).
+
+    Lookups try L1, then L2, then the loader; whatever is found is copied into the levels above it.
+    `invalidate` removes a key from L2 and, through the invalidation channel, from the L1 of every worker.
+    Values stored in L2 must be JSON-serializable; Decimals come back from L2 as strings.
+
+    Subclasses can keep a richer object in L1 than in L2 by overriding `to_local` and `to_shared`.
+    With a `stale_ttl`, expired L1 entries are served for that many more seconds while `reload` (which loads the
+    value of a key outside of any request) refreshes them in the background; a `stale_ttl` requires a `reload`.
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int = CACHE_L1_MAX_ENTRIES, bus: CacheBus = cache_bus,
+                 stale_ttl: float = 0, reload: Optional[Callable[[str], Awaitable[Any]]] = None):
+        if stale_ttl and reload is None:
+            raise ValueError(f"Cache {namespace}: serving stale values needs a reload function")
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.reload = reload
+        self.max_entries = max_entries
+        self.bus = bus
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "stale_hits": 0, "misses": 0}
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._refreshes: Dict[str, asyncio.Task] = {}
+        self._evictions = 0
+        bus.register(self)
+
+    def _shared_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def to_local(self, value: Any) -> Any:
+        """Converts a loaded or L2 value into what L1 keeps."""
+        return value
+
+    def to_shared(self, local: Any) -> Any:
+        """Converts an L1 value back into what L2 stores."""
+        return local
+
+    def _get_entry(self, key: str) -> Optional[tuple]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[2]:
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def get_local(self, key) -> Any:
+        """Returns the L1 value of a key, stale or not, or MISSING."""
+        entry = self._get_entry(str(key))
+        return MISSING if entry is None else entry[0]
+
+    def set_local(self, key, local: Any) -> None:
+        key = str(key)
+        fresh_until = time.monotonic() + self.ttl
+        self._local[key] = (local, fresh_until, fresh_until + self.stale_ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def evict_local(self, key=None) -> None:
+        # Refreshes that started before an eviction must not store what they loaded
+        self._evictions += 1
+        if key is None:
+            self._local.clear()
+        else:
+            self._local.pop(str(key), None)
+
+    async def get(self, key) -> Any:
+        """
+        Returns the L1 value of a key, filling L1 from L2 when needed, or MISSING.
+        """
+        return await self._lookup(key)
+
+    async def _lookup(self, key) -> Any:
+        entry = self._get_entry(str(key))
+        if entry is not None:
+            local, fresh_until, _ = entry
+            if time.monotonic() < fresh_until:
+                self.stats["l1_hits"] += 1
+            else:
+                self.stats["stale_hits"] += 1
+                self._start_refresh(str(key))
+            return local
+
+        try:
+            data = await self.bus.backend.get(self._shared_key(key))
+        except Exception as e:
+            logger.error(f"Shared cache read of {self._shared_key(key)} failed: {e!r}")
+            data = None
+        if data is None:
+            return MISSING
+
+        self.stats["l2_hits"] += 1
+        local = self.to_local(orjson.loads(data))
+        self.set_local(key, local)
+        return local
+
+    async def set(self, key, value: Any) -> Any:
+        """
+        Stores a value in both levels.
+
+        Returns:
+            Any: The L1 value stored for the key.
+        """
+        local = self.to_local(value)
+        self.set_local(key, local)
+        try:
+            await self.bus.backend.set(self._shared_key(key), dumps(self.to_shared(local)), self.ttl)
+        except Exception as e:
+            logger.error(f"Shared cache write of {self._shared_key(key)} failed: {e!r}")
+        return local
+
+    def _start_refresh(self, key: str) -> None:
+        if key not in self._refreshes:
+            self._refreshes[key] = asyncio.create_task(self._refresh(key))
+
+    async def _refresh(self, key: str) -> None:
+        evictions = self._evictions
+        try:
+            value = await self.reload(key)
+            if self._evictions == evictions:
+                await self.set(key, value)
+        except Exception as e:
+            logger.error(f"Background refresh of {self._shared_key(key)} failed: {e!r}")
+        finally:
+            self._refreshes.pop(key, None)
+
+    async def get_or_load(self, key, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the L1 value of a key, loading and storing it through `loader` when neither level has it.
+        Concurrent misses for the same key in this worker wait for a single load.
+        """
+        local = await self._lookup(key)
+        if local is not MISSING:
+            return local
+
+        lock = self._locks.setdefault(str(key), asyncio.Lock())
+        try:
+            async with lock:
+                local = await self._lookup(key)
+                if local is MISSING:
+                    self.stats["misses"] += 1
+                    local = await self.set(key, await loader())
+        finally:
+            if not lock.locked():
+                self._locks.pop(str(key), None)
+        return local
+
+    async def invalidate(self, key=None) -> None:
+        """
+        Removes a key (or, without a key, this worker's whole L1) in every worker.
+        Without a key, L2 entries are left to expire.
+        """
+        self.evict_local(key)
+        if key is not None:
+            try:
+                await self.bus.backend.delete(self._shared_key(key))
+            except Exception as e:
+                logger.error(f"Shared cache delete of {self._shared_key(key)} failed: {e!r}")
+        await self.bus.publish(self.namespace, None if key is None else str(key))
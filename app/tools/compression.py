@@ -0,0 +1,180 @@
+import gzip
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from app.config import BROTLI_QUALITY, COMPRESSION_MIN_SIZE, GZIP_LEVEL
+from app.tools.http_cache import merge_vary
+from app.tools.single_flight import single_flight
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Supported encodings, preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def negotiate(accept_encoding: Optional[str], available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """
+    Picks the content coding for a request from its Accept-Encoding header.
+
+    Args:
+        accept_encoding (Optional[str]): The Accept-Encoding header value.
+        available (Iterable[str]): The supported encodings, preferred first.
+
+    Returns:
+        Optional[str]: The encoding with the highest q-value (ties go to the preferred one), or None for identity.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Compresses data with a content coding returned by `negotiate`.
+
+    Args:
+        data (bytes): The body.
+        encoding (str): "br" or "gzip".
+        best (bool): Use the highest level, for bodies that are compressed once and sent many times.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressedPayload:
+    """
+    A response body kept together with its compressed variants. The body is rendered on first use and each
+    variant is compressed once, on the first request that accepts it.
+
+    With `offload` (such as `Offloader.run`), get() renders and compresses through it instead of on the event loop;
+    `render` is then passed to it, so with worker processes it has to be picklable (e.g. a functools.partial of a
+    module-level function). Only offloaded variants are compressed at the highest level: on the event loop, the
+    configured levels keep the first request of a variant from holding up the others.
+    """
+
+    def __init__(self, render: Callable[[], bytes], offload: Optional[Callable[..., Awaitable]] = None):
+        self._render = render
+        self._offload = offload
+        self._raw: Optional[bytes] = None
+        self._variants: Dict[str, bytes] = {}
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = self._render()
+        return self._raw
+
+    def body(self, accept_encoding: Optional[str]) -> tuple:
+        """
+        Returns the body to send for an Accept-Encoding header.
+
+        Returns:
+            tuple: The body and its content coding (None when sent uncompressed).
+        """
+        raw = self.raw
+        encoding = negotiate(accept_encoding) if len(raw) >= COMPRESSION_MIN_SIZE else None
+        if encoding is None:
+            return raw, None
+        variant = self._variants.get(encoding)
+        if variant is None:
+            variant = self._variants[encoding] = compress(raw, encoding)
+        return variant, encoding
+
+    async def get(self, accept_encoding: Optional[str]) -> tuple:
+        """
+        Same as body(), with the rendering and compression offloaded if the payload has `offload`. Concurrent
+        requests for a variant that is not ready yet share one offloaded call.
+        """
+        if self._offload is None:
+            return self.body(accept_encoding)
+        if self._raw is None:
+            self._raw = await single_flight.do((CompressedPayload, id(self), None),
+                                               lambda: self._offload(self._render), "render_payload")
+        raw = self._raw
+        encoding = negotiate(accept_encoding) if len(raw) >= COMPRESSION_MIN_SIZE else None
+        if encoding is None:
+            return raw, None
+        variant = self._variants.get(encoding)
+        if variant is None:
+            variant = self._variants[encoding] = await single_flight.do(
+                (CompressedPayload, id(self), encoding), lambda: self._offload(compress, raw, encoding, True),
+                "compress_payload"
+            )
+        return variant, encoding
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies of compressible content types and at least `min_size` bytes,
+    with the encoding negotiated from Accept-Encoding. Responses that already have a Content-Encoding
+    (such as precompressed payloads) and streamed responses are passed through.
+    """
+
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept_encoding = next((value.decode("latin-1") for name, value in scope["headers"]
+                                if name == b"accept-encoding"), None)
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            passthrough = True
+            body = message.get("body", b"")
+            headers = start.get("headers", [])
+            names = {name.lower(): value for name, value in headers}
+            content_type = names.get(b"content-type", b"").decode("latin-1")
+            if (message.get("more_body", False) or b"content-encoding" in names or len(body) < self.min_size
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                return await send(message)
+
+            body = compress(body, encoding)
+            headers = [(name, value) for name, value in headers if name.lower() != b"content-length"]
+            headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+            await send({**start, "headers": merge_vary(headers, b"Accept-Encoding")})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,185 @@
+import abc
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import DISH_SEARCH_BACKEND
+from app.database.crud import get_dishes_by_restaurant_and_category_and_id, search_dishes_fulltext
+from app.tools.menu_cache import MenuCache, menu_cache
+from app.tools.offload import offloader
+from app.tools.single_flight import SingleFlight
+
+# Tokens are runs of letters and digits, lowercased, like the Postgres 'simple' text search configuration
+TOKEN_PATTERN = re.compile(r"\w+")
+
+SearchResult = Tuple[int, List[Tuple[dict, float]]]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold()) if text else []
+
+
+class DishSearchBackend(abc.ABC):
+    """
+    Searches the dishes of one restaurant. Every query term must match; the last term also matches as a prefix,
+    so results follow the user while they type.
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    async def search(self, session: AsyncSession, restaurant_id: int, query: str,
+                     offset: int = 0, limit: int = 20) -> SearchResult:
+        """
+        Searches the dishes of a restaurant by name and description.
+
+        Args:
+            session (AsyncSession): The SQLAlchemy asynchronous session.
+            restaurant_id (int): The ID of the restaurant.
+            query (str): The text to search for in dish names and descriptions.
+            offset (int): The number of matches to skip. Defaults to 0.
+            limit (int): The maximum number of matches to return. Defaults to 20.
+
+        Returns:
+            SearchResult: The total number of matches and the requested page of (dish details, score) pairs,
+            best match first.
+        """
+
+
+class PostgresDishSearch(DishSearchBackend):
+    """Searches with the `dishes.search_vector` tsvector column and its GIN index."""
+
+    name = "postgres"
+
+    async def search(self, session: AsyncSession, restaurant_id: int, query: str,
+                     offset: int = 0, limit: int = 20) -> SearchResult:
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        # Terms only contain word characters, so they cannot inject tsquery operators
+        tsquery = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        return await search_dishes_fulltext(session, restaurant_id, tsquery, offset, limit)
+
+
+class MenuSearchIndex:
+    """
+    Inverted index over one restaurant's menu, scored with BM25. A name occurrence of a term counts
+    NAME_WEIGHT times as much as a description occurrence.
+
+    The BM25 weight of every (term, dish) pair only depends on the menu, so it is computed once at build time;
+    a query just sums weights over the intersection of its terms, rarest term first.
+    """
+
+    NAME_WEIGHT = 3
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, dishes: List[dict]):
+        self.dishes = dishes
+        frequencies = []
+        for dish in dishes:
+            counts = Counter()
+            for term in tokenize(dish["name"]):
+                counts[term] += self.NAME_WEIGHT
+            for term in tokenize(dish["description"]):
+                counts[term] += 1
+            frequencies.append(counts)
+
+        average_length = (sum(sum(counts.values()) for counts in frequencies) / len(frequencies)) if frequencies else 0.0
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for position, counts in enumerate(frequencies):
+            norm = self.K1 * (1 - self.B + self.B * sum(counts.values()) / average_length)
+            for term, frequency in counts.items():
+                self.postings[term][position] = frequency * (self.K1 + 1) / (frequency + norm)
+
+        for term, postings in self.postings.items():
+            idf = math.log(1 + (len(dishes) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position in postings:
+                postings[position] *= idf
+
+        self.vocabulary = sorted(self.postings)
+
+    def _expand(self, prefix: str) -> List[str]:
+        start = bisect_left(self.vocabulary, prefix)
+        end = start
+        while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+            end += 1
+        return self.vocabulary[start:end]
+
+    def _group_scores(self, terms: List[str]) -> Dict[int, float]:
+        if len(terms) == 1:
+            return self.postings[terms[0]]
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            for position, weight in self.postings[term].items():
+                scores[position] += weight
+        return scores
+
+    def search(self, terms: List[str], offset: int = 0, limit: int = 20) -> SearchResult:
+        # Each query term becomes a group of index terms: the term itself, or every term it prefixes (last term)
+        groups = [[term] if term in self.postings else [] for term in terms[:-1]] + [self._expand(terms[-1])]
+        if not all(groups):
+            return 0, []
+
+        group_scores = sorted((self._group_scores(group) for group in groups), key=len)
+        scores = dict(group_scores[0])
+        for other in group_scores[1:]:
+            scores = {position: score + other[position] for position, score in scores.items() if position in other}
+            if not scores:
+                return 0, []
+
+        dishes = self.dishes
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], dishes[item[0]]["id"]))
+        return len(scores), [(dishes[position], score) for position, score in ranked[offset:]]
+
+
+class InMemoryDishSearch(DishSearchBackend):
+    """
+    Searches an inverted index built in this worker from the cached menu. The index of a restaurant is
+    rebuilt whenever its menu is reloaded into the menu cache, in an offload thread: building it for a large menu takes
+    long enough to hold up the event loop. Searches arriving meanwhile wait for the same build.
+    """
+
+    name = "memory"
+
+    def __init__(self, cache: MenuCache = menu_cache):
+        self.cache = cache
+        self._indexes: Dict[int, Tuple[int, MenuSearchIndex]] = {}
+        self._builds = SingleFlight()
+
+    async def get_index(self, session: AsyncSession, restaurant_id: int) -> MenuSearchIndex:
+        menu = await self.cache.get(
+            restaurant_id,
+            lambda: get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=restaurant_id)
+        )
+        cached = self._indexes.get(restaurant_id)
+        if cached is None or cached[0] != menu.version:
+            index = await self._builds.do((restaurant_id, menu.version),
+                                          lambda: offloader.run_in_thread(MenuSearchIndex, menu.dishes), name="search_index")
+            # The build of a newer menu version may have finished first
+            latest = self._indexes.get(restaurant_id)
+            if latest is None or latest[0] < menu.version:
+                self._indexes[restaurant_id] = (menu.version, index)
+            return index
+        return cached[1]
+
+    async def search(self, session: AsyncSession, restaurant_id: int, query: str,
+                     offset: int = 0, limit: int = 20) -> SearchResult:
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        index = await self.get_index(session, restaurant_id)
+        return index.search(terms, offset, limit)
+
+
+DISH_SEARCH_BACKENDS = {
+    PostgresDishSearch.name: PostgresDishSearch,
+    InMemoryDishSearch.name: InMemoryDishSearch,
+}
+
+dish_search = DISH_SEARCH_BACKENDS[DISH_SEARCH_BACKEND]()
@@ -1,6 +1,11 @@
-import aiofiles
+import logging
 import os
 
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+
 async def read_photo(photo_path):
     """
     Asynchronously reads the contents of a photo file.
@@ -29,11 +34,9 @@ async def read_photo(photo_path):
     _, file_extension = os.path.splitext(photo_path)
     file_extension = file_extension[1:].lower()  # Remove the leading dot and convert to lowercase
 
-    print(f"File extension: {file_extension}")
-
     # Check if the file extension is allowed
     if file_extension not in allowed_extensions:
-        print(f"Invalid file extension: {file_extension}")
+        logger.warning(f"Invalid file extension: {file_extension}")
         return None
 
     try:
@@ -41,8 +44,8 @@ async def read_photo(photo_path):
             photo_data = await photo_file.read()
             return photo_data
     except FileNotFoundError:
-        print(f"File not found: {photo_path}")
+        logger.debug(f"File not found: {photo_path}")
         return None
     except Exception as e:
-        print(f"Error reading photo {photo_path}: {e}")
+        logger.warning(f"Error reading photo {photo_path}: {e}")
         return None
@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+
+from app.config import CACHE_POLICIES
+
+
+def cache_control(policy: dict) -> str:
+    """
+    Builds the Cache-Control value of a policy from CACHE_POLICIES.
+
+    Args:
+        policy (dict): The policy, with `max_age` and `stale_while_revalidate` in seconds.
+
+    Returns:
+        str: The header value.
+    """
+    return f"public, max-age={int(policy['max_age'])}, stale-while-revalidate={int(policy['stale_while_revalidate'])}"
+
+
+class CachePolicyMiddleware:
+    """
+    ASGI middleware adding the Cache-Control and Vary headers of CACHE_POLICIES to successful GET and HEAD
+    responses. The policy is chosen by the first path segment (the router prefix); a Cache-Control header
+    set by the endpoint itself is kept.
+    """
+
+    def __init__(self, app, policies: Dict[str, dict] = CACHE_POLICIES):
+        self.app = app
+        self.headers = {
+            prefix: (cache_control(policy).encode(), policy.get("vary", "").encode())
+            for prefix, policy in policies.items()
+        }
+
+    def _match(self, path: str) -> Optional[tuple]:
+        return self.headers.get("/" + path.split("/", 2)[1])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+        headers = self._match(scope["path"])
+        if headers is None:
+            return await self.app(scope, receive, send)
+        cache_control_value, vary = headers
+
+        async def send_with_policy(message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 203, 204, 304):
+                response_headers = list(message.get("headers", []))
+                names = {name.lower() for name, _ in response_headers}
+                if b"cache-control" not in names:
+                    response_headers.append((b"cache-control", cache_control_value))
+                if vary:
+                    response_headers = merge_vary(response_headers, vary)
+                message = {**message, "headers": response_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_policy)
+
+
+def merge_vary(headers: list, vary: bytes) -> list:
+    """Adds the fields of `vary` to the Vary header of raw ASGI headers, without duplicates."""
+    existing = [value for name, value in headers if name.lower() == b"vary"]
+    fields = []
+    for value in existing + [vary]:
+        for field in value.split(b","):
+            field = field.strip()
+            if field and field.lower() not in {f.lower() for f in fields}:
+                fields.append(field)
+    return [(name, value) for name, value in headers if name.lower() != b"vary"] + [(b"vary", b", ".join(fields))]
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from app.config import IMAGE_BUNDLE_DIR, IMAGE_BUNDLE_THUMBNAIL_SIZE
+from app.tools.image_catalog import ImageCatalog, ImageFile, image_catalog
+from app.tools.menu_cache import menu_cache
+from app.tools.single_flight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_VERSION = re.compile(r"^[0-9a-f]{40}$")
+
+# Seconds older versions of a bundle are kept after a newer one replaced them, for workers and clients still using
+# the old manifest. When a version is replaced, an empty `.superseded` file next to it records the time.
+OLD_VERSION_GRACE = 3600
+
+
+def make_thumbnail(data: bytes, media_type: str, size: int) -> Tuple[bytes, str]:
+    """
+    Downscales a photo so that it fits in `size` x `size` pixels, keeping its format.
+    Without Pillow, or if the photo cannot be decoded, the photo is returned as is.
+
+    Returns:
+        Tuple[bytes, str]: The photo and its media type.
+    """
+    if Image is None or size <= 0:
+        return data, media_type
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= size:
+                return data, media_type
+            image_format = image.format
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            image.save(output, format=image_format)
+            return output.getvalue(), media_type
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not make a thumbnail ({media_type}): {e!r}")
+        return data, media_type
+
+
+def bundle_key(restaurant_id: int, category_id: Optional[int]) -> str:
+    return f"{restaurant_id}-{'all' if category_id is None else category_id}"
+
+
+class ImageBundles:
+    """
+    All photos of a restaurant's menu (or of one category) concatenated in one file, with a manifest giving the
+    offset, length and media type of each photo. A dish list fetches the manifest and the bundle instead of one
+    /images request per dish.
+
+    A bundle's version is a digest of its photo names and their ETags, so a bundle changes whenever the menu or
+    one of its photos does. Bundles are built in a thread, once per version and host: the bundle and its manifest
+    are written to IMAGE_BUNDLE_DIR, where every worker finds them. When the image catalogue reports a changed
+    restaurant folder, the whole-menu bundle of that restaurant is rebuilt in the background.
+    """
+
+    def __init__(self, directory: str = IMAGE_BUNDLE_DIR, catalog: ImageCatalog = image_catalog,
+                 thumbnail_size: int = IMAGE_BUNDLE_THUMBNAIL_SIZE):
+        self.directory = directory
+        self.catalog = catalog
+        self.thumbnail_size = thumbnail_size
+        # Bundle key -> manifest of its current version in this worker
+        self._manifests: Dict[str, dict] = {}
+        self._builds = SingleFlight()
+        self._rebuilds: Set[asyncio.Task] = set()
+        catalog.add_listener(self._photos_changed)
+
+    def images(self, restaurant_id: int, dishes: List[dict], category_id: Optional[int] = None) -> Dict[str, ImageFile]:
+        """Returns the existing photos of the dishes (of a category), by name, in menu order."""
+        images = {}
+        for dish in dishes:
+            if category_id is not None and dish["category_id"] != category_id:
+                continue
+            photo = dish["photo"]
+            if photo and photo not in images:
+                image = self.catalog.lookup(restaurant_id, photo)
+                if image is not None:
+                    images[photo] = image
+        return images
+
+    def version(self, images: Dict[str, ImageFile]) -> str:
+        digest = hashlib.sha1(str(self.thumbnail_size).encode())
+        for photo, image in images.items():
+            digest.update(f"\0{photo}\0{image.etag}".encode())
+        return digest.hexdigest()
+
+    def path(self, restaurant_id: int, category_id: Optional[int], version: str, extension: str = "bin") -> Optional[str]:
+        """Returns the file of a bundle version, or None if `version` is not a valid version."""
+        if not BUNDLE_VERSION.match(version):
+            return None
+        return os.path.join(self.directory, f"{bundle_key(restaurant_id, category_id)}-{version}.{extension}")
+
+    async def get(self, restaurant_id: int, dishes: List[dict], category_id: Optional[int] = None) -> dict:
+        """
+        Returns the manifest of the current bundle of a menu, building the bundle first if needed.
+
+        Args:
+            restaurant_id (int): The ID of the restaurant.
+            dishes (List[dict]): The dishes of the restaurant, as cached by the menu cache.
+            category_id (Optional[int]): Only bundle the photos of this category.
+
+        Returns:
+            dict: The manifest: `version`, `size` and, by photo name, the `offset`, `length` and `media_type` of
+            each photo. It is shared and must not be modified.
+        """
+        images = self.images(restaurant_id, dishes, category_id)
+        version = self.version(images)
+        key = bundle_key(restaurant_id, category_id)
+        manifest = self._manifests.get(key)
+        if manifest is None or manifest["version"] != version:
+            manifest = await self._builds.do(
+                (key, version),
+                lambda: asyncio.to_thread(self._load_or_build, restaurant_id, category_id, version, images),
+                name="image_bundle"
+            )
+            self._manifests[key] = manifest
+        return manifest
+
+    def _load_or_build(self, restaurant_id: int, category_id: Optional[int], version: str,
+                       images: Dict[str, ImageFile]) -> dict:
+        manifest_path = self.path(restaurant_id, category_id, version, "json")
+        try:
+            with open(manifest_path, "rb") as file:
+                manifest = orjson.loads(file.read())
+        except FileNotFoundError:
+            pass
+        else:
+            # A version can become current again, e.g. when a replaced photo is put back
+            self._remove(self.path(restaurant_id, category_id, version, "superseded"))
+            return manifest
+
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        bundle_path = self.path(restaurant_id, category_id, version)
+        entries, offset = {}, 0
+        with open(f"{bundle_path}.{os.getpid()}.tmp", "wb") as bundle:
+            for photo, image in images.items():
+                try:
+                    with open(image.path, "rb") as file:
+                        data = file.read()
+                except OSError:
+                    # Removed since the catalogue was updated
+                    continue
+                data, media_type = make_thumbnail(data, image.media_type, self.thumbnail_size)
+                bundle.write(data)
+                entries[photo] = {"offset": offset, "length": len(data), "media_type": media_type}
+                offset += len(data)
+        os.replace(bundle.name, bundle_path)
+        # The manifest is written last: once it exists, the bundle is complete
+        manifest = {"version": version, "size": offset, "images": entries}
+        with open(f"{manifest_path}.{os.getpid()}.tmp", "wb") as file:
+            file.write(orjson.dumps(manifest))
+        os.replace(file.name, manifest_path)
+
+        self._remove_old_versions(bundle_key(restaurant_id, category_id), version)
+        logger.info(f"Built image bundle {bundle_key(restaurant_id, category_id)}: {len(entries)} photos, "
+                    f"{offset} bytes in {time.perf_counter() - started:.2f} s")
+        return manifest
+
+    def _remove_old_versions(self, key: str, version: str) -> None:
+        """
+        Marks the other versions of a bundle as superseded, and removes those superseded more than
+        OLD_VERSION_GRACE seconds ago. Their build time does not matter: a bundle built long ago may have been
+        current until now.
+        """
+        expired = time.time() - OLD_VERSION_GRACE
+        for entry in os.scandir(self.directory):
+            name, _, extension = entry.name.rpartition(".")
+            old_version = name[len(key) + 1:]
+            if (extension != "json" or not name.startswith(f"{key}-") or old_version == version
+                    or not BUNDLE_VERSION.match(old_version)):
+                continue
+            marker = os.path.join(self.directory, f"{name}.superseded")
+            try:
+                superseded_at = os.stat(marker).st_mtime
+            except FileNotFoundError:
+                open(marker, "ab").close()
+                continue
+            if superseded_at < expired:
+                # The manifest first: without it, the version is not used any more
+                for extension in ("json", "bin", "superseded"):
+                    self._remove(os.path.join(self.directory, f"{name}.{extension}"))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _photos_changed(self, folders: Set[str], paths: List[str]) -> None:
+        for folder in folders:
+            if not folder:
+                continue
+            for key in [key for key in self._manifests if key.startswith(f"{folder}-")]:
+                del self._manifests[key]
+            menu = menu_cache.peek(int(folder))
+            if menu is not None and menu.dishes:
+                task = asyncio.create_task(self._rebuild(int(folder), menu.dishes))
+                self._rebuilds.add(task)
+                task.add_done_callback(self._rebuilds.discard)
+
+    async def _rebuild(self, restaurant_id: int, dishes: List[dict]) -> None:
+        try:
+            await self.get(restaurant_id, dishes)
+        except Exception as e:
+            logger.error(f"Rebuilding the image bundle of restaurant {restaurant_id} failed: {e!r}")
+
+
+image_bundles = ImageBundles()
@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL
+from app.tools.functions import read_photo
+from app.tools.image_catalog import image_catalog
+
+
+class ImageCache:
+    """
+    Per-worker LRU cache of photo bytes keyed by file path, bounded by the total size of the cached files.
+    Files the image catalogue sees change are evicted right away; entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def get(self, path: str) -> Optional[bytes]:
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        data, loaded_at = entry
+        if time.monotonic() - loaded_at >= self.ttl:
+            self.discard(path)
+            return None
+        self._entries.move_to_end(path)
+        return data
+
+    def put(self, path: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        self.discard(path)
+        self._entries[path] = (data, time.monotonic())
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def discard(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    async def read(self, path: str) -> Optional[bytes]:
+        """
+        Returns the bytes of a photo, reading the file through `read_photo` on a cache miss.
+
+        Args:
+            path (str): The path to the photo file.
+
+        Returns:
+            bytes | None: The photo bytes, or None if the file cannot be read.
+        """
+        data = self.get(path)
+        if data is None:
+            data = await read_photo(path)
+            if data is not None:
+                self.put(path, data)
+        return data
+
+
+image_cache = ImageCache(max_bytes=IMAGE_CACHE_MAX_BYTES, ttl=IMAGE_CACHE_TTL)
+
+
+def _evict_changed_files(folders, paths) -> None:
+    for path in paths:
+        image_cache.discard(path)
+
+
+image_catalog.add_listener(_evict_changed_files)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from app.config import DEFAULT_PHOTO, IMAGE_CACHE_TTL, IMAGE_WATCH_ENABLED, MAIN_PHOTO_FOLDER, MIME_TYPES
+
+try:
+    import watchfiles
+except ImportError:  # optional dependency, installed with uvicorn[standard]
+    watchfiles = None
+
+logger = logging.getLogger(__name__)
+
+
+class ImageFile(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    media_type: str
+    etag: str
+
+
+def scan_directory(directory: str) -> Dict[str, ImageFile]:
+    """
+    Lists the image files directly inside a directory. Blocking; run it in a thread.
+
+    Returns:
+        Dict[str, ImageFile]: The files by name; empty if the directory does not exist.
+    """
+    files = {}
+    try:
+        entries = list(os.scandir(directory))
+    except (FileNotFoundError, NotADirectoryError):
+        return files
+    for entry in entries:
+        media_type = MIME_TYPES.get(os.path.splitext(entry.name)[1][1:].lower())
+        if media_type is None:
+            continue
+        try:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+        except OSError:
+            continue
+        files[entry.name] = ImageFile(entry.path, stat.st_size, stat.st_mtime_ns, media_type,
+                                      f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"')
+    return files
+
+
+class ImageCatalog:
+    """
+    In-memory index of the photos in MAIN_PHOTO_FOLDER: the files in the folder itself (such as the default photo)
+    and in one sub-folder per restaurant ID. Requests are resolved with dict lookups, without touching the
+    filesystem, so a photo name can only ever match a file of its restaurant's folder.
+
+    The index is built at startup in a thread and kept up to date by watching the folder with watchfiles
+    (changed folders are re-scanned), or by re-scanning everything every IMAGE_CACHE_TTL seconds when watching
+    is disabled or watchfiles is missing.
+    """
+
+    def __init__(self, root: str = MAIN_PHOTO_FOLDER, default_photo: str = DEFAULT_PHOTO):
+        self.root = root
+        self.default_photo = default_photo
+        # Folder name ("" for the root folder) -> file name -> file
+        self._folders: Dict[str, Dict[str, ImageFile]] = {}
+        self._listeners: List[Callable[[Set[str], List[str]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[Set[str], List[str]], None]) -> None:
+        """
+        Registers a callback for changes, called with the changed folder names and the paths of the files
+        that were changed or removed.
+        """
+        self._listeners.append(listener)
+
+    def lookup(self, restaurant_id: Optional[int], photo: Optional[str]) -> Optional[ImageFile]:
+        if restaurant_id is None or not photo:
+            return None
+        return self._folders.get(str(restaurant_id), {}).get(photo)
+
+    def default(self) -> Optional[ImageFile]:
+        return self._folders.get("", {}).get(self.default_photo)
+
+    def files(self, restaurant_id: int) -> Dict[str, ImageFile]:
+        """Returns the photos of a restaurant by name. The dict must not be modified."""
+        return self._folders.get(str(restaurant_id), {})
+
+    def _scan_all(self) -> Dict[str, Dict[str, ImageFile]]:
+        folders = {"": scan_directory(self.root)}
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return folders
+        for entry in entries:
+            if entry.is_dir() and entry.name.isdigit():
+                folders[entry.name] = scan_directory(entry.path)
+        return folders
+
+    async def load(self) -> int:
+        """
+        Scans the whole photo folder in a thread and replaces the index.
+
+        Returns:
+            int: The number of photos found.
+        """
+        folders = await asyncio.to_thread(self._scan_all)
+        self._apply(folders, set(self._folders) | set(folders))
+        return sum(len(files) for files in folders.values())
+
+    async def refresh(self, names: Iterable[str]) -> None:
+        """Re-scans some folders ("" for the root folder) in a thread."""
+        names = set(names)
+        scanned = await asyncio.to_thread(
+            lambda: {name: scan_directory(os.path.join(self.root, name) if name else self.root) for name in names}
+        )
+        self._apply(scanned, names)
+
+    def _apply(self, scanned: Dict[str, Dict[str, ImageFile]], names: Set[str]) -> None:
+        changed_paths = []
+        for name in names:
+            old, new = self._folders.get(name, {}), scanned.get(name, {})
+            changed_paths += [file.path for photo, file in old.items() if new.get(photo) != file]
+            if new:
+                self._folders[name] = new
+            else:
+                self._folders.pop(name, None)
+        for listener in self._listeners:
+            listener(names, changed_paths)
+
+    def _folder_of(self, path: str) -> Optional[str]:
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        if len(parts) == 1:
+            # A file of the root folder, or a restaurant folder itself
+            return parts[0] if parts[0].isdigit() else ""
+        if len(parts) == 2 and parts[0].isdigit():
+            return parts[0]
+        return None
+
+    async def start(self) -> None:
+        """Builds the index and starts keeping it up to date. Call once per process, from the application lifespan."""
+        photos = await self.load()
+        logger.info(f"Image catalogue: {photos} photos in {self.root}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _watch(self) -> None:
+        rescan = False
+        while True:
+            try:
+                if rescan:
+                    await self.load()
+                    rescan = False
+                if watchfiles is None or not IMAGE_WATCH_ENABLED or not os.path.isdir(self.root):
+                    await asyncio.sleep(IMAGE_CACHE_TTL)
+                    rescan = True
+                    continue
+                async for changes in watchfiles.awatch(self.root, recursive=True):
+                    names = {self._folder_of(path) for _, path in changes} - {None}
+                    if names:
+                        await self.refresh(names)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Watching {self.root} failed, re-scanning: {e!r}")
+                await asyncio.sleep(1)
+                rescan = True
+
+
+image_catalog = ImageCatalog()
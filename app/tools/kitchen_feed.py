@@ -0,0 +1,48 @@
+import asyncio
+from typing import Dict
+
+
+class KitchenFeed:
+    """
+    Wakes long-polling kitchen screens as soon as a basket of their restaurant changes in this worker.
+
+    Changes made by other workers are not broadcast here; waiting screens pick them up on their next
+    periodic re-check of the database.
+    """
+
+    def __init__(self):
+        self._events: Dict[int, asyncio.Event] = {}
+
+    def notify(self, restaurant_id: int) -> None:
+        """
+        Wakes every screen currently waiting on the given restaurant.
+
+        Args:
+            restaurant_id (int): The ID of the restaurant whose baskets changed.
+        """
+        event = self._events.pop(restaurant_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, restaurant_id: int, timeout: float) -> bool:
+        """
+        Waits until the restaurant is notified or the timeout expires.
+
+        Args:
+            restaurant_id (int): The ID of the restaurant to wait on.
+            timeout (float): The maximum number of seconds to wait.
+
+        Returns:
+            bool: True if woken by a notification, False on timeout.
+        """
+        event = self._events.get(restaurant_id)
+        if event is None:
+            event = self._events[restaurant_id] = asyncio.Event()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+kitchen_feed = KitchenFeed()
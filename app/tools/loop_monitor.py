@@ -0,0 +1,148 @@
+"""
+Event loop monitor: measures how late the event loop runs its callbacks, and finds the code that holds it up.
+
+Anything that runs on the loop without awaiting (file checks, compression, validating a large menu) delays every
+other request of the worker by as long as it runs. A task sleeping a short interval over and over sees that delay
+as lag when it wakes up. While the loop is held up, the task cannot report anything itself, so a watchdog thread
+notices that the task is overdue and takes the stack of the loop thread with sys._current_frames(): the stack of the
+blocking code, while it is still running.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Optional
+
+from app.config import LOOP_BLOCK_THRESHOLD, LOOP_MONITOR_INTERVAL, LOOP_MONITOR_WINDOW
+from app.tools.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("event_loop_lag_seconds", "gauge", "Delay of the event loop's wake-ups over the recent samples")
+metrics.describe("event_loop_blocked_total", "counter", "Times the event loop was held up beyond the block threshold")
+metrics.describe("event_loop_blocked_seconds_total", "counter", "Time the event loop was held up beyond the block threshold")
+
+QUANTILES = (0.5, 0.99, 1.0)
+
+
+class LoopMonitor:
+    """
+    Samples the event loop lag every `interval` seconds and keeps the last `window` samples. A lag beyond
+    `block_threshold` is logged with the stack the watchdog thread captured while the loop was blocked.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, block_threshold: float = LOOP_BLOCK_THRESHOLD,
+                 window: int = LOOP_MONITOR_WINDOW):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lags: Deque[float] = deque(maxlen=window)
+        # The last few blocks: lag, task and stack, for inspection from a debugger or a test
+        self.blocks: Deque[dict] = deque(maxlen=20)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # When the sampling task should wake up next (time.monotonic()), and the stack captured while it was late for
+        # it; each is written by one thread and read by the other, as a single attribute assignment
+        self._due: Optional[float] = None
+        self._captured: Optional[dict] = None
+
+    def percentile(self, q: float) -> float:
+        """Returns the `q`th percentile (0-100) of the recent lags, in seconds."""
+        if not self.lags:
+            return 0.0
+        lags = sorted(self.lags)
+        return lags[min(len(lags) - 1, int(q / 100 * len(lags)))]
+
+    @property
+    def max(self) -> float:
+        return max(self.lags, default=0.0)
+
+    def report(self) -> str:
+        return (f"loop lag over {len(self.lags)} samples: p50 {self.percentile(50) * 1000:.1f} ms, "
+                f"p99 {self.percentile(99) * 1000:.1f} ms, max {self.max * 1000:.1f} ms")
+
+    async def start(self) -> None:
+        """Starts the sampling task and the watchdog thread. Call once per process, from the application lifespan."""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, args=(loop, threading.get_ident()),
+                                          name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.to_thread(self._watchdog.join)
+        self._task = self._watchdog = self._due = None
+
+    async def __aenter__(self) -> "LoopMonitor":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _sample(self) -> None:
+        samples = 0
+        while True:
+            started = time.monotonic()
+            due = self._due = started + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.lags.append(lag)
+            if lag > self.block_threshold:
+                captured = self._captured
+                self._blocked(lag, captured if captured is not None and captured["due"] == due else None)
+
+            # The quantiles are published about once per second
+            samples += 1
+            if samples * self.interval >= 1 or lag > self.block_threshold:
+                samples = 0
+                for q in QUANTILES:
+                    metrics.set("event_loop_lag_seconds", self.percentile(q * 100), quantile=q)
+
+    def _blocked(self, lag: float, captured: Optional[dict]) -> None:
+        metrics.inc("event_loop_blocked_total")
+        metrics.inc("event_loop_blocked_seconds_total", amount=lag)
+        if captured is None:
+            # Blocked for less than the watchdog's polling period
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms; no stack was captured")
+            return
+        self.blocks.append({"lag": lag, "task": captured["task"], "stack": captured["stack"]})
+        logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms in {captured['task']}, "
+                       f"stack at {captured['after'] * 1000:.0f} ms:\n{captured['stack']}")
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int) -> None:
+        captured_for = None
+        while not self._stopped.wait(self.block_threshold / 2):
+            due = self._due
+            if due is None or due == captured_for:
+                continue
+            overdue = time.monotonic() - due
+            if overdue <= self.block_threshold:
+                continue
+            frame = sys._current_frames().get(loop_thread)
+            if frame is None:
+                continue
+            captured_for = due
+            self._captured = {"due": due, "task": describe_task(asyncio.current_task(loop)), "after": overdue,
+                              "stack": "".join(traceback.format_stack(frame))}
+
+
+def describe_task(task: Optional[asyncio.Task]) -> str:
+    if task is None:
+        return "a callback outside of any task"
+    coro = task.get_coro()
+    return f"task {task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+
+loop_monitor = LoopMonitor()
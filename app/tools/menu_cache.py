@@ -0,0 +1,113 @@
+import functools
+import time
+from decimal import Decimal
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from app.config import COMPRESSION_MIN_SIZE, MENU_CACHE_TTL, MENU_STALE_TTL
+from app.database.crud import get_dishes_by_restaurant_and_category_and_id
+from app.database.postgre_db import async_session, get_engine
+from app.database.schemas import DishSchema
+from app.tools.cache import MISSING, TwoLevelCache
+from app.tools.compression import CompressedPayload, compress
+from app.tools.offload import offloader
+
+dish_list_adapter = TypeAdapter(List[DishSchema])
+
+
+# Dishes validated and serialized per pydantic-core call. A call holds the GIL until it returns, so when a large
+# menu is rendered in a thread, the event loop can only take over between chunks.
+RENDER_CHUNK_SIZE = 500
+
+
+def dump_dishes(dishes: List[dict]) -> bytes:
+    """Validates dishes and serializes them to the /dishes response body; importable, so it can run in a process."""
+    if len(dishes) <= RENDER_CHUNK_SIZE:
+        return dish_list_adapter.dump_json(dish_list_adapter.validate_python(dishes))
+    # The same bytes as in one call: the chunks' arrays are joined into one
+    chunks = (dish_list_adapter.dump_json(dish_list_adapter.validate_python(dishes[start:start + RENDER_CHUNK_SIZE]))
+              for start in range(0, len(dishes), RENDER_CHUNK_SIZE))
+    return b"[" + b",".join(chunk[1:-1] for chunk in chunks) + b"]"
+
+
+def render_dishes(dishes: List[dict], encoding: Optional[str] = None) -> Tuple[bytes, Optional[str]]:
+    """
+    Renders the body of a large /dishes result in one offloaded call: serialized, then compressed with `encoding`
+    if it is large enough.
+
+    Returns:
+        Tuple[bytes, Optional[str]]: The body and its content coding (None when it is not compressed).
+    """
+    body = dump_dishes(dishes)
+    if encoding is None or len(body) < COMPRESSION_MIN_SIZE:
+        return body, None
+    return compress(body, encoding), encoding
+
+
+class MenuEntry(NamedTuple):
+    dishes: List[dict]
+    version: int
+    loaded_at: float
+    # The /dishes response body of the whole menu, with its compressed variants
+    payload: CompressedPayload
+
+
+class MenuCache(TwoLevelCache):
+    """
+    Two-level cache of restaurant menus, as returned by `get_dishes_by_restaurant_and_category_and_id`
+    for a restaurant without further filters.
+
+    Each menu that enters this worker's L1 gets a new `version`, so structures derived from a menu (such as
+    the in-memory search index) can tell when to rebuild. Cached dish dicts are shared between requests and
+    must not be mutated.
+
+    An expired menu is still served for `stale_ttl` seconds while it is reloaded in the background,
+    so requests only wait for the database when a menu is not cached at all.
+    """
+
+    def __init__(self, ttl: float = 60.0, **kwargs):
+        super().__init__("menu", ttl, reload=self._reload, **kwargs)
+        self._version = 0
+
+    async def _reload(self, restaurant_id: str) -> Optional[List[dict]]:
+        get_engine()
+        async with async_session() as session:
+            return await get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=int(restaurant_id))
+
+    def to_local(self, dishes: Optional[List[dict]]) -> MenuEntry:
+        dishes = dishes or []
+        for dish in dishes:
+            # Prices come back from the shared cache as strings
+            if not isinstance(dish["price"], Decimal):
+                dish["price"] = Decimal(dish["price"])
+        self._version += 1
+        # Large menus are rendered and compressed off the event loop
+        payload = CompressedPayload(functools.partial(dump_dishes, dishes),
+                                    offloader.run if offloader.should_offload(len(dishes)) else None)
+        return MenuEntry(dishes, self._version, time.monotonic(), payload)
+
+    def to_shared(self, entry: MenuEntry) -> List[dict]:
+        return entry.dishes
+
+    def peek(self, restaurant_id: int) -> Optional[MenuEntry]:
+        """Returns the menu of a restaurant if this worker has it cached, without loading it."""
+        entry = self.get_local(restaurant_id)
+        return None if entry is MISSING else entry
+
+    async def get(self, restaurant_id: int, loader: Callable[[], Awaitable[Optional[List[dict]]]]) -> MenuEntry:
+        """
+        Returns the menu of a restaurant, loading it through `loader` when no cache level has it.
+        A stale menu is returned as is and refreshed in the background.
+
+        Args:
+            restaurant_id (int): The ID of the restaurant.
+            loader (Callable[[], Awaitable[Optional[List[dict]]]]): Loads the restaurant's dishes; None means no dishes.
+
+        Returns:
+            MenuEntry: The dishes of the restaurant and their version in this worker.
+        """
+        return await self.get_or_load(restaurant_id, loader)
+
+
+menu_cache = MenuCache(ttl=MENU_CACHE_TTL, stale_ttl=MENU_STALE_TTL)
@@ -0,0 +1,377 @@
+"""
+Menu imports and bulk price updates.
+
+Imports read a CSV file (with a header row) or NDJSON (one JSON object per line), spooled in full before the import
+starts, so a slow upload does not hold a transaction open. Each row is a dish
+with `name`, `category_id`, `price` and optionally `description`, `photo` and `extra` (in CSV, a JSON object such as
+`{"1": ["Cheese", 0.5]}`). Rows are handled MENU_IMPORT_BATCH_SIZE at a time: prices are adjusted and checked as
+columns, with NumPy when it is installed, then the batch is upserted by (restaurant_id, name).
+Everything runs in the caller's transaction, so an import or price update is applied completely or not at all.
+"""
+import asyncio
+import csv
+import logging
+import math
+import tempfile
+import time
+from typing import IO, AsyncIterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (MENU_IMPORT_BATCH_SIZE, MENU_IMPORT_MAX_BYTES, MENU_IMPORT_MAX_ERRORS,
+                        MENU_IMPORT_MAX_RECORD_BYTES, MENU_IMPORT_SPOOL_MEMORY)
+from app.database.crud import get_category_ids, get_dish_prices, update_dish_prices, upsert_dishes
+
+try:
+    import numpy
+except ImportError:  # optional dependency
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+
+# The csv module rejects fields longer than 128 KiB by default, below the longest row an import accepts
+csv.field_size_limit(max(csv.field_size_limit(), MENU_IMPORT_MAX_RECORD_BYTES))
+
+
+class MenuImportError(Exception):
+    """Raised when rows are invalid; nothing has been written once the transaction is rolled back."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+class ImportTooLarge(Exception):
+    """Raised when the uploaded file is larger than MENU_IMPORT_MAX_BYTES."""
+
+
+class ImportStats(NamedTuple):
+    rows: int
+    inserted: int
+    updated: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def adjust_prices(prices: Sequence[float], factor: float = 1.0, delta: float = 0.0) -> List[float]:
+    """
+    Computes `price * factor + delta`, rounded to cents, for a column of prices.
+    The NumPy and pure Python paths round the same way (half to even, on the same float operations).
+
+    Args:
+        prices (Sequence[float]): The prices.
+        factor (float): The multiplier, e.g. 1.05 for +5%.
+        delta (float): The amount added after multiplying.
+
+    Returns:
+        List[float]: The new prices.
+    """
+    if numpy is not None:
+        column = numpy.asarray(prices, dtype=numpy.float64)
+        return (numpy.rint((column * factor + delta) * 100) / 100).tolist()
+    return [round((price * factor + delta) * 100) / 100 for price in prices]
+
+
+def invalid_prices(prices: Sequence[float]) -> List[int]:
+    """Returns the positions of the prices that are negative, infinite or NaN."""
+    if numpy is not None:
+        column = numpy.asarray(prices, dtype=numpy.float64)
+        return numpy.flatnonzero(~numpy.isfinite(column) | (column < 0)).tolist()
+    return [i for i, price in enumerate(prices) if not math.isfinite(price) or price < 0]
+
+
+def reprice_extras(extras: Sequence[Optional[dict]], factor: float) -> List[Optional[dict]]:
+    """
+    Multiplies the prices of the extras of many dishes as one column. Extras are `{key: [description, price]}`.
+
+    Returns:
+        List[Optional[dict]]: New extras dicts, in the same order.
+    """
+    flat = [float(price) for extra in extras if extra for _, price in extra.values()]
+    if not flat or factor == 1.0:
+        return list(extras)
+    new_prices = iter(adjust_prices(flat, factor))
+    return [{key: [description, next(new_prices)] for key, (description, _) in extra.items()} if extra else extra
+            for extra in extras]
+
+
+async def spool(chunks: AsyncIterator[bytes], max_bytes: int = MENU_IMPORT_MAX_BYTES,
+                memory: int = MENU_IMPORT_SPOOL_MEMORY) -> IO[bytes]:
+    """
+    Reads a whole upload into a temporary file, kept in memory up to `memory` bytes. The caller closes it.
+
+    Raises:
+        ImportTooLarge: If the upload is longer than `max_bytes`.
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=memory)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise ImportTooLarge(f"The file is larger than {max_bytes} bytes")
+            if size <= memory:
+                file.write(chunk)
+            else:
+                # Written to disk from here on
+                await asyncio.to_thread(file.write, chunk)
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+    return file
+
+
+async def read_spooled(file: IO[bytes], chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+    """Yields the content of a file written by `spool`, reading it in a thread."""
+    while True:
+        chunk = await asyncio.to_thread(file.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def iter_records(chunks: AsyncIterator[bytes], quoted: bool = False,
+                       max_bytes: int = MENU_IMPORT_MAX_RECORD_BYTES) -> AsyncIterator[str]:
+    """
+    Splits a byte stream into lines. With `quoted` (CSV), a quoted field that contains line breaks stays in one record.
+    Records keep their line break, as the csv module expects. Each byte is scanned once, however the records are split
+    across chunks.
+
+    Raises:
+        MenuImportError: If a record is longer than `max_bytes`, or is not valid UTF-8.
+    """
+    buffer = bytearray()
+    # How far the buffer has been scanned, and the quotes found in the current record up to there
+    scanned = quotes = records = 0
+    async for chunk in chunks:
+        buffer += chunk
+        record_start = 0
+        while True:
+            end = buffer.find(b"\n", scanned)
+            if end == -1:
+                break
+            if quoted:
+                quotes += buffer.count(b'"', scanned, end)
+            scanned = end + 1
+            # An odd number of quotes means the line break is inside a quoted field
+            if quoted and quotes % 2:
+                continue
+            records += 1
+            if scanned - record_start > max_bytes:
+                raise MenuImportError([f"line {records}: longer than {max_bytes} bytes"])
+            yield decode(buffer[record_start:scanned], records)
+            record_start, quotes = scanned, 0
+        if quoted:
+            quotes += buffer.count(b'"', scanned)
+        scanned = len(buffer) - record_start
+        del buffer[:record_start]
+        if len(buffer) > max_bytes:
+            raise MenuImportError([f"line {records + 1}: longer than {max_bytes} bytes"])
+    if buffer.strip():
+        yield decode(buffer, records + 1)
+
+
+def decode(record: bytearray, line: int) -> str:
+    try:
+        return record.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Excel saves CSV files in the Windows code page unless told otherwise
+        raise MenuImportError([f"line {line}: not UTF-8 ({e.reason} at byte {e.start}); save the file as UTF-8"])
+
+
+def parse_dish(raw: dict, line: int, errors: List[str]) -> Optional[dict]:
+    """
+    Converts one imported row into dish columns, or appends what is wrong with it to `errors`.
+    """
+    try:
+        if not isinstance(raw, dict):
+            raise ValueError("not a JSON object")
+        name = str(raw.get("name") or "").strip()
+        if not name:
+            raise ValueError("name is missing")
+        extra = raw.get("extra") or None
+        if isinstance(extra, str):
+            extra = orjson.loads(extra)
+        if extra is not None:
+            if not isinstance(extra, dict):
+                raise ValueError("extra must be an object")
+            extra = {str(key): [str(description), float(price)] for key, (description, price) in extra.items()}
+        return {
+            "name": name,
+            "category_id": int(raw["category_id"]),
+            "price": float(raw["price"]),
+            "description": str(raw.get("description") or ""),
+            "photo": raw.get("photo") or None,
+            "extra": extra,
+        }
+    except (KeyError, TypeError, ValueError, orjson.JSONDecodeError) as e:
+        errors.append(f"line {line}: {e!r}")
+        return None
+
+
+async def iter_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple]:
+    """
+    Yields (line number, raw row) for each row of a CSV or NDJSON stream; the row is None if it is not valid JSON.
+
+    Raises:
+        MenuImportError: If a row is too long, is not UTF-8 or is not valid CSV.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}. Use one of {', '.join(FORMATS)}")
+    header = None
+    line = 0
+    async for record in iter_records(chunks, quoted=fmt == "csv"):
+        line += 1
+        if not record.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                yield line, orjson.loads(record)
+            except orjson.JSONDecodeError:
+                yield line, None
+            continue
+        try:
+            values = next(csv.reader([record]))
+        except csv.Error as e:
+            raise MenuImportError([f"line {line}: {e}"])
+        if header is None:
+            # Files saved by Excel start with a byte order mark
+            header = [name.strip().lstrip("\ufeff") for name in values]
+            continue
+        yield line, dict(zip(header, values))
+
+
+def check_batch(batch: List[dict], lines: List[int], category_ids: Set[int], errors: List[str]) -> None:
+    for position in invalid_prices([dish["price"] for dish in batch]):
+        errors.append(f"line {lines[position]}: invalid price {batch[position]['price']}")
+    for dish, line in zip(batch, lines):
+        if dish["category_id"] not in category_ids:
+            errors.append(f"line {line}: unknown category_id {dish['category_id']}")
+        if dish["extra"] and invalid_prices([price for _, price in dish["extra"].values()]):
+            errors.append(f"line {line}: invalid extra price")
+
+
+async def import_menu(session: AsyncSession,
+                      restaurant_id: int,
+                      chunks: AsyncIterator[bytes],
+                      fmt: str = "csv",
+                      price_factor: float = 1.0,
+                      price_delta: float = 0.0,
+                      batch_size: int = MENU_IMPORT_BATCH_SIZE) -> ImportStats:
+    """
+    Imports dishes of a restaurant from a CSV or NDJSON stream. Dish prices become `price * price_factor + price_delta`
+    and extra prices `price * price_factor`. The caller commits the session, or rolls it back on errors.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_id (int): The ID of the restaurant.
+        chunks (AsyncIterator[bytes]): The file content, e.g. `read_spooled(file)`.
+        fmt (str): "csv" or "ndjson".
+        price_factor (float): Multiplier of the imported prices.
+        price_delta (float): Amount added to the imported dish prices.
+        batch_size (int): Rows per upsert statement.
+
+    Returns:
+        ImportStats: Rows read, dishes inserted and updated, and the time taken.
+
+    Raises:
+        MenuImportError: If rows are invalid (at most MENU_IMPORT_MAX_ERRORS are reported) or too long.
+        ValueError: If the format is unknown.
+    """
+    started = time.perf_counter()
+    category_ids = await get_category_ids(session)
+    errors: List[str] = []
+    rows = inserted = updated = 0
+    batch: List[dict] = []
+    lines: List[int] = []
+
+    async def flush():
+        nonlocal inserted, updated
+        new_prices = adjust_prices([dish["price"] for dish in batch], price_factor, price_delta)
+        new_extras = reprice_extras([dish["extra"] for dish in batch], price_factor)
+        for dish, price, extra in zip(batch, new_prices, new_extras):
+            dish["price"], dish["extra"] = price, extra
+        check_batch(batch, lines, category_ids, errors)
+        if not errors:
+            batch_inserted, batch_updated = await upsert_dishes(session, restaurant_id, batch)
+            inserted += batch_inserted
+            updated += batch_updated
+        batch.clear()
+        lines.clear()
+
+    async for line, raw in iter_rows(chunks, fmt):
+        rows += 1
+        dish = parse_dish(raw, line, errors)
+        if dish is not None:
+            batch.append(dish)
+            lines.append(line)
+        if len(batch) >= batch_size:
+            await flush()
+        if len(errors) >= MENU_IMPORT_MAX_ERRORS:
+            break
+    if batch and len(errors) < MENU_IMPORT_MAX_ERRORS:
+        await flush()
+    if errors:
+        raise MenuImportError(errors[:MENU_IMPORT_MAX_ERRORS])
+
+    stats = ImportStats(rows, inserted, updated, time.perf_counter() - started)
+    logger.info(f"Imported {rows} dishes into restaurant {restaurant_id}: {stats.rows_per_second:.0f} rows/s")
+    return stats
+
+
+async def reprice_dishes(session: AsyncSession,
+                         restaurant_ids: Optional[List[int]] = None,
+                         category_id: Optional[int] = None,
+                         factor: float = 1.0,
+                         delta: float = 0.0,
+                         include_extras: bool = True,
+                         batch_size: int = MENU_IMPORT_BATCH_SIZE) -> Tuple[ImportStats, Set[int]]:
+    """
+    Changes the prices of many dishes: `price * factor + delta`, and `price * factor` for extras when `include_extras`.
+    Dishes are read and updated a page at a time. The caller commits the session, or rolls it back on errors.
+
+    Args:
+        session (AsyncSession): The SQLAlchemy asynchronous session.
+        restaurant_ids (Optional[List[int]]): Restaurants to update; all restaurants if None.
+        category_id (Optional[int]): Only update dishes of this category.
+        factor (float): Price multiplier, e.g. 1.05 for +5%.
+        delta (float): Amount added to the dish prices.
+        include_extras (bool): Whether extra prices are multiplied too.
+        batch_size (int): Dishes per page.
+
+    Returns:
+        Tuple[ImportStats, Set[int]]: The statistics and the IDs of the restaurants whose dishes changed.
+
+    Raises:
+        MenuImportError: If new prices would be negative.
+    """
+    started = time.perf_counter()
+    restaurants: Set[int] = set()
+    rows, after_id = 0, 0
+    while True:
+        page = await get_dish_prices(session, after_id, batch_size, restaurant_ids, category_id)
+        if not page:
+            break
+        ids, restaurant_column, prices, extras = zip(*page)
+        new_prices = adjust_prices(prices, factor, delta)
+        invalid = invalid_prices(new_prices)
+        if invalid:
+            raise MenuImportError([f"dish {ids[i]}: invalid new price {new_prices[i]}"
+                                   for i in invalid[:MENU_IMPORT_MAX_ERRORS]])
+        new_extras = reprice_extras(extras, factor) if include_extras else extras
+        await update_dish_prices(session, [{"id": dish_id, "price": price, "extra": extra}
+                                           for dish_id, price, extra in zip(ids, new_prices, new_extras)])
+        restaurants.update(restaurant_column)
+        rows += len(page)
+        after_id = ids[-1]
+
+    stats = ImportStats(rows, 0, rows, time.perf_counter() - started)
+    logger.info(f"Repriced {rows} dishes: {stats.rows_per_second:.0f} rows/s")
+    return stats, restaurants
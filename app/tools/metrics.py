@@ -0,0 +1,58 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    Per-worker registry of counters and gauges, exposed in the Prometheus text format on /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """
+        Declares a metric.
+
+        Args:
+            name (str): The metric name.
+            kind (str): "counter" or "gauge".
+            help_text (str): A one-line description.
+        """
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            self._values[name][key] = value
+
+    def value(self, name: str, **labels) -> float:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        return self._values.get(name, {}).get(key, 0)
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(set(self._help) | set(self._values)):
+                kind, help_text = self._help.get(name, ("untyped", ""))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self._values.get(name, {}).items()):
+                    label_text = ",".join(f'{label}="{value}"' for label, value in labels)
+                    lines.append(f"{name}{{{label_text}}} {value:g}" if labels else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
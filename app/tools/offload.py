@@ -0,0 +1,106 @@
+"""
+Offloading of CPU-heavy response rendering. Validating, serializing and compressing tens of thousands of dishes
+takes long enough to hold up every other request of the worker when it runs on the event loop, so results of at
+least `min_rows` rows are rendered by a thread or process pool and come back as the bytes to send.
+
+Threads keep the loop responsive, but share the GIL with it: compression releases it, while a pydantic-core call
+holds it until it returns, so large menus are rendered in chunks, and one thread (OFFLOAD_THREADS) renders at a
+time. More threads would not render faster, they would only take more turns from the event loop. Worker processes
+render in parallel, at the cost of pickling the rows to them (in a thread of this process, holding the GIL as
+well); functions run there must be importable module-level functions taking picklable arguments. Work that cannot be
+pickled, such as formatting ORM rows or building a search index, runs with `run_in_thread` on the thread pool
+whatever the executor, so it shares the OFFLOAD_THREADS limit with thread rendering.
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.config import OFFLOAD_EXECUTOR, OFFLOAD_MIN_ROWS, OFFLOAD_PROCESSES, OFFLOAD_THREADS
+from app.tools.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("offload_tasks_total", "counter", "Rendering tasks run off the event loop")
+metrics.describe("offload_seconds_total", "counter", "Time rendering tasks took off the event loop, queueing included")
+
+
+class Offloader:
+    """Runs functions in the executor named `executor` ("thread" or "process") when a result is large enough."""
+
+    def __init__(self, min_rows: int = OFFLOAD_MIN_ROWS, executor: str = OFFLOAD_EXECUTOR,
+                 threads: int = OFFLOAD_THREADS, processes: int = OFFLOAD_PROCESSES):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown offload executor: {executor}. Use 'thread' or 'process'")
+        self.min_rows = min_rows
+        self.executor = executor
+        self.threads = threads
+        self.workers = threads if executor == "thread" else processes
+        self._pool: Optional[Executor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+
+    def should_offload(self, rows: int) -> bool:
+        return rows >= self.min_rows
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Runs `fn(*args)` in the pool and returns its result.
+
+        Args:
+            fn (Callable[..., Any]): The function; with the "process" executor, a module-level function.
+            *args: Its arguments; with the "process" executor, they are pickled.
+
+        Returns:
+            Any: The result of the function.
+        """
+        return await self._run(self._get_pool(), self.executor, fn, *args)
+
+    async def run_in_thread(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Runs `fn(*args)` in the thread pool, even with the "process" executor, and returns its result. For work on
+        objects that cannot be pickled, e.g. ORM rows.
+
+        Args:
+            fn (Callable[..., Any]): The function.
+            *args: Its arguments.
+
+        Returns:
+            Any: The result of the function.
+        """
+        return await self._run(self._get_thread_pool(), "thread", fn, *args)
+
+    @staticmethod
+    async def _run(pool: Executor, executor: str, fn: Callable[..., Any], *args) -> Any:
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, functools.partial(fn, *args))
+        finally:
+            metrics.inc("offload_tasks_total", executor=executor)
+            metrics.inc("offload_seconds_total", amount=time.perf_counter() - started, executor=executor)
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(self.threads, thread_name_prefix="offload")
+        return self._thread_pool
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.executor == "thread":
+                self._pool = self._get_thread_pool()
+            else:
+                # Spawned, not forked: the worker has threads (the loop monitor's watchdog, the default thread pool)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info(f"Started {self.workers} offload worker processes")
+        return self._pool
+
+    def shutdown(self) -> None:
+        """Stops the pool, if it was started. Call once per process, from the application lifespan."""
+        for pool in {self._pool, self._thread_pool} - {None}:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._thread_pool = None
+
+
+offloader = Offloader()
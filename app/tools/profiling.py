@@ -0,0 +1,260 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import ADMIN_TOKEN, PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_RATE, PROFILER
+from app.tools.metrics import metrics
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("profiles_captured_total", "counter", "Requests profiled, by trigger")
+metrics.describe("profiles_skipped_total", "counter", "Requests not profiled because another profile was running")
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Number of functions listed in cProfile reports
+REPORT_FUNCTIONS = 60
+
+
+class DatabaseTimer:
+    """Time spent in database statements during one profiled request, including waiting for the server."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.statements = 0
+
+
+_database_timer: ContextVar[Optional[DatabaseTimer]] = ContextVar("database_timer", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _database_timer.get() is not None:
+        conn.info["profile_statement_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _database_timer.get()
+    started = conn.info.pop("profile_statement_started", None)
+    if timer is not None and started is not None:
+        timer.seconds += time.perf_counter() - started
+        timer.statements += 1
+
+
+def install_database_timer() -> None:
+    """Times the statements of profiled requests. Only installed with the profiling middleware."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestProfiler:
+    """
+    Wraps cProfile or pyinstrument. Both profile the event loop thread, so coroutines of other requests that run
+    meanwhile are part of the profile too; profile a quiet worker for clean results. pyinstrument attributes time
+    spent awaiting to the awaiting code, cProfile only sees CPU time in functions.
+    """
+
+    def __init__(self, kind: str = PROFILER):
+        if kind == "pyinstrument" and pyinstrument is None:
+            logger.warning("PROFILER=pyinstrument but pyinstrument is not installed; using cProfile")
+            kind = "cprofile"
+        self.kind = kind
+        if kind == "pyinstrument":
+            self._profiler = pyinstrument.Profiler(async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def report(self) -> str:
+        if self.kind == "pyinstrument":
+            return self._profiler.output_text(unicode=True, show_all=False)
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+        return stream.getvalue()
+
+    def dump(self, path: str) -> bool:
+        """Writes the raw cProfile data (for snakeviz, pstats...) to `path`. Returns False for pyinstrument."""
+        if self.kind == "pyinstrument":
+            return False
+        self._profiler.dump_stats(path)
+        return True
+
+
+class ProfileStore:
+    """
+    Profiles saved as files, so that any worker of the host can serve them: `<id>.txt` with the report and,
+    for cProfile, `<id>.prof` with the raw data. Only the newest `keep` profiles are kept.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def path(self, profile_id: str, extension: str) -> Optional[str]:
+        """Returns the file of a profile, or None if the ID is not a valid profile ID."""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profile_id: str, report: str, profiler: RequestProfiler) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(profile_id, "txt"), "w", encoding="utf-8") as file:
+            file.write(report)
+        profiler.dump(self.path(profile_id, "prof"))
+        self._prune()
+
+    def _prune(self) -> None:
+        reports = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".txt")),
+                         key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in reports[self.keep:]:
+            for extension in ("txt", "prof"):
+                try:
+                    os.remove(self.path(entry.name[:-4], extension))
+                except (OSError, TypeError):
+                    pass
+
+    def list(self) -> List[dict]:
+        """Returns the ID and the summary line of the stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        reports = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".txt")),
+                         key=lambda entry: entry.stat().st_mtime, reverse=True)
+        profiles = []
+        for entry in reports:
+            with open(entry.path, encoding="utf-8") as file:
+                profiles.append({"id": entry.name[:-4], "summary": file.readline().strip()})
+        return profiles
+
+
+profile_store = ProfileStore()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests:
+
+    - requests with an `X-Profile` header and the admin token in `X-Admin-Token`. With `X-Profile: attach` the
+      response body is replaced by the profile report, as an attachment; with any other value the response is sent
+      as usual and the profile is stored;
+    - a random `sample_rate` share of all requests, stored.
+
+    The ID of a stored profile is returned in the `X-Profile-Id` response header; see /admin/profiles.
+    Reports start with the wall time of the request, the CPU time of the event loop thread and the time spent in
+    database statements. Only one request is profiled at a time; others are served normally meanwhile.
+    """
+
+    def __init__(self, app, token: Optional[str] = ADMIN_TOKEN, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 store: ProfileStore = profile_store):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.store = store
+        self._busy = False
+        install_database_timer()
+
+    def _mode(self, scope) -> Optional[str]:
+        if self.token is not None:
+            headers = dict(scope["headers"])
+            requested = headers.get(b"x-profile")
+            if requested is not None and hmac.compare_digest(headers.get(b"x-admin-token", b""), self.token):
+                return "attach" if requested.lower() == b"attach" else "store"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = self._mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+        if self._busy:
+            metrics.inc("profiles_skipped_total")
+            return await self.app(scope, receive, send)
+
+        self._busy = True
+        try:
+            await self._profile(mode, scope, receive, send)
+        finally:
+            self._busy = False
+
+    async def _profile(self, mode: str, scope, receive, send) -> None:
+        profile_id = uuid.uuid4().hex
+        status = None
+        held = []
+
+        async def send_profiled(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            if mode == "attach":
+                held.append(message)
+            else:
+                await send(message)
+
+        profiler = RequestProfiler()
+        timer = DatabaseTimer()
+        timer_token = _database_timer.set(timer)
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            profiler.stop()
+            wall, cpu = time.perf_counter() - started, time.thread_time() - cpu_started
+            _database_timer.reset(timer_token)
+            metrics.inc("profiles_captured_total", trigger="sample" if mode == "sample" else "header")
+
+            report = (
+                f"{scope['method']} {scope['path']} -> {status}: wall {wall * 1000:.1f} ms, "
+                f"CPU {cpu * 1000:.1f} ms, database {timer.seconds * 1000:.1f} ms in {timer.statements} statements\n"
+                f"Other waiting (I/O, other requests): {max(0.0, wall - cpu - timer.seconds) * 1000:.1f} ms. "
+                f"Profiler: {profiler.kind}, profile {profile_id}\n\n"
+                + profiler.report()
+            )
+            if mode != "attach":
+                try:
+                    await asyncio.to_thread(self.store.save, profile_id, report, profiler)
+                except OSError as e:
+                    logger.error(f"Could not store profile {profile_id}: {e!r}")
+
+        if mode == "attach":
+            body = report.encode()
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"content-disposition", f'attachment; filename="profile-{profile_id}.txt"'.encode()),
+                (b"x-profile-id", profile_id.encode()),
+                (b"x-profile-status", str(status).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
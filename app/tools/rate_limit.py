@@ -0,0 +1,147 @@
+import logging
+import math
+import time
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.config import (CACHE_URL,
+                        RATE_LIMIT_ENABLED,
+                        RATE_LIMIT_BACKEND,
+                        RATE_LIMIT_TABLE_RATE,
+                        RATE_LIMIT_TABLE_BURST,
+                        RATE_LIMIT_IP_RATE,
+                        RATE_LIMIT_IP_BURST)
+from app.tools.metrics import metrics
+from app.tools.resp import RespClient
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("rate_limited_total", "counter", "Requests rejected with 429 by a rate limit")
+
+
+class LocalRateLimitStore:
+    """
+    Token buckets in this worker's memory. Buckets that have refilled completely are dropped
+    when the store grows past `max_keys`.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # Key -> (tokens, updated at, full at): limiters with different rates share the store, so each bucket
+        # keeps when it is full again at its own rate
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Takes one token from the bucket of a key.
+
+        Args:
+            key (str): The bucket key.
+            rate (float): Tokens added per second.
+            burst (int): The bucket size.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        tokens, updated_at, _ = self._buckets.get(key, (burst, now, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return (1 - tokens) / rate
+        tokens -= 1
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+
+
+class SharedRateLimitStore:
+    """
+    Limits shared by all workers through a Redis-protocol server. Plain INCR/PEXPIRE cannot refill a bucket
+    atomically, so each key gets `burst` requests per fixed window of `burst / rate` seconds: the same
+    average rate, with up to twice the burst around window boundaries. When the server is unreachable,
+    requests are allowed.
+    """
+
+    def __init__(self, url: str):
+        self.client = RespClient(url)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        window = burst / rate
+        now = time.time()
+        index = math.floor(now / window)
+        counter = f"ratelimit:{key}:{index}"
+        try:
+            count = await self.client.command("INCR", counter)
+            if count == 1:
+                await self.client.command("PEXPIRE", counter, int(window * 1000) + 1000)
+        except Exception as e:
+            logger.error(f"Shared rate limit check of {key} failed, allowing: {e!r}")
+            return 0.0
+        if count <= burst:
+            return 0.0
+        return (index + 1) * window - now
+
+
+def create_store(name: str = RATE_LIMIT_BACKEND, url: str = CACHE_URL):
+    if name == "local":
+        return LocalRateLimitStore()
+    if name == "resp":
+        return SharedRateLimitStore(url)
+    raise ValueError(f"Unknown rate limit backend: {name}. Use 'local' or 'resp'")
+
+
+class RateLimiter:
+    """
+    A named rate limit: `rate` requests per second per key on average, with bursts of up to `burst`.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, store):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+
+    async def check(self, key) -> None:
+        """
+        Counts a request for a key.
+
+        Raises:
+            HTTPException: 429 error with Retry-After if the key is over its limit.
+        """
+        retry_after = await self.store.take(f"{self.name}:{key}", self.rate, self.burst)
+        if retry_after > 0:
+            metrics.inc("rate_limited_total", limit=self.name)
+            raise HTTPException(status_code=429,
+                                detail="Too many requests, please try again later",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+store = create_store()
+table_limiter = RateLimiter("table", RATE_LIMIT_TABLE_RATE, RATE_LIMIT_TABLE_BURST, store)
+ip_limiter = RateLimiter("ip", RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST, store)
+
+
+async def limit_table_requests(request: Request, restaurant_id: int, table_id: int, scope: str) -> None:
+    """
+    Applies the per-client-IP and the per-table rate limits to a request.
+
+    Args:
+        request (Request): The request, for the client IP.
+        restaurant_id (int): The ID of the restaurant.
+        table_id (int): The ID of the table.
+        scope (str): Separates the limits of different endpoints, e.g. "call_waiter".
+
+    Raises:
+        HTTPException: 429 error with Retry-After if a limit is exceeded.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    client_ip = request.client.host if request.client else "unknown"
+    await ip_limiter.check(f"{scope}:{client_ip}")
+    await table_limiter.check(f"{scope}:{restaurant_id}:{table_id}")
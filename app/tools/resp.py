@@ -0,0 +1,146 @@
+import asyncio
+from typing import List, Optional, Union
+from urllib.parse import urlparse
+
+# A decoded RESP2 reply: simple strings and integers, bulk strings as bytes (None for nil), arrays as lists
+Reply = Union[None, int, bytes, str, List["Reply"]]
+
+
+# EVAL script deleting KEYS[1] only while it still holds ARGV[1]: releases a lock only if it was not taken over by
+# another holder after it expired
+COMPARE_AND_DELETE = 'if redis.call("GET", KEYS[1]) == ARGV[1] then return redis.call("DEL", KEYS[1]) else return 0 end'
+
+
+class RespError(Exception):
+    """An error reply sent by a Redis-protocol server."""
+
+
+def encode_command(*args) -> bytes:
+    """
+    Encodes a command as a RESP array of bulk strings.
+
+    Args:
+        *args: The command name and its arguments; str and int are encoded as UTF-8.
+
+    Returns:
+        bytes: The encoded command.
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Reply:
+    """
+    Reads one RESP2 value from the stream.
+
+    Raises:
+        RespError: If the value is an error reply.
+        ConnectionError: If the connection was closed.
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f"Unexpected reply type: {line!r}")
+
+
+class RespConnection:
+    """One connection to a Redis-protocol server, used for one command at a time."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, url: str, timeout: float = 5.0) -> "RespConnection":
+        """
+        Opens a connection to a `redis://[:password@]host[:port][/db]` URL.
+
+        Args:
+            url (str): The server URL.
+            timeout (float): Seconds to wait for the connection. Defaults to 5.
+
+        Returns:
+            RespConnection: The open, authenticated connection with the database selected.
+        """
+        parsed = urlparse(url)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379), timeout
+        )
+        connection = cls(reader, writer)
+        if parsed.password:
+            await connection.command("AUTH", parsed.password)
+        database = parsed.path.lstrip("/")
+        if database and database != "0":
+            await connection.command("SELECT", database)
+        return connection
+
+    async def command(self, *args) -> Reply:
+        self.writer.write(encode_command(*args))
+        await self.writer.drain()
+        return await read_reply(self.reader)
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class RespClient:
+    """
+    A small pool of connections to a Redis-protocol server. Connections are opened on demand; a connection
+    that fails is dropped instead of being returned to the pool.
+    """
+
+    def __init__(self, url: str, pool_size: int = 4):
+        self.url = url
+        self._idle: List[RespConnection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def command(self, *args) -> Reply:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await RespConnection.open(self.url)
+            try:
+                reply = await connection.command(*args)
+            except RespError:
+                self._idle.append(connection)
+                raise
+            except BaseException:
+                await connection.close()
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def close(self) -> None:
+        while self._idle:
+            await self._idle.pop().close()
+
+
+def parse_message(reply: Reply) -> Optional[bytes]:
+    """Returns the payload of a pub/sub `message` push, or None for other pushes (such as subscribe confirmations)."""
+    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+        return reply[2]
+    return None
@@ -0,0 +1,169 @@
+"""
+Stand-in for Redis on a single host: serves the subset of the Redis protocol the shared cache uses
+(PING, AUTH, SELECT, GET, SET with EX/PX/NX, DEL, INCR, PEXPIRE, PUBLISH, SUBSCRIBE, and EVAL of the scripts in
+resp.py), keeping data in this process's memory.
+Every worker on the host connects to it, so they share one L2 cache and one invalidation channel.
+
+    python -m app.tools.resp_server --port 6379
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from app.tools.resp import COMPARE_AND_DELETE, encode_command, read_reply
+
+logger = logging.getLogger(__name__)
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+OK = b"+OK\r\n"
+
+
+class RespServer:
+
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 6379) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self) -> None:
+        self._server.close()
+        for writers in self._channels.values():
+            for writer in writers:
+                writer.close()
+        await self._server.wait_closed()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    def _eval(self, args) -> bytes:
+        # No Lua here: the scripts the application sends are run as the equivalent Python
+        script, keys = args[0].decode(), args[2:2 + int(args[1])]
+        values = args[2 + int(args[1]):]
+        if script == COMPARE_AND_DELETE:
+            if self._get(keys[0]) != values[0]:
+                return _integer(0)
+            del self._data[keys[0]]
+            return _integer(1)
+        return b"-ERR unsupported script\r\n"
+
+    def _set(self, args) -> bytes:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        if b"NX" in options and self._get(key) is not None:
+            return _bulk(None)
+        expires_at = None
+        if b"EX" in options:
+            expires_at = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+        elif b"PX" in options:
+            expires_at = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+        self._data[key] = (value, expires_at)
+        return OK
+
+    def _incr(self, key: bytes) -> bytes:
+        value = self._get(key)
+        try:
+            number = int(value or 0) + 1
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+        expires_at = self._data[key][1] if value is not None else None
+        self._data[key] = (str(number).encode(), expires_at)
+        return _integer(number)
+
+    def _pexpire(self, key: bytes, milliseconds: bytes) -> bytes:
+        value = self._get(key)
+        if value is None:
+            return _integer(0)
+        self._data[key] = (value, time.monotonic() + int(milliseconds) / 1000)
+        return _integer(1)
+
+    def _publish(self, channel: bytes, message: bytes) -> bytes:
+        subscribers = self._channels.get(channel, ())
+        push = encode_command(b"message", channel, message)
+        for writer in subscribers:
+            writer.write(push)
+        return _integer(len(subscribers))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscribed: Set[bytes] = set()
+        try:
+            while True:
+                try:
+                    command = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR protocol error\r\n")
+                    continue
+
+                name, args = command[0].upper(), command[1:]
+                if name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name in (b"AUTH", b"SELECT"):
+                    writer.write(OK)
+                elif name == b"GET":
+                    writer.write(_bulk(self._get(args[0])))
+                elif name == b"SET":
+                    writer.write(self._set(args))
+                elif name == b"DEL":
+                    writer.write(_integer(sum(self._data.pop(key, None) is not None for key in args)))
+                elif name == b"INCR":
+                    writer.write(self._incr(args[0]))
+                elif name == b"PEXPIRE":
+                    writer.write(self._pexpire(args[0], args[1]))
+                elif name == b"PUBLISH":
+                    writer.write(self._publish(args[0], args[1]))
+                elif name == b"EVAL":
+                    writer.write(self._eval(args))
+                elif name == b"SUBSCRIBE":
+                    for channel in args:
+                        subscribed.add(channel)
+                        self._channels[channel].add(writer)
+                        writer.write(encode_command(b"subscribe", channel, len(subscribed)))
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name)
+                await writer.drain()
+        finally:
+            for channel in subscribed:
+                self._channels[channel].discard(writer)
+            writer.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Single-host stand-in for the Redis protocol subset used by the shared cache.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    server = RespServer()
+    await server.start(args.host, args.port)
+    logger.info(f"Serving on {args.host}:{server.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
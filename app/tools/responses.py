@@ -0,0 +1,27 @@
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+class ModelResponse(Response):
+    """
+    JSON response of an already validated model, or of a value of a TypeAdapter's type, serialized to bytes by
+    pydantic-core in one step.
+
+    When an endpoint returns a model, FastAPI dumps it, validates the result against the response_model again and
+    serializes it to Python objects before the response class encodes them. An endpoint that builds its response
+    from trusted data returns a ModelResponse instead and skips all of that; the route's response_model still
+    documents the response.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, adapter: Optional[TypeAdapter] = None, **kwargs):
+        self.adapter = adapter
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if self.adapter is not None:
+            return self.adapter.dump_json(content)
+        return content.__pydantic_serializer__.to_json(content)
@@ -0,0 +1,226 @@
+import asyncio
+import time
+from collections import defaultdict
+from itertools import islice
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import RESTAURANT_DIRECTORY_TTL
+from app.tools.cache import TwoLevelCache
+
+
+class DirectoryEntry(NamedTuple):
+    id: int
+    name: str
+    rating: Optional[Decimal]
+    photo: Optional[str]
+    currency: str
+
+
+class RestaurantDirectory:
+    """
+    In-memory directory of restaurants answering prefix/substring search over names without touching the database.
+
+    Every normalized name is indexed by all its substrings of up to `gram_size` characters. Short queries are
+    answered straight from the index; longer ones intersect the posting sets of their grams and verify the
+    candidates. Sort orders are precomputed, so a page of a large result set is taken without sorting it.
+    Changes are applied incrementally: only inserted, renamed or removed restaurants touch the index.
+    """
+
+    SORTS = ("rating", "name")
+
+    def __init__(self, ttl: float = 60.0, gram_size: int = 3):
+        self.ttl = ttl
+        self.gram_size = gram_size
+        self.loaded_at: Optional[float] = None
+        self._entries: Dict[int, DirectoryEntry] = {}
+        self._names: Dict[int, str] = {}
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        self._orders: Dict[str, Dict[int, int]] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.casefold().split())
+
+    def _grams_of(self, name: str) -> Set[str]:
+        return {name[start:start + size]
+                for size in range(1, self.gram_size + 1)
+                for start in range(len(name) - size + 1)}
+
+    def upsert(self, entry: DirectoryEntry) -> bool:
+        """
+        Adds or updates a restaurant. The name index is only touched when the name changed.
+
+        Args:
+            entry (DirectoryEntry): The restaurant to store.
+
+        Returns:
+            bool: True if the directory changed.
+        """
+        current = self._entries.get(entry.id)
+        if current == entry:
+            return False
+
+        name = self.normalize(entry.name)
+        if current is None or self._names[entry.id] != name:
+            if current is not None:
+                self._unindex(entry.id)
+            self._names[entry.id] = name
+            for gram in self._grams_of(name):
+                self._grams[gram].add(entry.id)
+
+        self._entries[entry.id] = entry
+        self._orders.clear()
+        return True
+
+    def remove(self, restaurant_id: int) -> bool:
+        """
+        Removes a restaurant from the directory.
+
+        Args:
+            restaurant_id (int): The ID of the restaurant.
+
+        Returns:
+            bool: True if the restaurant was present.
+        """
+        if restaurant_id not in self._entries:
+            return False
+        self._unindex(restaurant_id)
+        del self._entries[restaurant_id]
+        del self._names[restaurant_id]
+        self._orders.clear()
+        return True
+
+    def _unindex(self, restaurant_id: int) -> None:
+        for gram in self._grams_of(self._names[restaurant_id]):
+            posting = self._grams[gram]
+            posting.discard(restaurant_id)
+            if not posting:
+                del self._grams[gram]
+
+    def sync(self, entries: Iterable[DirectoryEntry]) -> Tuple[int, int]:
+        """
+        Brings the directory in line with a full snapshot, applying only the differences.
+
+        Args:
+            entries (Iterable[DirectoryEntry]): Every restaurant that currently exists.
+
+        Returns:
+            Tuple[int, int]: The number of upserted and removed restaurants.
+        """
+        seen = set()
+        upserted = 0
+        for entry in entries:
+            seen.add(entry.id)
+            upserted += self.upsert(entry)
+
+        removed = 0
+        for restaurant_id in [restaurant_id for restaurant_id in self._entries if restaurant_id not in seen]:
+            removed += self.remove(restaurant_id)
+
+        self.loaded_at = time.monotonic()
+        return upserted, removed
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    def invalidate(self) -> None:
+        """Forces a reload on the next `refresh_if_stale` call."""
+        self.loaded_at = None
+
+    async def refresh_if_stale(self, loader: Callable[[], Awaitable[Iterable[DirectoryEntry]]]) -> None:
+        """
+        Reloads the directory through `loader` when it is older than the TTL. Only one caller reloads;
+        while a reload runs, other callers keep being served from the current contents.
+
+        Args:
+            loader (Callable[[], Awaitable[Iterable[DirectoryEntry]]]): Returns a full snapshot of restaurants.
+        """
+        if not self.is_stale() or (self._lock.locked() and self.loaded_at is not None):
+            return
+        async with self._lock:
+            if self.is_stale():
+                self.sync(await loader())
+
+    def _order(self, sort: str) -> Dict[int, int]:
+        """Returns the position of every restaurant in the given sort order, keyed in that order."""
+        order = self._orders.get(sort)
+        if order is None:
+            if sort == "rating":
+                key = lambda rid: (self._entries[rid].rating is None, -(self._entries[rid].rating or 0), self._names[rid], rid)
+            else:
+                key = lambda rid: (self._names[rid], rid)
+            order = self._orders[sort] = {rid: index for index, rid in enumerate(sorted(self._entries, key=key))}
+        return order
+
+    def _match(self, query: str) -> Set[int]:
+        if len(query) <= self.gram_size:
+            return set(self._grams.get(query, ()))
+
+        postings = sorted((self._grams.get(query[start:start + self.gram_size], set())
+                           for start in range(len(query) - self.gram_size + 1)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return {rid for rid in candidates if query in self._names[rid]}
+
+    def search(self, query: str = "", sort: str = "rating", offset: int = 0, limit: int = 20) -> Tuple[int, List[DirectoryEntry]]:
+        """
+        Finds restaurants whose name contains the query.
+
+        Args:
+            query (str): The text to look for; case and repeated whitespace are ignored. Empty matches everything.
+            sort (str): "rating" (best first) or "name". Defaults to "rating".
+            offset (int): The number of matches to skip. Defaults to 0.
+            limit (int): The maximum number of matches to return. Defaults to 20.
+
+        Returns:
+            Tuple[int, List[DirectoryEntry]]: The total number of matches and the requested page.
+        """
+        if sort not in self.SORTS:
+            raise ValueError(f"Invalid sort: {sort}. Allowed sorts are: {', '.join(self.SORTS)}")
+
+        order = self._order(sort)
+        query = self.normalize(query)
+        if not query:
+            page = list(islice(order, offset, offset + limit))
+            return len(order), [self._entries[rid] for rid in page]
+
+        matches = self._match(query)
+        if len(matches) * 4 < len(order):
+            # Few matches: sort just them by their precomputed position
+            page = sorted(matches, key=order.__getitem__)[offset:offset + limit]
+        else:
+            # Most restaurants match: walk the presorted order and stop once the page is full
+            page = list(islice((rid for rid in order if rid in matches), offset, offset + limit))
+        return len(matches), [self._entries[rid] for rid in page]
+
+    def id_name_pairs(self) -> Dict[int, str]:
+        return {rid: entry.name for rid, entry in self._entries.items()}
+
+
+restaurant_directory = RestaurantDirectory(ttl=RESTAURANT_DIRECTORY_TTL)
+
+
+class RestaurantCache(TwoLevelCache):
+    """
+    Two-level cache of single restaurants, keyed by ID. Invalidating a restaurant also marks the
+    restaurant directory of every worker stale.
+    """
+
+    def __init__(self, ttl: float = 60.0, directory: RestaurantDirectory = restaurant_directory, **kwargs):
+        super().__init__("restaurant", ttl, **kwargs)
+        self.directory = directory
+
+    def evict_local(self, key=None) -> None:
+        super().evict_local(key)
+        self.directory.invalidate()
+
+
+restaurant_cache = RestaurantCache(ttl=RESTAURANT_DIRECTORY_TTL)
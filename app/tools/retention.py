@@ -0,0 +1,237 @@
+"""
+Partition maintenance and retention of the time-partitioned tables.
+
+Each table is partitioned by month on a timestamp column, with a DEFAULT partition catching rows no monthly
+partition exists for (e.g. orders with a skewed client clock). Monthly partitions are named
+`<table>_y<year>m<month>`, e.g. `baskets_y2024m05`.
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import (RETENTION_INTERVAL,
+                        RETENTION_ARCHIVE,
+                        PARTITION_MONTHS_AHEAD,
+                        BASKET_RETENTION_MONTHS,
+                        WAITER_CALL_EVENT_RETENTION_MONTHS,
+                        WAITER_CALL_TTL_HOURS)
+from app.database.postgre_db import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Table -> (partition key column, months of partitions to keep)
+PARTITIONED_TABLES = {
+    "baskets": ("order_datetime", BASKET_RETENTION_MONTHS),
+    "waiter_call_events": ("call_datetime", WAITER_CALL_EVENT_RETENTION_MONTHS),
+}
+
+ARCHIVE_SCHEMA = "archive"
+
+# Only one worker runs the job at a time
+RETENTION_LOCK_ID = 0x5245_5445
+
+# How long a retention step may wait for its table locks
+RETENTION_LOCK_TIMEOUT = "5s"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def quote(conn: AsyncConnection, *names: str) -> str:
+    """Quotes an identifier, or the parts of a qualified one, for the DDL below, which cannot take bind parameters."""
+    preparer = conn.dialect.identifier_preparer
+    return ".".join(preparer.quote(name) for name in names)
+
+
+async def column_names(conn: AsyncConnection, *names: str) -> str:
+    """Returns the quoted columns of a table in their order, to copy rows between tables by name."""
+    result = await conn.execute(text(
+        "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped "
+        "ORDER BY attnum"
+    ), {"table": quote(conn, *names)})
+    return ", ".join(quote(conn, column) for (column,) in result)
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> Dict[date, str]:
+    """Returns the monthly partitions of a table by month."""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table})
+    pattern = re.compile(rf"^{re.escape(table)}_y(\d{{4}})m(\d{{2}})$")
+    partitions = {}
+    for (name,) in result:
+        match = pattern.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+async def create_partition(conn: AsyncConnection, table: str, column: str, month: date) -> str:
+    """
+    Creates the partition of a month, moving the rows of that month out of the DEFAULT partition first
+    (a partition cannot be attached while the DEFAULT partition holds rows of its range).
+
+    Returns:
+        str: The name of the partition.
+    """
+    name = partition_name(table, month)
+    bounds = {"start": datetime(month.year, month.month, 1), "end": datetime.combine(add_months(month, 1), datetime.min.time())}
+    partition, parent, key = quote(conn, name), quote(conn, table), quote(conn, column)
+    await conn.execute(text(f"CREATE TABLE {partition} (LIKE {parent} INCLUDING DEFAULTS)"))
+    # The new partition has the columns of the parent table, in the same order
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {quote(conn, f'{table}_default')} WHERE {key} >= :start AND {key} < :end "
+        f"RETURNING *) INSERT INTO {partition} SELECT * FROM moved"
+    ), bounds)
+    # The bounds are formatted from datetimes, not taken from input
+    await conn.execute(text(
+        f"ALTER TABLE {parent} ATTACH PARTITION {partition} "
+        f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    ))
+    return name
+
+
+async def lock_table(conn: AsyncConnection, table: str) -> None:
+    """
+    Locks a partitioned table before its partitions are changed. Queries lock the parent table before its
+    partitions, so taking this lock first keeps partition maintenance from deadlocking with them.
+    """
+    await conn.execute(text(f"LOCK TABLE {quote(conn, table)} IN ACCESS EXCLUSIVE MODE"))
+
+
+async def ensure_partitions(conn: AsyncConnection, today: Optional[date] = None,
+                            months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Creates the partitions of the current month, of the next `months_ahead` months and of the months of the
+    retention period that have rows in the DEFAULT partition. Rows outside of that window (a wrong clock, a date
+    typed by hand) stay in the DEFAULT partition: they must not make the job create partitions for any month at all.
+    Tables are only locked when a partition is missing.
+
+    Returns:
+        List[str]: The names of the created partitions.
+    """
+    current = (today or date.today()).replace(day=1)
+    created = []
+    for table, (column, keep_months) in PARTITIONED_TABLES.items():
+        existing = await list_partitions(conn, table)
+        months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+        key = quote(conn, column)
+        result = await conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', {key})::date FROM {quote(conn, f'{table}_default')} "
+            f"WHERE {key} >= :start AND {key} < :end"
+        ), {"start": datetime.combine(add_months(current, -keep_months), datetime.min.time()),
+            "end": datetime.combine(add_months(current, months_ahead + 1), datetime.min.time())})
+        months.update(month for (month,) in result)
+        missing = sorted(months - set(existing))
+        if missing:
+            await lock_table(conn, table)
+        for month in missing:
+            created.append(await create_partition(conn, table, column, month))
+    return created
+
+
+async def archive_partition(conn: AsyncConnection, table: str, name: str, archive: bool) -> None:
+    """Detaches a partition and moves it to the archive schema, or drops it."""
+    partition, schema = quote(conn, name), quote(conn, ARCHIVE_SCHEMA)
+    if not archive:
+        await conn.execute(text(f"DROP TABLE {partition}"))
+        return
+    await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+    await conn.execute(text(f"ALTER TABLE {quote(conn, table)} DETACH PARTITION {partition}"))
+    archived = await conn.execute(text("SELECT to_regclass(:name)"), {"name": quote(conn, ARCHIVE_SCHEMA, name)})
+    if archived.scalar() is None:
+        await conn.execute(text(f"ALTER TABLE {partition} SET SCHEMA {schema}"))
+    else:
+        # Late rows of a month that was archived before. The archived table may have been created by an earlier
+        # version, with the columns in another order: they are copied by name
+        columns = await column_names(conn, ARCHIVE_SCHEMA, name)
+        await conn.execute(text(f"INSERT INTO {quote(conn, ARCHIVE_SCHEMA, name)} ({columns}) "
+                                f"SELECT {columns} FROM {partition}"))
+        await conn.execute(text(f"DROP TABLE {partition}"))
+
+
+async def expire_partitions(conn: AsyncConnection, today: Optional[date] = None,
+                            archive: bool = RETENTION_ARCHIVE) -> List[str]:
+    """
+    Detaches the partitions older than each table's retention period and moves them to the archive schema,
+    or drops them. Tables are only locked when a partition has expired.
+
+    Returns:
+        List[str]: The names of the expired partitions.
+    """
+    current = (today or date.today()).replace(day=1)
+    expired = []
+    for table, (_, keep_months) in PARTITIONED_TABLES.items():
+        cutoff = add_months(current, -keep_months)
+        names = [name for month, name in sorted((await list_partitions(conn, table)).items()) if month < cutoff]
+        if names:
+            await lock_table(conn, table)
+        for name in names:
+            await archive_partition(conn, table, name, archive)
+            expired.append(name)
+    return expired
+
+
+async def expire_waiter_calls(conn: AsyncConnection, ttl_hours: float = WAITER_CALL_TTL_HOURS) -> int:
+    """Deletes the current waiter calls older than the TTL; their history stays in waiter_call_events."""
+    result = await conn.execute(
+        text("DELETE FROM waiter_calls WHERE call_datetime < localtimestamp - make_interval(secs => :seconds)"),
+        {"seconds": ttl_hours * 3600}
+    )
+    return result.rowcount
+
+
+async def run_retention(today: Optional[date] = None) -> Optional[dict]:
+    """
+    Runs partition maintenance and retention once. Each step is a short transaction that gives up after
+    RETENTION_LOCK_TIMEOUT instead of queueing requests behind it; what is left is done on the next run.
+
+    Returns:
+        Optional[dict]: What was done, or None if another worker is running the job.
+    """
+    async with get_engine().connect() as conn:
+        locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": RETENTION_LOCK_ID})).scalar()
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            stats = {}
+            for step, run in (("created", lambda: ensure_partitions(conn, today)),
+                              ("expired", lambda: expire_partitions(conn, today)),
+                              ("expired_waiter_calls", lambda: expire_waiter_calls(conn))):
+                async with conn.begin():
+                    await conn.execute(text("SELECT set_config('lock_timeout', :timeout, true)"),
+                                       {"timeout": RETENTION_LOCK_TIMEOUT})
+                    stats[step] = await run()
+            return stats
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": RETENTION_LOCK_ID})
+            await conn.commit()
+
+
+async def retention_loop(interval: float = RETENTION_INTERVAL) -> None:
+    """Runs the retention job every `interval` seconds, from the application lifespan."""
+    while True:
+        try:
+            stats = await run_retention()
+            if stats and (stats["created"] or stats["expired"] or stats["expired_waiter_calls"]):
+                logger.info(f"Retention: {stats}")
+        except Exception as e:
+            # Cancelling the task in the middle of a query can surface as a driver error instead of CancelledError
+            if asyncio.current_task().cancelling():
+                raise asyncio.CancelledError() from e
+            logger.error(f"Retention job failed: {e!r}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,67 @@
+"""
+Rebuilds the analytics rollups from the baskets and waiter call events still in the database. The rollups are kept
+up to date as orders and calls are written; run this once after upgrading, or after fixing data by hand:
+
+    python -m app.tools.rollups
+
+Baskets and waiter call events that retention has archived or dropped are no longer counted after a rebuild.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.database.postgre_db import get_engine
+
+logger = logging.getLogger(__name__)
+
+REBUILD_STATEMENTS = [
+    "TRUNCATE rollup_revenue_hourly, rollup_dish_sales_daily, rollup_waiter_calls_hourly",
+    """
+    INSERT INTO rollup_revenue_hourly (restaurant_id, hour, currency, orders, revenue)
+    SELECT restaurant_id, date_trunc('hour', order_datetime), max(currency), count(*), sum(total_cost)
+    FROM baskets
+    GROUP BY 1, 2
+    """,
+    # Same arithmetic as record_basket_rollups(): an item costs its dish price plus the prices of its extras
+    """
+    INSERT INTO rollup_dish_sales_daily (restaurant_id, day, dish_id, quantity, revenue)
+    SELECT b.restaurant_id, b.order_datetime::date, (item->>'dish_id')::int, count(*),
+           sum((item->>'dish_price')::numeric
+               + coalesce((SELECT sum((extra.value->>1)::numeric)
+                           FROM jsonb_each(coalesce(item->'extras', '{}'::jsonb)) extra), 0))
+    FROM baskets b, jsonb_array_elements(coalesce(b.order_items, '[]'::jsonb)) item
+    GROUP BY 1, 2, 3
+    """,
+    """
+    INSERT INTO rollup_waiter_calls_hourly (restaurant_id, hour, table_id, status, calls)
+    SELECT restaurant_id, date_trunc('hour', call_datetime), table_id, status, count(*)
+    FROM waiter_call_events
+    GROUP BY 1, 2, 3, 4
+    """,
+]
+
+
+async def rebuild_rollups(conn: AsyncConnection) -> None:
+    """
+    Recomputes every rollup from scratch. TRUNCATE locks the rollups until the transaction ends, so orders and
+    waiter calls written meanwhile wait for the rebuild instead of being lost.
+
+    Args:
+        conn (AsyncConnection): A connection inside a transaction.
+    """
+    for statement in REBUILD_STATEMENTS:
+        await conn.execute(text(statement))
+
+
+async def main():
+    async with get_engine().begin() as conn:
+        await rebuild_rollups(conn)
+    logger.info("Rollups rebuilt.")
+    await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import inspect
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Hashable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.tools.metrics import metrics
+
+metrics.describe("single_flight_calls_total", "counter", "Calls of coalesced read functions")
+metrics.describe("single_flight_executions_total", "counter", "Calls that actually ran the function")
+metrics.describe("single_flight_coalesced_total", "counter", "Calls that joined an identical call already in flight")
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, further calls with the same
+    key wait for it and get the same result (or exception) instead of running again. Nothing is cached
+    once the call has finished.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[Any], AsyncContextManager]] = None):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        # Opens the session a coalesced call runs on, given the bind of the caller's session; by default a new
+        # session on that bind
+        self._session_factory = session_factory
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], name: str = "") -> Any:
+        """
+        Runs `fn` unless a call with the same key is already in flight, and returns its result.
+
+        Args:
+            key (Hashable): Identifies identical calls.
+            fn (Callable[[], Awaitable[Any]]): Runs the call.
+            name (str): The function name reported in metrics.
+
+        Returns:
+            Any: The result of the (possibly shared) call. Shared results must not be mutated.
+        """
+        metrics.inc("single_flight_calls_total", function=name)
+        task = self._in_flight.get(key)
+        if task is None:
+            metrics.inc("single_flight_executions_total", function=name)
+            task = self._in_flight[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            metrics.inc("single_flight_coalesced_total", function=name)
+        # A caller that is cancelled (e.g. a client disconnect) must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Marks the exception as retrieved even if every caller was cancelled
+            task.exception()
+
+    def coalesce(self, fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """
+        Decorates a crud read function taking the session as first argument. Calls are keyed by the
+        bind (engine) of the caller's session, the function and its other arguments, so callers on
+        different databases never share a call. The shared call runs on a session of its own on that
+        bind, never on a caller's: a caller's session may be in a transaction (with uncommitted writes
+        the others must not see), and may be closed by its request while the others still wait for the
+        query. Only functions returning plain data, not ORM objects, can be coalesced.
+
+        The undecorated function stays available as `__wrapped__`, for a caller that needs the query to
+        run on its own session (e.g. to prepare its statements on that session's connection).
+        """
+        signature = inspect.signature(fn)
+
+        async def run(bind, *args, **kwargs):
+            async with self._open_session(bind) as session:
+                return await fn(session, *args, **kwargs)
+
+        @functools.wraps(fn)
+        async def wrapper(session, *args, **kwargs):
+            bound = signature.bind(session, *args, **kwargs)
+            bound.apply_defaults()
+            bind = getattr(session, "bind", None)
+            key = (fn.__qualname__, bind) + tuple(bound.arguments.items())[1:]
+            return await self.do(key, functools.partial(run, bind, *args, **kwargs), fn.__name__)
+
+        return wrapper
+
+    def _open_session(self, bind: Any) -> AsyncContextManager:
+        if self._session_factory is not None:
+            return self._session_factory(bind)
+        if bind is not None:
+            return AsyncSession(bind=bind, expire_on_commit=False)
+        # Imported here: the database module imports the tools on its own import
+        from app.database.postgre_db import async_session, get_engine
+        get_engine()
+        return async_session()
+
+
+single_flight = SingleFlight()
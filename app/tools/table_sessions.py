@@ -0,0 +1,299 @@
+"""
+Table sessions: the draft basket of each table, held server-side while guests compose their order.
+
+Guests send changes ("one more of dish 12 with extra 3", "one less of dish 7") instead of the whole basket, and
+each change only prices the dishes it touches, from the cached menu. The draft keeps its lines and a running
+total; it becomes a basket when it is submitted. Every change bumps the draft's revision, which clients can send
+back to detect that another guest at the table changed the draft in between.
+"""
+import asyncio
+import logging
+import secrets
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Callable, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import CACHE_URL, TABLE_SESSION_BACKEND, TABLE_SESSION_MAX_LINES, TABLE_SESSION_TTL, WORKERS
+from app.database.crud import get_dishes_by_restaurant_and_category_and_id
+from app.tools.menu_cache import menu_cache
+from app.tools.metrics import metrics
+from app.tools.resp import COMPARE_AND_DELETE, RespClient
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("table_session_changes_total", "counter", "Changes applied to draft baskets")
+metrics.describe("table_session_conflicts_total", "counter", "Draft changes rejected because the revision was outdated")
+
+CENT = Decimal('0.01')
+
+# How long a worker may hold the lock of a shared draft, and how long another one waits for it
+SHARED_LOCK_MS = 2000
+SHARED_LOCK_WAIT = 2.0
+
+
+def format_price(value: Decimal) -> str:
+    return f"{value.quantize(CENT, rounding=ROUND_HALF_UP):.2f}"
+
+
+def empty_draft(restaurant_id: int, table_id: int) -> dict:
+    return {"restaurant_id": restaurant_id, "table_id": table_id, "revision": 0, "currency": None,
+            "total": "0.00", "lines": {}}
+
+
+def line_id(dish_id: int, extras: List[str]) -> str:
+    """Identifies a line of a draft: a dish with a set of extras. Adding the same combination again adds quantity."""
+    return f"{dish_id}:{','.join(sorted(set(extras)))}"
+
+
+def apply_changes(draft: dict, changes: List[dict], dishes: Dict[int, dict],
+                  max_lines: int = TABLE_SESSION_MAX_LINES) -> dict:
+    """
+    Applies quantity changes to a draft. New lines are priced from the menu; the total is adjusted by the price of
+    the changed quantities only. Quantities never go below zero, and lines at zero are removed.
+
+    Args:
+        draft (dict): The current draft; it is not modified.
+        changes (List[dict]): Changes with `dish_id`, `extras` (keys of the dish's extras) and `quantity` (+/-).
+        dishes (Dict[int, dict]): The dishes of the restaurant by ID, as cached by the menu cache.
+        max_lines (int): The maximum number of lines of a draft.
+
+    Returns:
+        dict: The new draft, with the next revision.
+
+    Raises:
+        HTTPException: 404 error for a dish that is not on the menu, 422 error for an unknown extra or too many lines.
+    """
+    lines = dict(draft["lines"])
+    total = Decimal(draft["total"])
+    currency = draft["currency"]
+    for change in changes:
+        key = line_id(change["dish_id"], change["extras"])
+        line = lines.get(key)
+        if line is None:
+            if change["quantity"] <= 0:
+                continue
+            dish = dishes.get(change["dish_id"])
+            if dish is None:
+                raise HTTPException(status_code=404, detail=f"Dish with ID {change['dish_id']} not found for restaurant "
+                                                            f"{draft['restaurant_id']}")
+            dish_extras = dish["extra"] or {}
+            unknown = [extra for extra in change["extras"] if extra not in dish_extras]
+            if unknown:
+                raise HTTPException(status_code=422, detail=f"Unknown extras of dish {dish['id']}: {', '.join(unknown)}")
+            dish_price = Decimal(str(dish["price"]))
+            extras = {extra: [dish_extras[extra][0], format_price(Decimal(str(dish_extras[extra][1])))]
+                      for extra in sorted(set(change["extras"]))}
+            unit_price = dish_price + sum((Decimal(price) for _, price in extras.values()), Decimal(0))
+            line = {"dish_id": dish["id"], "dish_price": format_price(dish_price), "extras": extras,
+                    "unit_price": format_price(unit_price), "quantity": 0}
+            currency = currency or dish["currency"]
+
+        quantity = max(0, line["quantity"] + change["quantity"])
+        total += Decimal(line["unit_price"]) * (quantity - line["quantity"])
+        if quantity:
+            lines[key] = {**line, "quantity": quantity}
+        else:
+            lines.pop(key, None)
+        if len(lines) > max_lines:
+            raise HTTPException(status_code=422, detail=f"A basket has at most {max_lines} different items")
+
+    return {**draft, "revision": draft["revision"] + 1, "currency": currency, "total": format_price(total),
+            "lines": lines}
+
+
+def reprice(draft: dict, dishes: Dict[int, dict], max_lines: int = TABLE_SESSION_MAX_LINES) -> dict:
+    """
+    Prices the lines of a draft again from the current menu, which may have changed since they were added. Lines of
+    dishes or extras that are no longer on the menu are removed.
+
+    Args:
+        draft (dict): The draft; it is not modified.
+        dishes (Dict[int, dict]): The dishes of the restaurant by ID, as cached by the menu cache.
+        max_lines (int): The maximum number of lines of a draft.
+
+    Returns:
+        dict: The draft itself if it is up to date, otherwise the repriced draft with the next revision.
+    """
+    changes = [{"dish_id": line["dish_id"], "extras": list(line["extras"]), "quantity": line["quantity"]}
+               for line in draft["lines"].values()
+               if line["dish_id"] in dishes and set(line["extras"]) <= set(dishes[line["dish_id"]]["extra"] or {})]
+    repriced = apply_changes({**empty_draft(draft["restaurant_id"], draft["table_id"]), "revision": draft["revision"]},
+                             changes, dishes, max_lines)
+    if repriced["lines"] == draft["lines"] and repriced["total"] == draft["total"]:
+        return draft
+    return repriced
+
+
+def order_items(draft: dict) -> List[dict]:
+    """Lists the items of a draft the way baskets store them: one item per dish ordered."""
+    return [{"dish_id": line["dish_id"], "dish_price": line["dish_price"], "extras": line["extras"]}
+            for line in draft["lines"].values() for _ in range(line["quantity"])]
+
+
+class LocalTableSessionStore:
+    """Drafts in this worker's memory. Expired drafts are dropped when they are read, or when the store grows."""
+
+    def __init__(self, ttl: float = TABLE_SESSION_TTL, max_keys: int = 100_000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._drafts: Dict[str, Tuple[dict, float]] = {}
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._drafts.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._drafts[key]
+            return None
+        return entry[0]
+
+    async def update(self, key: str, change: Callable[[Optional[dict]], Optional[dict]]) -> Optional[dict]:
+        """
+        Replaces a draft with `change(draft)`, or deletes it when that returns None. There is no await between
+        reading and writing, so concurrent updates of a draft in this worker cannot interleave.
+        """
+        draft = change(await self.get(key))
+        if draft is None:
+            self._drafts.pop(key, None)
+            return None
+        now = time.monotonic()
+        self._drafts[key] = (draft, now + self.ttl)
+        if len(self._drafts) > self.max_keys:
+            self._drafts = {key: entry for key, entry in self._drafts.items() if entry[1] > now}
+        return draft
+
+
+class SharedTableSessionStore:
+    """
+    Drafts shared by all workers through a Redis-protocol server, as JSON with a TTL. Updates of a draft hold a
+    short lock (SET NX PX), so changes sent to different workers at once are applied one after the other. The lock
+    holds a random token and is released by compare-and-delete: a worker whose lock expired while it was stalled
+    must not release the lock another worker has taken since.
+    """
+
+    def __init__(self, url: str, ttl: float = TABLE_SESSION_TTL):
+        self.client = RespClient(url)
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await self.client.command("GET", f"table_session:{key}")
+        return orjson.loads(value) if value is not None else None
+
+    async def update(self, key: str, change: Callable[[Optional[dict]], Optional[dict]]) -> Optional[dict]:
+        lock, token = f"table_session_lock:{key}", secrets.token_hex(16)
+        deadline = time.monotonic() + SHARED_LOCK_WAIT
+        while await self.client.command("SET", lock, token, "NX", "PX", SHARED_LOCK_MS) is None:
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=503, detail="The basket is busy, please try again",
+                                    headers={"Retry-After": "1"})
+            await asyncio.sleep(0.01)
+        try:
+            draft = change(await self.get(key))
+            if draft is None:
+                await self.client.command("DEL", f"table_session:{key}")
+            else:
+                await self.client.command("SET", f"table_session:{key}", orjson.dumps(draft), "PX", int(self.ttl * 1000))
+            return draft
+        finally:
+            await self.client.command("EVAL", COMPARE_AND_DELETE, 1, lock, token)
+
+
+def create_store(name: str = TABLE_SESSION_BACKEND, url: str = CACHE_URL, workers: int = WORKERS):
+    if name == "local":
+        if workers > 1:
+            # Each worker would keep its own draft of a table, and guests would see items come and go
+            raise ValueError(f"TABLE_SESSION_BACKEND=local keeps drafts in one worker's memory, but {workers} workers "
+                             f"are configured (WEB_CONCURRENCY). Use TABLE_SESSION_BACKEND=resp")
+        return LocalTableSessionStore()
+    if name == "resp":
+        return SharedTableSessionStore(url)
+    raise ValueError(f"Unknown table session backend: {name}. Use 'local' or 'resp'")
+
+
+class TableSessions:
+    """The draft baskets of all tables, keyed by (restaurant_id, table_id)."""
+
+    def __init__(self, store, max_lines: int = TABLE_SESSION_MAX_LINES):
+        self.store = store
+        self.max_lines = max_lines
+        # Restaurant ID -> (menu version, dishes by ID)
+        self._dish_indexes: Dict[int, Tuple[int, Dict[int, dict]]] = {}
+
+    async def dishes(self, session: AsyncSession, restaurant_id: int) -> Dict[int, dict]:
+        """Returns the dishes of a restaurant by ID, from the menu cache; the index is rebuilt once per menu version."""
+        menu = await menu_cache.get(
+            restaurant_id,
+            lambda: get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=restaurant_id)
+        )
+        index = self._dish_indexes.get(restaurant_id)
+        if index is None or index[0] != menu.version:
+            index = self._dish_indexes[restaurant_id] = (menu.version, {dish["id"]: dish for dish in menu.dishes})
+        return index[1]
+
+    async def get(self, restaurant_id: int, table_id: int) -> dict:
+        return await self.store.get(f"{restaurant_id}:{table_id}") or empty_draft(restaurant_id, table_id)
+
+    async def change(self, restaurant_id: int, table_id: int, changes: List[dict], dishes: Dict[int, dict],
+                     revision: Optional[int] = None) -> dict:
+        """
+        Applies changes to the draft of a table.
+
+        Args:
+            restaurant_id (int): The ID of the restaurant.
+            table_id (int): The ID of the table.
+            changes (List[dict]): The changes, see apply_changes().
+            dishes (Dict[int, dict]): The dishes of the restaurant by ID.
+            revision (Optional[int]): The revision the client last saw; the changes are rejected if the draft has
+                changed since. None applies them to whatever the draft is.
+
+        Returns:
+            dict: The new draft.
+
+        Raises:
+            HTTPException: 409 error if `revision` is outdated, and the errors of apply_changes().
+        """
+        def update(draft: Optional[dict]) -> dict:
+            draft = draft or empty_draft(restaurant_id, table_id)
+            if revision is not None and revision != draft["revision"]:
+                metrics.inc("table_session_conflicts_total")
+                raise HTTPException(status_code=409, detail=f"The basket has changed (revision {draft['revision']})")
+            return apply_changes(draft, changes, dishes, self.max_lines)
+
+        draft = await self.store.update(f"{restaurant_id}:{table_id}", update)
+        metrics.inc("table_session_changes_total", amount=len(changes))
+        return draft
+
+    async def clear(self, restaurant_id: int, table_id: int) -> None:
+        await self.store.update(f"{restaurant_id}:{table_id}", lambda draft: None)
+
+    async def take(self, restaurant_id: int, table_id: int, revision: Optional[int] = None) -> dict:
+        """
+        Removes the draft of a table and returns it, for submitting. Removing it in the same step as reading it
+        makes sure that a draft submitted twice at once is only ordered once.
+
+        Raises:
+            HTTPException: 409 error if `revision` is given and outdated; the draft is kept.
+        """
+        taken = {}
+
+        def update(draft: Optional[dict]) -> Optional[dict]:
+            draft = draft or empty_draft(restaurant_id, table_id)
+            if revision is not None and revision != draft["revision"]:
+                metrics.inc("table_session_conflicts_total")
+                raise HTTPException(status_code=409, detail=f"The basket has changed (revision {draft['revision']})")
+            taken.update(draft)
+            return None
+
+        await self.store.update(f"{restaurant_id}:{table_id}", update)
+        return taken
+
+    async def restore(self, draft: dict) -> None:
+        """Puts back a taken draft whose order could not be saved, unless the table has started a new draft since."""
+        await self.store.update(f"{draft['restaurant_id']}:{draft['table_id']}", lambda current: current or draft)
+
+
+table_sessions = TableSessions(create_store())
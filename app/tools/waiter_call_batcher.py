@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from app.config import WAITER_CALL_BATCH_WINDOW_MS, WAITER_CALL_BATCH_MAX_SIZE
+from app.database.crud import upsert_waiter_calls
+from app.database.models import WaiterCall
+from app.database.postgre_db import async_session, get_engine
+from app.tools.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("waiter_call_batches_total", "counter", "Upsert statements written by the waiter call batcher")
+metrics.describe("waiter_call_batched_total", "counter", "Waiter calls written by the waiter call batcher")
+
+
+class WaiterCallBatcher:
+    """
+    Collects waiter calls for up to `window` seconds (or until `max_size` are waiting) and writes them with one
+    upsert statement in one transaction. Every caller gets the stored call of its table; when a table called
+    several times within one batch, all of those callers get the last call.
+    """
+
+    def __init__(self, window: float, max_size: int, session_factory=None):
+        self.window = window
+        self.max_size = max_size
+        self.session_factory = session_factory
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes = set()
+
+    async def submit(self, call: dict) -> WaiterCall:
+        """
+        Queues a waiter call for the next batch and waits until the batch is committed.
+
+        Args:
+            call (dict): The call, with restaurant_id, table_id, status and call_datetime.
+
+        Returns:
+            WaiterCall: The stored call of the table.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((call, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # A caller that goes away does not take the batch down with it
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        try:
+            session_factory = self.session_factory
+            if session_factory is None:
+                get_engine()
+                session_factory = async_session
+            async with session_factory() as session:
+                stored = await upsert_waiter_calls(session, [call for call, _ in batch])
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Writing a batch of {len(batch)} waiter calls failed: {e!r}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+                    # Marked as retrieved, in case the caller has gone away
+                    future.exception()
+            return
+
+        metrics.inc("waiter_call_batches_total")
+        metrics.inc("waiter_call_batched_total", len(batch))
+        for call, future in batch:
+            if not future.done():
+                future.set_result(stored[(call["restaurant_id"], call["table_id"])])
+
+    async def drain(self) -> None:
+        """Writes the pending calls and waits for the running batches, e.g. on shutdown."""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+waiter_call_batcher = WaiterCallBatcher(WAITER_CALL_BATCH_WINDOW_MS / 1000, WAITER_CALL_BATCH_MAX_SIZE)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from app.config import (WARMUP_POOL_CONNECTIONS,
+                        WARMUP_TOP_RESTAURANTS,
+                        WARMUP_IMAGES)
+from app.database.postgre_db import async_session
+from app.database.crud import (get_restaurant_directory_entries,
+                               get_dishes_by_restaurant_and_category_and_id,
+                               get_restaurant_by_id,
+                               get_category_id_name_pairs,
+                               get_dish_basket_info)
+from app.tools.dish_search import InMemoryDishSearch, dish_search
+from app.tools.image_bundles import image_bundles
+from app.tools.image_cache import image_cache
+from app.tools.image_catalog import image_catalog
+from app.tools.menu_cache import menu_cache
+from app.tools.restaurant_directory import restaurant_directory
+
+logger = logging.getLogger(__name__)
+
+
+async def _prepare_connection(barrier: asyncio.Barrier, restaurant_id: int | None, dish_id: int | None) -> None:
+    async with async_session() as session:
+        await session.execute(text("SELECT 1"))
+        # Hold the connection until every task has its own, so the pool really opens that many connections
+        await barrier.wait()
+        # asyncpg keeps prepared statements per connection: run the hot queries once on each of them. Not through
+        # single flight, which would run them once, on a connection of its own
+        if restaurant_id is not None:
+            await get_restaurant_by_id(session, restaurant_id)
+            await get_category_id_name_pairs.__wrapped__(session, restaurant_id)
+            await get_dishes_by_restaurant_and_category_and_id.__wrapped__(session, restaurant_id=restaurant_id)
+        if dish_id is not None:
+            await get_dish_basket_info(session, dish_id)
+
+
+async def warm_up() -> Dict[str, float]:
+    """
+    Prepares this worker for traffic:
+
+    1. Loads the restaurant directory.
+    2. Loads the menus of the WARMUP_TOP_RESTAURANTS best rated restaurants into the menu cache, and builds their
+       search indexes when the in-memory search backend is used.
+    3. Opens WARMUP_POOL_CONNECTIONS pool connections at once and runs the hot queries on each, so their
+       statements are prepared on every connection.
+    4. Reads up to WARMUP_IMAGES photos of those restaurants and their dishes into the image cache.
+    5. Builds the image bundles of those menus, unless another worker of the host already has.
+
+    Returns:
+        Dict[str, float]: The counts of warmed items and the duration of each step in seconds.
+    """
+    stats = {}
+
+    started = time.perf_counter()
+    async with async_session() as session:
+        await restaurant_directory.refresh_if_stale(lambda: get_restaurant_directory_entries(session))
+    _, top_restaurants = restaurant_directory.search(sort="rating", limit=WARMUP_TOP_RESTAURANTS)
+    stats["directory_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    photos: List[str] = []
+    for restaurant in top_restaurants:
+        async with async_session() as session:
+            menu = await menu_cache.get(
+                restaurant.id,
+                lambda: get_dishes_by_restaurant_and_category_and_id(session, restaurant_id=restaurant.id)
+            )
+            if isinstance(dish_search, InMemoryDishSearch):
+                await dish_search.get_index(session, restaurant.id)
+        # Only photos that exist, as listed by the image catalogue
+        for photo in [restaurant.photo] + [dish["photo"] for dish in menu.dishes]:
+            image = image_catalog.lookup(restaurant.id, photo)
+            if image is not None:
+                photos.append(image.path)
+    stats["menus"] = len(top_restaurants)
+    stats["menus_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sample_restaurant = top_restaurants[0].id if top_restaurants else None
+    sample_menu = menu_cache.peek(sample_restaurant) if sample_restaurant is not None else None
+    sample_dish = sample_menu.dishes[0]["id"] if sample_menu and sample_menu.dishes else None
+    connections = max(1, WARMUP_POOL_CONNECTIONS)
+    barrier = asyncio.Barrier(connections)
+    await asyncio.gather(*(_prepare_connection(barrier, sample_restaurant, sample_dish) for _ in range(connections)))
+    stats["connections"] = connections
+    stats["connections_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    images = 0
+    for path in photos[:WARMUP_IMAGES]:
+        images += await image_cache.read(path) is not None
+    stats["images"] = images
+    stats["images_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bundles = 0
+    for restaurant in top_restaurants:
+        menu = menu_cache.peek(restaurant.id)
+        if menu is not None and menu.dishes:
+            await image_bundles.get(restaurant.id, menu.dishes)
+            bundles += 1
+    stats["bundles"] = bundles
+    stats["bundles_seconds"] = time.perf_counter() - started
+
+    return stats
@@ -0,0 +1,124 @@
+"""
+Latency of the dish search backends on one restaurant with a large menu.
+
+The in-memory backend is always measured. The Postgres backend is measured when TEST_DB_URL is set: a
+throw-away restaurant with the generated dishes is inserted into that database and deleted afterwards.
+
+    python -m benchmarks.bench_dish_search --dishes 100000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import TEST_DB_URL
+from app.database.models import Base, Category, Dish, Restaurant
+from app.tools.dish_search import MenuSearchIndex, PostgresDishSearch, tokenize
+
+QUERIES = ["chicken", "spicy beef", "grilled sea", "italian rice", "sweet and sour pork", "roa", "nothing matches this"]
+
+ADJECTIVES = ["delicious", "exquisite", "mouth-watering", "succulent", "flavorful"]
+INGREDIENTS = ["chicken", "beef", "vegetable", "seafood", "pork"]
+STYLES = ["Italian", "Chinese", "French", "Japanese", "Mexican"]
+METHODS = ["grilled", "steamed", "fried", "baked", "roasted"]
+SIDES = ["rice", "noodles", "bread", "salad", "soup"]
+FLAVORS = ["sweet and sour", "spicy", "savory", "tangy", "rich"]
+
+
+def generate_dishes(count: int, restaurant_id: int = 0, category_id: int = 0) -> list:
+    rng = random.Random(42)
+    dishes = []
+    for number in range(count):
+        name = f"{rng.choice(STYLES)} {rng.choice(INGREDIENTS)} {number}"
+        description = (f"Indulge in our {name}, a {rng.choice(ADJECTIVES)} {rng.choice(INGREDIENTS)} dish. "
+                       f"This {rng.choice(STYLES)} specialty is {rng.choice(METHODS)} to perfection, served with "
+                       f"{rng.choice(SIDES)}. A harmonious blend of {rng.choice(FLAVORS)}.")
+        dishes.append({"id": number + 1, "restaurant_id": restaurant_id, "category_id": category_id,
+                       "name": name, "description": description, "price": 9.99})
+    return dishes
+
+
+def report(backend: str, query: str, samples: list, total: int) -> None:
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"{backend:<9} {query!r:<24} matches={total:<7} "
+          f"p50={statistics.median(samples) * 1000:8.2f} ms  p95={p95 * 1000:8.2f} ms")
+
+
+async def bench_memory(dishes: list, repeat: int) -> None:
+    started = time.perf_counter()
+    index = MenuSearchIndex(dishes)
+    print(f"memory    index build: {(time.perf_counter() - started) * 1000:.0f} ms for {len(dishes)} dishes")
+
+    for query in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            total, _ = index.search(tokenize(query))
+            samples.append(time.perf_counter() - started)
+        report("memory", query, samples, total)
+
+
+async def bench_postgres(dishes: list, repeat: int) -> None:
+    engine = create_async_engine(TEST_DB_URL)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_factory() as session:
+        restaurant = Restaurant(name="Search benchmark", rating=4.0, currency="USD", tables_amount=1)
+        category = Category(name=f"Search benchmark {time.time_ns()}")
+        session.add_all([restaurant, category])
+        await session.commit()
+        restaurant_id, category_id = restaurant.id, category.id
+
+        try:
+            rows = [{key: value for key, value in dish.items() if key != "id"} for dish in dishes]
+            for row in rows:
+                row.update(restaurant_id=restaurant_id, category_id=category_id)
+            started = time.perf_counter()
+            for start in range(0, len(rows), 5000):
+                await session.execute(insert(Dish), rows[start:start + 5000])
+            await session.commit()
+            print(f"postgres  insert + index maintenance: {time.perf_counter() - started:.1f} s")
+            async with engine.connect() as conn:
+                await conn.exec_driver_sql("ANALYZE dishes")
+
+            backend = PostgresDishSearch()
+            for query in QUERIES:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    total, _ = await backend.search(session, restaurant_id, query)
+                    samples.append(time.perf_counter() - started)
+                    await session.rollback()
+                report("postgres", query, samples, total)
+        finally:
+            await session.execute(delete(Dish).where(Dish.restaurant_id == restaurant_id))
+            await session.execute(delete(Restaurant).where(Restaurant.id == restaurant_id))
+            await session.execute(delete(Category).where(Category.id == category_id))
+            await session.commit()
+
+    await engine.dispose()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dishes", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    dishes = generate_dishes(args.dishes)
+    await bench_memory(dishes, args.repeat)
+    if TEST_DB_URL:
+        await bench_postgres(dishes, args.repeat)
+    else:
+        print("postgres  skipped: TEST_DB_URL is not set")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Latency of small requests while large /dishes results are being rendered, with the rendering on the event loop
+(inline) or offloaded to threads or worker processes. Large and small requests are served by the same in-process
+app, without a database; the large results go through the same code as filtered /dishes results.
+
+    python -m benchmarks.bench_offload --dishes 20000 --large 4
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.routers.get_dishes import json_response
+from app.tools.compression import compress, negotiate
+from app.tools.loop_monitor import LoopMonitor
+from app.tools.menu_cache import dish_list_adapter, render_dishes
+from app.tools.offload import Offloader
+from benchmarks.bench_serialization import menu
+
+
+def make_app(dishes, mode: str) -> FastAPI:
+    app = FastAPI()
+    offloader = Offloader(min_rows=1, executor=mode) if mode != "inline" else None
+    app.state.offloader = offloader
+
+    @app.get("/large")
+    async def large(request: Request):
+        encoding = negotiate(request.headers.get("accept-encoding"))
+        if offloader is None:
+            body = dish_list_adapter.dump_json(dish_list_adapter.validate_python(dishes))
+            # As the compression middleware would
+            return json_response(compress(body, encoding), encoding)
+        return json_response(*await offloader.run(render_dishes, dishes, encoding))
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    return app
+
+
+async def fetch_large(client: httpx.AsyncClient) -> bytes:
+    # Read as sent: decompressing it here would hold up the loop the app runs on too
+    async with client.stream("GET", "/large", headers={"Accept-Encoding": "gzip"}) as response:
+        return b"".join([chunk async for chunk in response.aiter_raw()])
+
+
+async def bench(count: int, large: int, mode: str) -> None:
+    dishes = menu(count)
+    app = make_app(dishes, mode)
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        # Also starts the worker processes
+        assert response.headers["content-encoding"] == "gzip" and len(response.json()) == count
+
+        async def small_requests(stop: asyncio.Event):
+            while not stop.is_set():
+                started = time.perf_counter()
+                await client.get("/small")
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.005)
+
+        stop = asyncio.Event()
+        async with LoopMonitor(interval=0.005, block_threshold=10.0) as monitor:
+            small_task = asyncio.create_task(small_requests(stop))
+            started = time.perf_counter()
+            await asyncio.gather(*(fetch_large(client) for _ in range(large)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await small_task
+    if app.state.offloader is not None:
+        app.state.offloader.shutdown()
+
+    print(f"dishes={count:<6} {mode:<8} {large} large in {elapsed * 1000:7.0f} ms  "
+          f"{len(latencies):4} small requests meanwhile, slowest {max(latencies) * 1000:7.1f} ms  "
+          f"loop lag p99 {monitor.percentile(99) * 1000:6.1f} ms, max {monitor.max * 1000:6.1f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dishes", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--large", type=int, default=4, help="Concurrent large requests")
+    args = parser.parse_args()
+    for count in args.dishes:
+        for mode in ("inline", "thread", "process"):
+            await bench(count, args.large, mode)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
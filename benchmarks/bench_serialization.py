@@ -0,0 +1,89 @@
+"""
+Throughput of the /dishes response paths for large menus, without a database: the same generated menu is served
+by small in-process apps that differ only in how the response is serialized.
+
+- json: FastAPI's former default, JSONResponse, with the dishes validated against the response_model;
+- orjson: the same with ORJSONResponse, the application's default response class;
+- model_response: the dishes validated and serialized to bytes in one pass by a TypeAdapter (filtered menus);
+- cached_payload: the body rendered once per cached menu (whole menus).
+
+    python -m benchmarks.bench_serialization --dishes 100 1000 10000
+"""
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+from app.database.schemas import DishSchema
+from app.tools.compression import CompressedPayload
+from app.tools.menu_cache import dish_list_adapter
+from app.tools.responses import ModelResponse
+from benchmarks.bench_dish_search import generate_dishes
+
+
+def menu(count: int) -> List[dict]:
+    dishes = generate_dishes(count, restaurant_id=1, category_id=1)
+    for dish in dishes:
+        # As cached by the menu cache
+        dish.update(price=Decimal("9.99"), photo=f"{dish['id']}.jpg", currency="RUB",
+                    extra={"1": ["Cheese", "0.50"], "2": ["Bacon", "1.20"]})
+    return dishes
+
+
+def make_app(dishes: List[dict]) -> FastAPI:
+    app = FastAPI()
+    payload = CompressedPayload(lambda: dish_list_adapter.dump_json(dish_list_adapter.validate_python(dishes)))
+
+    @app.get("/json", response_model=List[DishSchema], response_class=JSONResponse)
+    async def json_dishes():
+        return dishes
+
+    @app.get("/orjson", response_model=List[DishSchema], response_class=ORJSONResponse)
+    async def orjson_dishes():
+        return dishes
+
+    @app.get("/model_response", response_model=List[DishSchema])
+    async def model_response_dishes():
+        return ModelResponse(dish_list_adapter.validate_python(dishes), dish_list_adapter)
+
+    @app.get("/cached_payload", response_model=List[DishSchema])
+    async def cached_payload_dishes():
+        return Response(content=payload.raw, media_type="application/json")
+
+    return app
+
+
+async def bench(count: int, seconds: float) -> None:
+    app = make_app(menu(count))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        bodies = set()
+        for path in ("json", "orjson", "model_response", "cached_payload"):
+            response = await client.get(f"/{path}")
+            bodies.add(repr(response.json()))
+            requests, started = 0, time.perf_counter()
+            while time.perf_counter() - started < seconds:
+                await client.get(f"/{path}")
+                requests += 1
+            elapsed = time.perf_counter() - started
+            print(f"dishes={count:<6} {path:<15} {requests / elapsed:9.1f} req/s  "
+                  f"{elapsed / requests * 1000:8.2f} ms/request  {len(response.content) / 1024:8.0f} KiB")
+        if len(bodies) != 1:
+            print("WARNING: the paths returned different bodies")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dishes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--seconds", type=float, default=3.0, help="Time spent on each path")
+    args = parser.parse_args()
+    for count in args.dishes:
+        await bench(count, args.seconds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Throughput and latency of waiter call writes, one transaction per call versus batched upserts.
+
+Simulates closing time: `--tables` tables of a throw-away restaurant in TEST_DB_URL call concurrently, each
+`--calls` times. Rows of that restaurant are deleted afterwards.
+
+    python -m benchmarks.bench_waiter_calls --tables 300 --calls 5 --windows 1 5 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import TEST_DB_URL
+from app.database.crud import upsert_waiter_calls
+from app.database.models import Base, WaiterCall, WaiterCallEvent, WaiterCallsHourly
+from app.tools.waiter_call_batcher import WaiterCallBatcher
+
+RESTAURANT_ID = -36
+
+
+def report(mode: str, samples: list, elapsed: float) -> None:
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"{mode:<22} {len(samples) / elapsed:9.0f} calls/s  "
+          f"p50={statistics.median(samples) * 1000:7.2f} ms  p95={p95 * 1000:7.2f} ms")
+
+
+async def run(tables: int, calls: int, write: Callable[[dict], Awaitable[None]]) -> Tuple[List[float], float]:
+    samples = []
+
+    async def table(table_id: int) -> None:
+        for number in range(calls):
+            call = {"restaurant_id": RESTAURANT_ID, "table_id": table_id,
+                    "status": ("call", "clean", "check")[number % 3], "call_datetime": datetime.now()}
+            started = time.perf_counter()
+            await write(call)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(table(table_id) for table_id in range(tables)))
+    return samples, time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tables", type=int, default=300)
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--windows", type=float, nargs="+", default=[1, 5, 20], help="Batch windows in ms")
+    parser.add_argument("--max-size", type=int, default=200)
+    args = parser.parse_args()
+    if not TEST_DB_URL:
+        print("skipped: TEST_DB_URL is not set")
+        return
+
+    engine = create_async_engine(TEST_DB_URL, pool_size=args.pool_size, max_overflow=0)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def one_transaction_per_call(call: dict) -> None:
+        async with session_factory() as session:
+            await upsert_waiter_calls(session, [call])
+            await session.commit()
+
+    try:
+        print(f"{args.tables} tables x {args.calls} calls, pool of {args.pool_size} connections")
+        report("transaction per call", *await run(args.tables, args.calls, one_transaction_per_call))
+        for window in args.windows:
+            batcher = WaiterCallBatcher(window / 1000, args.max_size, session_factory=session_factory)
+            report(f"batched, {window:g} ms window", *await run(args.tables, args.calls, batcher.submit))
+    finally:
+        async with session_factory() as session:
+            # The calls, their history and their rollup rows
+            for model in (WaiterCall, WaiterCallEvent, WaiterCallsHourly):
+                await session.execute(delete(model).where(model.restaurant_id == RESTAURANT_ID))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
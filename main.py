@@ -1,35 +1,115 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
-from starlette.middleware.cors import CORSMiddleware
+import asyncio
+import importlib
+import logging
 
 # Own imports
-from app.database.postgre_db import init_db
-from app.routers import (
-    get_all_restaurants,
-    get_all_categories,
-    get_restaurant_by_id,
-    get_dishes,
-    get_dish_details,
-    calculate_basket,
-    call_waiter,
-    add_mock_dishes,
-    get_image
-)
+from app.config import (LOG_LEVEL,
+                        AUTO_MIGRATE,
+                        RETENTION_ENABLED,
+                        ENABLE_MOCK_DISHES,
+                        ENABLE_MENU_IMPORT,
+                        ADMIN_TOKEN,
+                        PROFILE_SAMPLE_RATE,
+                        WARMUP_ENABLED,
+                        WARMUP_BLOCKING,
+                        WARMUP_TIMEOUT,
+                        LOOP_MONITOR_ENABLED)
+from app.tools.startup_profile import startup_profiler
+
+with startup_profiler.measure("import fastapi"):
+    from fastapi import FastAPI
+    from fastapi.responses import RedirectResponse, ORJSONResponse
+    from contextlib import asynccontextmanager
+    from starlette.middleware.cors import CORSMiddleware
+    from app.tools.http_cache import CachePolicyMiddleware
+    from app.tools.compression import CompressionMiddleware
+
+with startup_profiler.measure("import app.database"):
+    from app.database.postgre_db import get_engine
+    from app.database.migrate import migrate
+    from app.tools.retention import retention_loop
+
+with startup_profiler.measure("import app.tools.warmup"):
+    from app.tools.cache import cache_bus
+    from app.tools.image_catalog import image_catalog
+    from app.tools.loop_monitor import loop_monitor
+    from app.tools.offload import offloader
+    from app.tools.waiter_call_batcher import waiter_call_batcher
+    from app.tools.warmup import warm_up
+
+logging.basicConfig(level=LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+async def run_warmup(app: FastAPI):
+    """
+    Runs the startup warm-up and marks the application ready once it has finished.
+    A failed or timed-out warm-up is logged and the application is marked ready anyway,
+    since it can still serve requests, only colder.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    try:
+        stats = await asyncio.wait_for(warm_up(), WARMUP_TIMEOUT)
+        logger.info(f"Warm-up finished: {stats}")
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e!r}")
+    app.state.ready = True
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Context manager for the FastAPI application lifespan.
-    Initializes the database connection on startup.
+    Initializes the database connection and the cache invalidation channel on startup and warms the worker up before (or, when
+    WARMUP_BLOCKING is off, while) it accepts traffic.
 
     Args:
         app (FastAPI): The FastAPI application instance.
     """
-    await init_db()
+    app.state.ready = False
+    # Measures event loop lag and logs the stacks of the code blocking the loop, warm-up included
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
+    with startup_profiler.measure("lifespan: create engine"):
+        get_engine()
+    if AUTO_MIGRATE:
+        with startup_profiler.measure("lifespan: migrate"):
+            await migrate()
+    with startup_profiler.measure("lifespan: start cache bus"):
+        await cache_bus.start()
+    with startup_profiler.measure("lifespan: scan images"):
+        await image_catalog.start()
+
+    warmup_task = None
+    if not WARMUP_ENABLED:
+        app.state.ready = True
+    elif WARMUP_BLOCKING:
+        with startup_profiler.measure("lifespan: warm-up"):
+            await run_warmup(app)
+    else:
+        warmup_task = asyncio.create_task(run_warmup(app))
+
+    # Creates upcoming partitions and archives old ones; only one worker at a time does the work
+    retention_task = asyncio.create_task(retention_loop()) if RETENTION_ENABLED else None
+
+    startup_profiler.log_report()
     yield
 
+    if retention_task is not None:
+        retention_task.cancel()
+        # Lets an interrupted retention step release its connection before the pool goes away
+        await asyncio.gather(retention_task, return_exceptions=True)
+
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await waiter_call_batcher.drain()
+    await image_catalog.stop()
+    await cache_bus.stop()
+    offloader.shutdown()
+    await loop_monitor.stop()
+
 # Application description
 app_description = """
 FastAPI Cafe Menu App is a backend service for a React app, providing an interactive menu for cafes and restaurants.
@@ -38,10 +118,15 @@ Visitors can scan a QR code on their table to access the menu, make orders, and
 ## Features
 
 - **Restaurant Menu**: Retrieve restaurant details, categories, dishes, and dish details.
+- **Dish Search**: Full-text search over dish names and descriptions of a restaurant.
 - **Order Calculation**: Calculate the total price of the basket.
+- **Table Sessions**: Build a table's basket item by item on the server, then submit it as an order.
 - **Waiter Call**: Call a waiter to clean the table or give a check.
+- **Kitchen Queue**: Follow open orders of a restaurant and move them through their statuses.
+- **Analytics**: Revenue per hour, best selling dishes and waiter calls per table, from incrementally updated rollups.
 - **Image Retrieval**: Retrieve images of dishes and restaurants.
 - **Mock Data**: Add mock dishes for testing purposes.
+- **Menu Import**: Import dishes from CSV/NDJSON and change prices in bulk.
 """
 
 app = FastAPI(
@@ -49,6 +134,8 @@ app = FastAPI(
     title="FastAPI Cafe Menu App",
     description=app_description,
     version="1.0.0",
+    # Response bodies are encoded with orjson instead of the standard json module
+    default_response_class=ORJSONResponse,
     contact={
         "name": "Developer Name",
         "url": "https://github.com/yourusername/fastapi-cafe-menu-app",
@@ -65,16 +152,57 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Cache-Control and Vary headers of the GET routers, see CACHE_POLICIES in app/config.py
+app.add_middleware(CachePolicyMiddleware)
+
+# gzip/brotli compression of larger responses, negotiated from Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# On-demand and sampled request profiling; not installed at all unless configured
+if ADMIN_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    from app.tools.profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
+# Routers: (module in app.routers, URL prefix, tag, enabled). Disabled routers are not even imported.
+ROUTERS = [
+    ("get_all_restaurants", "/all_restaurants", "all_restaurants", True),
+    ("get_all_categories", "/all_categories", "all_categories", True),
+    ("get_restaurant_by_id", "/restaurant", "restaurant", True),
+    ("get_dishes", "/dishes", "dishes", True),
+    ("get_dish_details", "/dish_details", "dish_details", True),
+    ("search_dishes", "/search_dishes", "search_dishes", True),
+    ("calculate_basket", "/calculate_basket", "calculate_basket", True),
+    ("table_session", "/table_session", "table_session", True),
+    ("call_waiter", "/call_waiter", "call_waiter", True),
+    ("kitchen_queue", "/kitchen", "kitchen", True),
+    ("get_image", "/images", "images", True),
+    ("analytics", "/analytics", "analytics", True),
+    ("metrics", "/metrics", "health", True),
+    ("add_mock_dishes", "/add_mock_dishes", "add_mock_dishes", ENABLE_MOCK_DISHES),
+    ("menu_import", "/menu_import", "menu_import", ENABLE_MENU_IMPORT),
+    ("admin_profiles", "/admin/profiles", "admin", bool(ADMIN_TOKEN)),
+]
+
 # Include routers
-app.include_router(get_all_restaurants.router, prefix="/all_restaurants", tags=["all_restaurants"])
-app.include_router(get_all_categories.router, prefix="/all_categories", tags=["all_categories"])
-app.include_router(get_restaurant_by_id.router, prefix="/restaurant", tags=["restaurant"])
-app.include_router(get_dishes.router, prefix="/dishes", tags=["dishes"])
-app.include_router(get_dish_details.router, prefix="/dish_details", tags=["dish_details"])
-app.include_router(calculate_basket.router, prefix="/calculate_basket", tags=["calculate_basket"])
-app.include_router(call_waiter.router, prefix="/call_waiter", tags=["call_waiter"])
-app.include_router(get_image.router, prefix="/images", tags=["images"])
-app.include_router(add_mock_dishes.router, prefix="/add_mock_dishes", tags=["add_mock_dishes"])
+for module_name, prefix, tag, enabled in ROUTERS:
+    if not enabled:
+        continue
+    with startup_profiler.measure(f"import app.routers.{module_name}"):
+        module = importlib.import_module(f"app.routers.{module_name}")
+    app.include_router(module.router, prefix=prefix, tags=[tag])
+
+@app.get("/ready", tags=["health"])
+async def ready():
+    """
+    Readiness endpoint for load balancers and orchestrators.
+
+    Returns:
+        ORJSONResponse: 200 once the worker has finished its warm-up, 503 before.
+    """
+    if getattr(app.state, "ready", False):
+        return {"status": "ready"}
+    return ORJSONResponse(status_code=503, content={"status": "warming_up"})
+
 
 @app.get("/")
 async def root():
@@ -0,0 +1,123 @@
+"""
+Fixtures of the stress tests: the whole application served in-process against TEST_DB_URL, with a connection pool
+and load shedding sized per test, and a seeded restaurant.
+"""
+import os
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import main
+from app.config import TEST_DB_URL
+from app.database import postgre_db
+from app.database.postgre_db import Base
+from app.tools import rate_limit
+from app.tools.admission import AdmissionController
+from app.tools.image_catalog import image_catalog
+from app.tools.loop_monitor import LoopMonitor
+from app.tools.menu_cache import menu_cache
+from app.tools.table_sessions import table_sessions
+
+if not TEST_DB_URL:
+    pytest.skip("TEST_DB_URL is not set", allow_module_level=True)
+
+STRESS_RESTAURANT_ID = -45
+STRESS_TABLES = 50
+STRESS_DISHES = 200
+
+WORDS = ["soup", "salad", "grilled", "chicken", "beef", "spicy", "cheese", "tomato", "garlic", "lemon"]
+
+
+def threshold(name: str, default: float) -> float:
+    """A limit asserted by the stress tests; STRESS_<NAME> overrides it for slower or faster machines."""
+    return float(os.getenv(f"STRESS_{name.upper()}", default))
+
+
+def lag_monitor(block_threshold: float) -> LoopMonitor:
+    """A 10 ms loop monitor that keeps all the samples of a test, and the stacks of blocks beyond `block_threshold`."""
+    return LoopMonitor(interval=0.01, block_threshold=block_threshold, window=100_000)
+
+
+def lag_report(monitor: LoopMonitor) -> str:
+    """The lag percentiles, followed by the stacks of the code that blocked the loop."""
+    return "\n\n".join([monitor.report()] + [f"blocked {block['lag'] * 1000:.0f} ms in {block['task']}:\n{block['stack']}"
+                                             for block in monitor.blocks])
+
+
+@pytest_asyncio.fixture
+async def stress_menu():
+    """Seeds the stress restaurant and its menu; everything written for it is deleted afterwards."""
+    engine = create_async_engine(TEST_DB_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("INSERT INTO restaurants (id, name, currency, rating, tables_amount) "
+                                "VALUES (:id, 'Stress Restaurant', 'USD', 4.0, :tables)"),
+                           {"id": STRESS_RESTAURANT_ID, "tables": STRESS_TABLES})
+        await conn.execute(text("INSERT INTO categories (id, name) VALUES (:id, 'Stress')"),
+                           {"id": STRESS_RESTAURANT_ID})
+        await conn.execute(
+            text("INSERT INTO dishes (restaurant_id, category_id, name, description, price, extra) "
+                 "VALUES (:restaurant_id, :category_id, :name, :description, :price, CAST(:extra AS JSON))"),
+            [{"restaurant_id": STRESS_RESTAURANT_ID, "category_id": STRESS_RESTAURANT_ID,
+              "name": f"{WORDS[i % len(WORDS)].title()} {WORDS[i * 7 % len(WORDS)]} {i}",
+              "description": " ".join(WORDS[(i + j) % len(WORDS)] for j in range(5)),
+              "price": 5 + i % 20, "extra": '{"1": ["Cheese", 0.5]}'} for i in range(STRESS_DISHES)]
+        )
+        dish_ids = (await conn.execute(text("SELECT id FROM dishes WHERE restaurant_id = :id ORDER BY id"),
+                                       {"id": STRESS_RESTAURANT_ID})).scalars().all()
+    try:
+        yield dish_ids
+    finally:
+        # The next test seeds dishes with other IDs: menus and drafts of this one must not outlive it
+        await menu_cache.invalidate(STRESS_RESTAURANT_ID)
+        for table_id in range(1, STRESS_TABLES + 1):
+            await table_sessions.clear(STRESS_RESTAURANT_ID, table_id)
+        async with engine.begin() as conn:
+            for table in ("baskets", "waiter_calls", "waiter_call_events", "rollup_revenue_hourly",
+                          "rollup_dish_sales_daily", "rollup_waiter_calls_hourly", "restaurants"):
+                column = "id" if table == "restaurants" else "restaurant_id"
+                await conn.execute(text(f"DELETE FROM {table} WHERE {column} = :id"), {"id": STRESS_RESTAURANT_ID})
+            await conn.execute(text("DELETE FROM categories WHERE id = :id"), {"id": STRESS_RESTAURANT_ID})
+        await engine.dispose()
+
+
+@pytest.fixture
+def serve(monkeypatch, tmp_path):
+    """
+    Returns a factory of clients of the application, started with its lifespan on an engine of TEST_DB_URL with the
+    given pool and load shedding settings. Rate limits, warm-up, retention and the loop monitor are off.
+    """
+    (tmp_path / "default.jpg").write_bytes(b"default photo")
+    monkeypatch.setattr(image_catalog, "root", str(tmp_path))
+    monkeypatch.setattr(image_catalog, "default_photo", "default.jpg")
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(main, "WARMUP_ENABLED", False)
+    monkeypatch.setattr(main, "RETENTION_ENABLED", False)
+    # The tests measure the loop lag themselves, during the load only
+    monkeypatch.setattr(main, "LOOP_MONITOR_ENABLED", False)
+
+    @asynccontextmanager
+    async def start(pool_size: int, max_overflow: int, pool_timeout: float,
+                    max_concurrent: int, max_queue: int, queue_timeout: float):
+        engine = create_async_engine(TEST_DB_URL, pool_size=pool_size, max_overflow=max_overflow,
+                                     pool_timeout=pool_timeout)
+        monkeypatch.setattr(postgre_db, "_engine", engine)
+        monkeypatch.setattr(postgre_db, "admission", AdmissionController(max_concurrent, max_queue, queue_timeout))
+        postgre_db.async_session.configure(bind=engine)
+        # Shut down like a server does, even when the test failed: a failing test must not leave the lifespan's
+        # background tasks behind for the next one
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://stress", timeout=60) as client:
+                yield client, engine
+        finally:
+            await lifespan.__aexit__(None, None, None)
+            await engine.dispose()
+
+    return start
@@ -0,0 +1,130 @@
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from tests.stress.conftest import STRESS_RESTAURANT_ID, STRESS_TABLES, WORDS, lag_monitor, lag_report, threshold
+
+pytestmark = [pytest.mark.stress, pytest.mark.asyncio]
+
+
+
+def mixed_request(client, dish_ids, rng: random.Random):
+    """One request of the mix a busy restaurant sees: mostly menu reads, some waiter calls and basket changes."""
+    table_id = rng.randint(1, STRESS_TABLES)
+    now = datetime.now().isoformat()
+    choice = rng.random()
+    if choice < 0.30:
+        return client.get("/dishes/", params={"restaurant_id": STRESS_RESTAURANT_ID})
+    if choice < 0.40:
+        return client.get("/dishes/", params={"restaurant_id": STRESS_RESTAURANT_ID,
+                                              "category_id": STRESS_RESTAURANT_ID})
+    if choice < 0.50:
+        return client.get("/search_dishes/", params={"restaurant_id": STRESS_RESTAURANT_ID, "q": rng.choice(WORDS)})
+    if choice < 0.58:
+        return client.get("/restaurant/", params={"restaurant_id": STRESS_RESTAURANT_ID})
+    if choice < 0.63:
+        return client.get("/all_restaurants/search", params={"q": "stress"})
+    if choice < 0.70:
+        return client.get("/dish_details/", params={"dish_id": rng.choice(dish_ids)})
+    if choice < 0.80:
+        return client.post("/call_waiter/", json={"restaurant_id": STRESS_RESTAURANT_ID, "table_id": table_id,
+                                                  "status": rng.choice(["call", "clean", "check"]),
+                                                  "call_datetime": now})
+    if choice < 0.92:
+        return client.post("/table_session/changes", json={
+            "restaurant_id": STRESS_RESTAURANT_ID, "table_id": table_id,
+            "changes": [{"dish_id": rng.choice(dish_ids), "extras": rng.choice([[], ["1"]]), "quantity": 1}]
+        })
+    if choice < 0.97:
+        return client.get("/images/", params={"restaurant_id": STRESS_RESTAURANT_ID, "photo": "missing.jpg"})
+    return client.get("/ready")
+
+
+async def mixed_load(client, dish_ids, requests: int, clients: int, think: float) -> list:
+    """
+    Sends `requests` mixed requests from `clients` guests and returns the responses. With `think`, each guest waits a
+    random while (on average `think` seconds) after each response; without, every guest sends its next request at once.
+    """
+    rng = random.Random(45)
+    responses = []
+
+    async def guest():
+        if think:
+            await asyncio.sleep(rng.uniform(0, think))
+        while len(responses) < requests:
+            index = len(responses)
+            responses.append(None)
+            responses[index] = await mixed_request(client, dish_ids, rng)
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+
+    await asyncio.gather(*(guest() for _ in range(clients)))
+    return responses
+
+
+async def test_mixed_load_keeps_the_event_loop_responsive(stress_menu, serve):
+    # A flood: as many requests in flight as there are clients, all the time. The loop never idles, so each of its
+    # iterations runs the callbacks of every request in flight, and the lag is far above what the paced test allows
+    requests, clients = int(threshold("requests", 2000)), int(threshold("clients", 200))
+    lag_p99, lag_max = threshold("lag_p99", 0.3), threshold("lag_max", 0.5)
+    async with serve(pool_size=20, max_overflow=10, pool_timeout=30,
+                     max_concurrent=30, max_queue=clients, queue_timeout=30) as (client, engine):
+        async with lag_monitor(lag_max) as monitor:
+            responses = await mixed_load(client, stress_menu, requests, clients, threshold("think", 0))
+        print(monitor.report())
+
+        statuses = Counter(response.status_code for response in responses)
+        assert statuses == {200: requests}, statuses
+        assert monitor.percentile(99) < lag_p99, lag_report(monitor)
+        assert monitor.max < lag_max, lag_report(monitor)
+        assert engine.pool.checkedout() == 0
+
+
+async def test_paced_load_stays_below_the_block_threshold(stress_menu, serve):
+    # The pace of a busy restaurant: each guest waits about a second between a response and its next request, so
+    # the lag measured is the app's, not the backlog of a saturated loop. p99 is held to LOOP_BLOCK_THRESHOLD
+    requests, clients = int(threshold("paced_requests", 2000)), int(threshold("clients", 200))
+    lag_p99, lag_max = threshold("paced_lag_p99", 0.1), threshold("paced_lag_max", 0.25)
+    async with serve(pool_size=20, max_overflow=10, pool_timeout=30,
+                     max_concurrent=30, max_queue=clients, queue_timeout=30) as (client, engine):
+        async with lag_monitor(lag_max) as monitor:
+            responses = await mixed_load(client, stress_menu, requests, clients, threshold("paced_think", 1.0))
+        print(monitor.report())
+
+        statuses = Counter(response.status_code for response in responses)
+        assert statuses == {200: requests}, statuses
+        assert monitor.percentile(99) < lag_p99, lag_report(monitor)
+        assert monitor.max < lag_max, lag_report(monitor)
+        assert engine.pool.checkedout() == 0
+
+
+async def test_exhausted_pool_sheds_load_with_503(stress_menu, serve):
+    requests = int(threshold("burst", 500))
+    # The whole burst is sent at once by this same loop, so building its requests holds the loop up for a while
+    lag_max = threshold("burst_lag_max", 0.75)
+    now = datetime.now().isoformat()
+    async with serve(pool_size=2, max_overflow=0, pool_timeout=1,
+                     max_concurrent=2, max_queue=10, queue_timeout=0.5) as (client, engine):
+        async with lag_monitor(lag_max) as monitor:
+            responses = await asyncio.gather(*(
+                client.post("/call_waiter/", json={"restaurant_id": STRESS_RESTAURANT_ID,
+                                                   "table_id": i % STRESS_TABLES + 1, "status": "call",
+                                                   "call_datetime": now})
+                for i in range(requests)
+            ))
+        print(monitor.report())
+
+        statuses = Counter(response.status_code for response in responses)
+        # Requests the pool cannot serve are turned away at once, instead of timing out on it with 500
+        assert set(statuses) == {200, 503}, statuses
+        assert all(response.headers.get("Retry-After") for response in responses if response.status_code == 503)
+        assert monitor.max < lag_max, lag_report(monitor)
+
+        # No connection is leaked, and the worker serves again once the burst is over
+        assert engine.pool.checkedout() == 0
+        response = await client.post("/call_waiter/", json={"restaurant_id": STRESS_RESTAURANT_ID, "table_id": 1,
+                                                             "status": "clean", "call_datetime": now})
+        assert response.status_code == 200
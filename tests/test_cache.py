@@ -0,0 +1,100 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+
+from app.tools import cache as cache_module
+from app.tools.cache import CacheBus, LocalBackend, RespBackend, TwoLevelCache, MISSING
+from app.tools.menu_cache import MenuCache
+from app.tools.resp_server import RespServer
+
+
+@pytest_asyncio.fixture
+async def workers():
+    """Two workers' cache buses sharing one stand-in server."""
+    server = RespServer()
+    await server.start(port=0)
+    buses = [CacheBus(RespBackend(f"redis://127.0.0.1:{server.port}/0")) for _ in range(2)]
+    for bus in buses:
+        await bus.start()
+    yield buses
+    for bus in buses:
+        await bus.stop()
+    await server.stop()
+
+
+async def wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+@pytest.mark.asyncio
+async def test_value_loaded_by_one_worker_is_shared(workers):
+    first, second = (TwoLevelCache("test", ttl=60, bus=bus) for bus in workers)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return {"name": "Cafe"}
+
+    assert await first.get_or_load(1, loader) == {"name": "Cafe"}
+    assert await second.get_or_load(1, loader) == {"name": "Cafe"}
+    assert len(loads) == 1
+    assert second.stats["l2_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_evicts_every_worker(workers):
+    first, second = (TwoLevelCache("test", ttl=60, bus=bus) for bus in workers)
+    await first.set(1, "old")
+    assert await second.get(1) == "old"
+
+    await first.invalidate(1)
+    await wait_for(lambda: second.get_local(1) is MISSING)
+    assert await second.get(1) is MISSING
+
+
+@pytest.mark.asyncio
+async def test_menu_from_shared_cache_keeps_decimal_prices(workers):
+    first, second = (MenuCache(ttl=60, bus=bus) for bus in workers)
+
+    async def loader():
+        return [{"id": 1, "name": "Soup", "price": Decimal("4.50")}]
+
+    await first.get(7, loader)
+    entry = await second.get(7, loader)
+    assert entry.dishes[0]["price"] == Decimal("4.50")
+    assert second.peek(7) is entry
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_while_reloading():
+    reloads = []
+
+    async def reload(key):
+        reloads.append(key)
+        return len(reloads)
+
+    cache = TwoLevelCache("counter", ttl=0.01, stale_ttl=60, bus=CacheBus(LocalBackend()), reload=reload)
+    await cache.set("a", 0)
+    await asyncio.sleep(0.02)
+
+    assert await cache.get_or_load("a", None) == 0
+    assert cache.stats["stale_hits"] == 1
+    await wait_for(lambda: cache.get_local("a") == 1)
+
+    with pytest.raises(ValueError):
+        TwoLevelCache("counter", ttl=0.01, stale_ttl=60, bus=CacheBus(LocalBackend()))
+
+
+@pytest.mark.asyncio
+async def test_local_backend_warns_when_several_workers_run(monkeypatch, caplog):
+    monkeypatch.setattr(cache_module, "WORKERS", 4)
+    bus = CacheBus(LocalBackend())
+    await bus.start()
+    await bus.stop()
+    assert "CACHE_BACKEND=local with 4 workers" in caplog.text
@@ -0,0 +1,74 @@
+import gzip
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from app.tools import compression
+from app.tools.compression import CompressedPayload, CompressionMiddleware, negotiate
+
+
+def test_negotiate_follows_q_values():
+    assert negotiate("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert negotiate("br;q=0.5, gzip", ("br", "gzip")) == "gzip"
+    assert negotiate("br, gzip", ("br", "gzip")) == "br"
+    assert negotiate("*", ("gzip",)) == "gzip"
+    assert negotiate("gzip;q=0, identity", ("gzip",)) is None
+    assert negotiate(None) is None
+
+
+def test_payload_is_rendered_and_compressed_once():
+    renders = []
+    payload = CompressedPayload(lambda: renders.append(1) or b'{"name": "soup"}' * 200)
+
+    first, encoding = payload.body("gzip")
+    second, _ = payload.body("gzip")
+    assert encoding == "gzip"
+    assert first is second
+    assert gzip.decompress(first) == payload.raw
+    assert payload.body("identity") == (payload.raw, None)
+    assert len(renders) == 1
+
+
+def test_payload_compressed_on_the_event_loop_uses_the_configured_level(monkeypatch):
+    monkeypatch.setattr(compression, "GZIP_LEVEL", 1)
+    payload = CompressedPayload(lambda: b"".join(b'{"id": %d, "name": "soup"}' % i for i in range(500)))
+    body, _ = payload.body("gzip")
+    assert body == gzip.compress(payload.raw, compresslevel=1, mtime=0)
+    assert body != gzip.compress(payload.raw, compresslevel=9, mtime=0)
+
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, min_size=100)
+
+
+@app.get("/large")
+async def large():
+    return [{"description": "x" * 20}] * 20
+
+
+@app.get("/small")
+async def small():
+    return {"id": 1}
+
+
+@app.get("/encoded")
+async def encoded():
+    return Response(gzip.compress(b"[]" * 100), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+@pytest.mark.asyncio
+async def test_middleware_compresses_large_bodies_only():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert len(response.json()) == 20
+
+        assert "content-encoding" not in (await client.get("/small", headers={"Accept-Encoding": "gzip"})).headers
+        assert "content-encoding" not in (await client.get("/large", headers={"Accept-Encoding": "identity"})).headers
+
+        # Already encoded bodies are not compressed twice
+        response = await client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+        assert response.content == b"[]" * 100
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import (create_async_engine,
@@ -5,15 +7,28 @@ from sqlalchemy.ext.asyncio import (create_async_engine,
                                     AsyncSession
                                     )
 from sqlalchemy import text
-from app.database.models import Base, Restaurant, Dish, Category
+from datetime import date, datetime
+from decimal import Decimal
+from app.database.models import Base, Restaurant, Dish, Category, Basket
 from app.database.crud import (
     get_restaurant_id_name_pairs,
+    get_restaurant_directory_entries,
     get_category_id_name_pairs,
     get_restaurant_by_id,
     get_dishes_by_restaurant_and_category_and_id,
     get_dish_detailed_info,
-    get_dish_basket_info
+    get_dish_basket_info,
+    search_dishes_fulltext,
+    get_open_baskets,
+    get_basket_changes,
+    update_basket_status,
+    upsert_waiter_calls,
+    record_basket_rollups,
+    get_revenue_by_hour,
+    get_top_dishes,
+    get_waiter_calls_by_hour
 )
+from app.tools.rollups import rebuild_rollups
 
 from app.config import TEST_DB_URL
 
@@ -62,6 +77,11 @@ async def test_get_restaurant_id_name_pairs(async_session, setup_data):
     result = await get_restaurant_id_name_pairs(async_session)
     assert result == {1: "Test Restaurant"}
 
+@pytest.mark.asyncio
+async def test_get_restaurant_directory_entries(async_session, setup_data):
+    result = await get_restaurant_directory_entries(async_session)
+    assert [(entry.id, entry.name, entry.currency) for entry in result] == [(1, "Test Restaurant", "USD")]
+
 @pytest.mark.asyncio
 async def test_get_category_id_name_pairs(async_session, setup_data):
     result = await get_category_id_name_pairs(async_session, restaurant_id=1)
@@ -86,3 +106,184 @@ async def test_get_dish_detailed_info(async_session, setup_data):
 async def test_get_dish_basket_info(async_session, setup_data):
     result = await get_dish_basket_info(async_session, dish_id=1)
     assert result["name"] == "Test Dish"
+
+@pytest.mark.asyncio
+async def test_search_dishes_fulltext(async_session, setup_data):
+    async_session.add(Dish(restaurant_id=1, category_id=1, name="Spicy Ramen", price=12.5, description="Noodles in a test broth"))
+    await async_session.commit()
+
+    total, hits = await search_dishes_fulltext(async_session, restaurant_id=1, tsquery="test:*")
+    assert total == 2
+    assert [dish["name"] for dish, rank in hits] == ["Test Dish", "Spicy Ramen"]
+    assert hits[0][0]["price"] == Decimal("10.00")
+
+    total, hits = await search_dishes_fulltext(async_session, restaurant_id=1, tsquery="test:*", offset=5)
+    assert (total, hits) == (2, [])
+
+
+@pytest_asyncio.fixture
+async def setup_baskets(async_session):
+    await async_session.execute(text("TRUNCATE TABLE baskets"))
+    await async_session.commit()
+
+    for table_id, status in ((1, "new"), (2, "served"), (3, "cooking")):
+        async_session.add(Basket(restaurant_id=1, table_id=table_id, order_datetime=datetime(2024, 6, 1, 12, table_id),
+                                 order_items=[], total_cost=Decimal("10.00"), currency="USD", status=status))
+    await async_session.commit()
+
+@pytest.mark.asyncio
+async def test_get_open_baskets(async_session, setup_baskets):
+    result = await get_open_baskets(async_session, restaurant_id=1)
+    assert [basket.table_id for basket in result] == [1, 3]
+
+@pytest.mark.asyncio
+async def test_update_basket_status_moves_basket_past_cursor(async_session, setup_baskets):
+    baskets = await get_basket_changes(async_session, restaurant_id=1, cursor=0)
+    cursor, revision = baskets[-1].feed_position, baskets[0].revision
+    assert await get_basket_changes(async_session, restaurant_id=1, cursor=cursor) == []
+
+    updated = await update_basket_status(async_session, baskets[0].id, "ready", waiter="Anna")
+    await async_session.commit()
+    assert updated.status == "ready" and updated.waiter == "Anna"
+
+    changes = await get_basket_changes(async_session, restaurant_id=1, cursor=cursor)
+    assert [basket.id for basket in changes] == [baskets[0].id]
+    assert changes[0].feed_position > cursor and changes[0].revision > revision
+
+@pytest.mark.asyncio
+async def test_basket_changes_commit_in_order(async_session, setup_baskets):
+    baskets = await get_basket_changes(async_session, restaurant_id=1, cursor=0)
+    cursor = baskets[-1].feed_position
+    await async_session.commit()
+
+    engine = create_async_engine(TEST_DB_URL)
+    try:
+        async with AsyncSession(engine) as older, AsyncSession(engine) as newer:
+            # The older transaction takes its position first: the newer one waits for it to end
+            await update_basket_status(older, baskets[0].id, "ready")
+            newer_update = asyncio.create_task(update_basket_status(newer, baskets[1].id, "ready"))
+            await asyncio.sleep(0.2)
+            assert not newer_update.done()
+            assert await get_basket_changes(async_session, restaurant_id=1, cursor=cursor) == []
+            await async_session.commit()
+
+            await older.commit()
+            await newer_update
+            await newer.commit()
+            changes = await get_basket_changes(async_session, restaurant_id=1, cursor=cursor)
+            assert [basket.id for basket in changes] == [baskets[0].id, baskets[1].id]
+            await async_session.commit()
+    finally:
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_basket_changes_are_not_held_back_by_other_transactions(async_session, setup_baskets):
+    baskets = await get_basket_changes(async_session, restaurant_id=1, cursor=0)
+    cursor = baskets[-1].feed_position
+    await async_session.commit()
+
+    engine = create_async_engine(TEST_DB_URL)
+    try:
+        async with AsyncSession(engine) as long_writer, AsyncSession(engine) as kitchen:
+            # A long write that started first, such as a menu import, and a basket change of another restaurant
+            await long_writer.execute(text("UPDATE restaurants SET rating = rating WHERE id = 1"))
+            other = Basket(restaurant_id=2, table_id=1, order_datetime=datetime(2024, 6, 1, 13), order_items=[],
+                           total_cost=Decimal("10.00"), currency="USD", status="new")
+            long_writer.add(other)
+            await long_writer.flush()
+            await update_basket_status(long_writer, other.id, "cooking")
+
+            await update_basket_status(kitchen, baskets[0].id, "ready")
+            await kitchen.commit()
+            changes = await get_basket_changes(async_session, restaurant_id=1, cursor=cursor)
+            assert [basket.id for basket in changes] == [baskets[0].id]
+            await async_session.commit()
+            await long_writer.rollback()
+    finally:
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_basket_changes_do_not_split_a_transaction(async_session, setup_baskets):
+    baskets = await get_basket_changes(async_session, restaurant_id=1, cursor=0)
+    assert len({basket.feed_position for basket in baskets}) == 1
+    assert len(await get_basket_changes(async_session, restaurant_id=1, cursor=0, limit=1)) == 3
+
+@pytest.mark.asyncio
+async def test_upsert_waiter_calls_keeps_one_call_per_table(async_session):
+    await async_session.execute(text("TRUNCATE TABLE waiter_calls"))
+    first = await upsert_waiter_calls(async_session, [
+        {"restaurant_id": 1, "table_id": 1, "status": "call", "call_datetime": datetime(2024, 1, 1, 20, 0)},
+    ])
+    second = await upsert_waiter_calls(async_session, [
+        {"restaurant_id": 1, "table_id": 1, "status": "clean", "call_datetime": datetime(2024, 1, 1, 20, 1)},
+        {"restaurant_id": 1, "table_id": 2, "status": "call", "call_datetime": datetime(2024, 1, 1, 20, 1)},
+        {"restaurant_id": 1, "table_id": 1, "status": "check", "call_datetime": datetime(2024, 1, 1, 20, 2)},
+    ])
+    await async_session.commit()
+
+    assert second[(1, 1)].id == first[(1, 1)].id
+    assert second[(1, 1)].status == "check"
+    assert second[(1, 2)].status == "call"
+    count = (await async_session.execute(text("SELECT count(*) FROM waiter_calls"))).scalar_one()
+    assert count == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_waiter_call_batches_do_not_deadlock():
+    import random
+    engine = create_async_engine(TEST_DB_URL, pool_size=10)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def batch(seed):
+        # The same tables, in another order in each batch
+        tables = list(range(1, 1001))
+        random.Random(seed).shuffle(tables)
+        async with sessions() as session:
+            await upsert_waiter_calls(session, [{"restaurant_id": -36, "table_id": table_id, "status": "call",
+                                                 "call_datetime": datetime(2024, 1, 1, 20, 0)} for table_id in tables])
+            await session.commit()
+
+    try:
+        await asyncio.gather(*(batch(seed) for seed in range(10)))
+    finally:
+        async with engine.begin() as conn:
+            for table in ("waiter_calls", "waiter_call_events", "rollup_waiter_calls_hourly"):
+                await conn.execute(text(f"DELETE FROM {table} WHERE restaurant_id = -36"))
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_rollups_are_updated_incrementally_and_match_a_rebuild(async_session, setup_data):
+    await async_session.execute(text("TRUNCATE TABLE baskets, waiter_call_events, rollup_revenue_hourly, "
+                                     "rollup_dish_sales_daily, rollup_waiter_calls_hourly"))
+    for minute, items in ((5, [{"dish_id": 1, "dish_price": "10.00", "extras": {"1": ["Cheese", "1.50"]}},
+                               {"dish_id": 1, "dish_price": "10.00", "extras": {}}]),
+                          (40, [{"dish_id": 2, "dish_price": "12.00", "extras": {}}])):
+        basket = Basket(restaurant_id=1, table_id=1, order_datetime=datetime(2024, 6, 1, 12, minute), order_items=items,
+                        total_cost=Decimal("12.00") if minute == 40 else Decimal("21.50"), currency="USD", status="new")
+        async_session.add(basket)
+        await async_session.flush()
+        await record_basket_rollups(async_session, basket)
+    await upsert_waiter_calls(async_session, [
+        {"restaurant_id": 1, "table_id": 3, "status": "call", "call_datetime": datetime(2024, 6, 1, 12, minute)}
+        for minute in (1, 2)
+    ])
+    await async_session.commit()
+
+    async def snapshot():
+        revenue = await get_revenue_by_hour(async_session, 1, datetime(2024, 6, 1), datetime(2024, 6, 2))
+        dishes = await get_top_dishes(async_session, 1, date(2024, 6, 1), date(2024, 6, 1))
+        calls = await get_waiter_calls_by_hour(async_session, 1, datetime(2024, 6, 1), datetime(2024, 6, 2))
+        return ([(row.hour, row.orders, row.revenue) for row in revenue], dishes,
+                [(row.hour, row.table_id, row.status, row.calls) for row in calls])
+
+    incremental = await snapshot()
+    assert incremental[0] == [(datetime(2024, 6, 1, 12), 2, Decimal("33.50"))]
+    assert incremental[1] == [
+        {"dish_id": 1, "name": "Test Dish", "quantity": 2, "revenue": Decimal("21.50")},
+        {"dish_id": 2, "name": None, "quantity": 1, "revenue": Decimal("12.00")},
+    ]
+    assert incremental[2] == [(datetime(2024, 6, 1, 12), 3, "call", 2)]
+
+    await rebuild_rollups(await async_session.connection())
+    await async_session.commit()
+    async_session.expunge_all()
+    assert await snapshot() == incremental
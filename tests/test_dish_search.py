@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.tools import dish_search
+from app.tools.dish_search import InMemoryDishSearch, MenuSearchIndex, tokenize
+
+
+DISHES = [
+    {"id": 1, "name": "Chicken Curry", "description": "Mild curry with rice"},
+    {"id": 2, "name": "Beef Noodles", "description": "Noodles with chicken broth"},
+    {"id": 3, "name": "Green Salad", "description": "Fresh leaves"},
+]
+
+def test_name_matches_rank_above_description_matches():
+    total, hits = MenuSearchIndex(DISHES).search(tokenize("chicken"))
+    assert total == 2
+    assert [dish["id"] for dish, score in hits] == [1, 2]
+
+def test_all_terms_must_match_and_last_term_is_a_prefix():
+    index = MenuSearchIndex(DISHES)
+    assert [dish["id"] for dish, score in index.search(tokenize("noodles chick"))[1]] == [2]
+    assert index.search(tokenize("salad chicken")) == (0, [])
+
+def test_paging():
+    total, hits = MenuSearchIndex(DISHES).search(tokenize("c"), offset=1, limit=1)
+    assert total == 2
+    assert len(hits) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_build_the_index_once_off_the_loop(monkeypatch):
+    class Cache:
+        async def get(self, restaurant_id, load):
+            return SimpleNamespace(dishes=DISHES, version=1)
+
+    builds = []
+
+    def build(dishes):
+        builds.append(asyncio._get_running_loop())
+        return MenuSearchIndex(dishes)
+
+    monkeypatch.setattr(dish_search, "MenuSearchIndex", build)
+    search = InMemoryDishSearch(Cache())
+    results = await asyncio.gather(*(search.search(None, 1, "chicken") for _ in range(5)))
+    assert [total for total, hits in results] == [2] * 5
+    # Built once, in a thread without an event loop
+    assert builds == [None]
@@ -0,0 +1,34 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.tools.http_cache import CachePolicyMiddleware
+
+POLICIES = {"/dishes": {"max_age": 60, "stale_while_revalidate": 300, "vary": "Accept-Encoding"}}
+
+app = FastAPI()
+app.add_middleware(CachePolicyMiddleware, policies=POLICIES)
+
+
+@app.get("/dishes/")
+async def dishes(missing: bool = False):
+    if missing:
+        return JSONResponse(status_code=404, content={})
+    return JSONResponse(content=[], headers={"Vary": "Origin"})
+
+
+@app.get("/kitchen/")
+async def kitchen():
+    return []
+
+
+@pytest.mark.asyncio
+async def test_policy_headers_are_added_to_successful_gets_only():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        response = await client.get("/dishes/")
+        assert response.headers["cache-control"] == "public, max-age=60, stale-while-revalidate=300"
+        assert response.headers["vary"] == "Origin, Accept-Encoding"
+
+        assert "cache-control" not in (await client.get("/dishes/", params={"missing": True})).headers
+        assert "cache-control" not in (await client.get("/kitchen/")).headers
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.routers import get_image
+from app.tools.image_bundles import ImageBundles
+from app.tools.image_catalog import ImageCatalog, watchfiles
+
+
+def make_folder(tmp_path):
+    tmp_path.mkdir(exist_ok=True)
+    (tmp_path / "default.png").write_bytes(b"default")
+    (tmp_path / "7").mkdir()
+    (tmp_path / "7" / "soup.jpg").write_bytes(b"soup")
+    (tmp_path / "7" / "notes.txt").write_bytes(b"not a photo")
+    (tmp_path / "8").mkdir()
+    (tmp_path / "8" / "secret.png").write_bytes(b"secret")
+    return ImageCatalog(str(tmp_path), default_photo="default.png")
+
+
+@pytest.mark.asyncio
+async def test_lookup_only_finds_photos_of_the_restaurant_folder(tmp_path, monkeypatch):
+    catalog = make_folder(tmp_path)
+    assert await catalog.load() == 3
+    assert catalog.lookup(7, "soup.jpg").media_type == "image/jpeg"
+    assert catalog.lookup(7, "notes.txt") is None
+    assert catalog.lookup(7, "../8/secret.png") is None
+
+    monkeypatch.setattr(get_image, "image_catalog", catalog)
+    app = FastAPI()
+    app.include_router(get_image.router, prefix="/images")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        response = await client.get("/images/", params={"restaurant_id": 7, "photo": "../8/secret.png"})
+        assert response.content == b"default"
+        response = await client.get("/images/", params={"restaurant_id": 7, "photo": "soup.jpg"})
+        assert response.content == b"soup"
+        response = await client.get("/images/", params={"restaurant_id": 7, "photo": "soup.jpg"},
+                                    headers={"If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304 and response.content == b""
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(watchfiles is None, reason="watchfiles is not installed")
+async def test_changes_are_picked_up_by_the_watcher(tmp_path):
+    catalog = make_folder(tmp_path)
+    changes = []
+    catalog.add_listener(lambda folders, paths: changes.append((folders, paths)))
+    await catalog.start()
+    try:
+        await asyncio.sleep(0.2)
+        (tmp_path / "7" / "soup.jpg").unlink()
+        (tmp_path / "9").mkdir()
+        (tmp_path / "9" / "cake.webp").write_bytes(b"cake")
+        for _ in range(50):
+            if catalog.lookup(9, "cake.webp") is not None and catalog.lookup(7, "soup.jpg") is None:
+                break
+            await asyncio.sleep(0.1)
+        assert catalog.lookup(9, "cake.webp") is not None
+        assert catalog.lookup(7, "soup.jpg") is None
+        assert any(str(tmp_path / "7" / "soup.jpg") in paths for _, paths in changes)
+    finally:
+        await catalog.stop()
+
+
+@pytest.mark.asyncio
+async def test_bundle_is_built_once_and_changes_with_its_photos(tmp_path):
+    catalog = make_folder(tmp_path / "img")
+    (tmp_path / "img" / "7" / "tea.png").write_bytes(b"tea")
+    await catalog.load()
+    dishes = [{"category_id": 1, "photo": "soup.jpg"}, {"category_id": 2, "photo": "tea.png"},
+              {"category_id": 2, "photo": "soup.jpg"}, {"category_id": 2, "photo": "missing.png"}]
+    bundles = ImageBundles(str(tmp_path / "bundles"), catalog, thumbnail_size=0)
+
+    manifest = await bundles.get(7, dishes)
+    data = open(bundles.path(7, None, manifest["version"]), "rb").read()
+    assert {photo: data[image["offset"]:image["offset"] + image["length"]]
+            for photo, image in manifest["images"].items()} == {"soup.jpg": b"soup", "tea.png": b"tea"}
+    assert list((await bundles.get(7, dishes, category_id=1))["images"]) == ["soup.jpg"]
+
+    # Another worker reads the manifest from disk instead of building the bundle again
+    other_worker = ImageBundles(str(tmp_path / "bundles"), catalog, thumbnail_size=0)
+    assert other_worker._load_or_build(7, None, manifest["version"], images={}) == manifest
+
+    # Built long ago, but current until now: kept for the grace period after it is replaced
+    old_path = bundles.path(7, None, manifest["version"])
+    long_ago = time.time() - 2 * 86400
+    for path in (old_path, bundles.path(7, None, manifest["version"], "json")):
+        os.utime(path, (long_ago, long_ago))
+    (tmp_path / "img" / "7" / "tea.png").write_bytes(b"green tea")
+    await catalog.refresh(["7"])
+    new_manifest = await bundles.get(7, dishes)
+    assert new_manifest["version"] != manifest["version"]
+    assert new_manifest["images"]["tea.png"]["length"] == len(b"green tea")
+    assert os.path.exists(old_path)
+
+    os.utime(bundles.path(7, None, manifest["version"], "superseded"), (long_ago, long_ago))
+    bundles._remove_old_versions("7-all", new_manifest["version"])
+    assert not os.path.exists(old_path)
+    assert os.path.exists(bundles.path(7, None, new_manifest["version"]))
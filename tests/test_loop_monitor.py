@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import pytest
+
+from app.tools.loop_monitor import LoopMonitor
+from app.tools.metrics import metrics
+
+
+def validate_huge_menu():
+    time.sleep(0.3)
+
+
+async def get_dishes():
+    validate_huge_menu()
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_reported_with_its_stack():
+    blocked = metrics.value("event_loop_blocked_total")
+    async with LoopMonitor(interval=0.01, block_threshold=0.1) as monitor:
+        await asyncio.sleep(0.05)
+        await asyncio.create_task(asyncio.to_thread(time.sleep, 0.2), name="offloaded")
+        await asyncio.create_task(get_dishes(), name="dishes")
+        await asyncio.sleep(0.05)
+
+    assert len(monitor.blocks) == 1
+    block = monitor.blocks[0]
+    assert block["lag"] >= 0.25 and block["task"] == "task dishes (get_dishes)"
+    assert "validate_huge_menu" in block["stack"]
+    assert metrics.value("event_loop_blocked_total") == blocked + 1
+    assert 0.25 <= monitor.max < 0.5
+    assert metrics.value("event_loop_lag_seconds", quantile=1.0) == monitor.max
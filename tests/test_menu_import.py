@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.config import TEST_DB_URL
+from app.database.models import Base
+from app.tools import menu_import
+from app.tools.menu_import import (ImportTooLarge, MenuImportError, adjust_prices, import_menu, iter_records, iter_rows,
+                                   read_spooled, reprice_dishes, spool)
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_csv_records_survive_chunk_boundaries_and_quoted_line_breaks():
+    rows = [row async for row in iter_rows(stream(
+        b'name,category_id,price,description\nSoup,1,4.5,"Hot,\nand ',
+        b'fresh"\nTea,1,2,\n'
+    ), "csv")]
+    assert rows == [
+        (2, {"name": "Soup", "category_id": "1", "price": "4.5", "description": "Hot,\nand fresh"}),
+        (3, {"name": "Tea", "category_id": "1", "price": "2", "description": ""}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_long_records_are_rejected_and_uploads_are_spooled():
+    # A record split over many chunks is scanned once, and rejected once it is longer than the limit
+    chunks = [b'name\n"'] + [b"x\n" * 50] * 20 + [b'"\nTea\n']
+    assert [record async for record in iter_records(stream(*chunks), quoted=True, max_bytes=4096)][-1] == "Tea\n"
+    with pytest.raises(MenuImportError) as error:
+        [record async for record in iter_records(stream(*chunks), quoted=True, max_bytes=1000)]
+    assert error.value.errors == ["line 2: longer than 1000 bytes"]
+
+    body = await spool(stream(b"name\n", b"Tea\n" * 10), max_bytes=100, memory=16)
+    try:
+        assert b"".join([chunk async for chunk in read_spooled(body, chunk_size=7)]) == b"name\n" + b"Tea\n" * 10
+    finally:
+        body.close()
+    with pytest.raises(ImportTooLarge):
+        await spool(stream(b"Tea\n" * 30), max_bytes=100)
+
+
+@pytest.mark.asyncio
+async def test_rows_in_another_encoding_and_long_csv_fields_are_reported():
+    with pytest.raises(MenuImportError) as error:
+        [row async for row in iter_rows(stream("name,category_id,price\nCafé,1,2\n".encode("cp1252")), "csv")]
+    assert error.value.errors[0].startswith("line 2: not UTF-8")
+
+    # Longer than the csv module's default field limit, shorter than MENU_IMPORT_MAX_RECORD_BYTES
+    description = "x" * 200_000
+    rows = [row async for row in iter_rows(stream(f'name,description\nSoup,"{description}"\n'.encode()), "csv")]
+    assert rows == [(2, {"name": "Soup", "description": description})]
+
+
+def test_adjust_prices_rounds_to_cents_with_and_without_numpy(monkeypatch):
+    prices = [10.0, 0.99, 3.3333, 19.995]
+    expected = adjust_prices(prices, 1.05, 0.5)
+    monkeypatch.setattr(menu_import, "numpy", None)
+    assert adjust_prices(prices, 1.05, 0.5) == expected == [11.0, 1.54, 4.0, 21.49]
+
+
+@pytest.mark.asyncio
+async def test_import_upserts_by_name_and_rejects_invalid_rows():
+    engine = create_async_engine(TEST_DB_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with engine.connect() as conn:
+            # Everything is rolled back at the end
+            await conn.begin()
+            session = AsyncSession(bind=conn)
+            await conn.execute(text("INSERT INTO restaurants (id, name, currency, rating, tables_amount) "
+                                    "VALUES (-39, 'Import', 'USD', 5, 1)"))
+            await conn.execute(text("INSERT INTO categories (id, name) VALUES (-39, 'Imported')"))
+
+            first = await import_menu(session, -39, stream(
+                b'{"name": "Soup", "category_id": -39, "price": 4, "extra": {"1": ["Bread", 1]}}\n'
+                b'{"name": "Tea", "category_id": -39, "price": 2}\n'
+            ), "ndjson", price_factor=1.5)
+            assert (first.rows, first.inserted, first.updated) == (2, 2, 0)
+
+            second = await import_menu(session, -39, stream(b"name,category_id,price\nTea,-39,2.5\nCake,-39,3\n"))
+            assert (second.inserted, second.updated) == (1, 1)
+
+            with pytest.raises(MenuImportError) as error:
+                await import_menu(session, -39, stream(b"name,category_id,price\nPie,-39,-1\n,-39,1\nJam,12345,1\n"))
+            assert len(error.value.errors) == 3
+
+            stats, restaurants = await reprice_dishes(session, restaurant_ids=[-39], factor=1.1)
+            assert (stats.rows, restaurants) == (3, {-39})
+            dishes = await conn.execute(text("SELECT name, price, extra FROM dishes WHERE restaurant_id = -39 ORDER BY name"))
+            assert [tuple(row) for row in dishes] == [
+                ("Cake", 3.3, None),
+                ("Soup", 6.6, {"1": ["Bread", 1.65]}),
+                ("Tea", 2.75, None),
+            ]
+            await session.close()
+    finally:
+        await engine.dispose()
@@ -0,0 +1,75 @@
+import asyncio
+import functools
+import gzip
+import threading
+from decimal import Decimal
+
+import pytest
+
+from app.tools.compression import CompressedPayload
+from app.tools import menu_cache
+from app.tools.menu_cache import dish_list_adapter, dump_dishes, render_dishes
+from app.tools.offload import Offloader
+
+DISHES = [{"id": i, "restaurant_id": 1, "category_id": 1, "name": f"Dish {i}", "description": "Soup of the day",
+           "photo": None, "price": Decimal("9.99"), "currency": "USD", "extra": {"1": ["Cheese", Decimal("0.50")]}}
+          for i in range(50)]
+
+
+def test_menu_rendered_in_chunks_is_the_same_json(monkeypatch):
+    whole = dish_list_adapter.dump_json(dish_list_adapter.validate_python(DISHES))
+    monkeypatch.setattr(menu_cache, "RENDER_CHUNK_SIZE", 7)
+    assert dump_dishes(DISHES) == whole
+
+
+@pytest.mark.asyncio
+async def test_payload_is_rendered_and_compressed_once_off_the_event_loop():
+    offloader = Offloader(min_rows=10, executor="thread")
+    threads = []
+
+    def render():
+        threads.append(threading.current_thread())
+        return dump_dishes(DISHES)
+
+    payload = CompressedPayload(render, offloader.run if offloader.should_offload(len(DISHES)) else None)
+    results = await asyncio.gather(*(payload.get("gzip") for _ in range(5)))
+
+    assert threads and threading.main_thread() not in threads and len(threads) == 1
+    assert all(result == results[0] for result in results) and results[0][1] == "gzip"
+    assert gzip.decompress(results[0][0]) == payload.raw == dump_dishes(DISHES)
+    assert await payload.get(None) == (payload.raw, None)
+
+
+@pytest.mark.asyncio
+async def test_process_pool_returns_the_same_bytes():
+    offloader = Offloader(min_rows=1, executor="process", processes=1)
+    try:
+        body, encoding = await offloader.run(render_dishes, DISHES, "gzip")
+        assert (gzip.decompress(body), encoding) == (dump_dishes(DISHES), "gzip")
+        assert await offloader.run(functools.partial(render_dishes, DISHES[:1])) == render_dishes(DISHES[:1])
+    finally:
+        offloader.shutdown()
+
+    with pytest.raises(ValueError):
+        Offloader(executor="fork")
+
+
+@pytest.mark.asyncio
+async def test_unpicklable_work_runs_on_the_shared_thread_pool():
+    # A lock cannot be pickled to a worker process
+    lock = threading.Lock()
+
+    def work(held):
+        with held:
+            return threading.current_thread()
+
+    for executor in ("thread", "process"):
+        offloader = Offloader(executor=executor, threads=1)
+        try:
+            thread = await offloader.run_in_thread(work, lock)
+            assert thread.name.startswith("offload")
+            if executor == "thread":
+                # Rendering and thread-only work take turns on the same OFFLOAD_THREADS threads
+                assert await offloader.run(threading.current_thread) is thread
+        finally:
+            offloader.shutdown()
@@ -0,0 +1,58 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import TEST_DB_URL
+from app.tools.profiling import ProfileStore, ProfilingMiddleware
+
+
+def create_app(store: ProfileStore, sample_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, token="secret", sample_rate=sample_rate, store=store)
+    engine = create_async_engine(TEST_DB_URL)
+
+    @app.get("/slow")
+    async def slow():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_sleep(0.05)"))
+        return {"ok": True}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_profile_is_attached_with_database_time_or_stored(tmp_path):
+    store = ProfileStore(str(tmp_path), keep=1)
+    app = create_app(store)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        response = await client.get("/slow", headers={"X-Admin-Token": "secret", "X-Profile": "attach"})
+        assert response.headers["x-profile-status"] == "200"
+        assert "attachment" in response.headers["content-disposition"]
+        summary = response.text.splitlines()[0]
+        assert summary.startswith("GET /slow -> 200") and "in 1 statements" in summary
+        database_ms = float(summary.split("database ")[1].split(" ms")[0])
+        assert database_ms >= 50
+
+        # A wrong token is served normally, without profiling
+        response = await client.get("/slow", headers={"X-Admin-Token": "wrong", "X-Profile": "attach"})
+        assert response.json() == {"ok": True} and "x-profile-id" not in response.headers
+
+        for _ in range(2):
+            response = await client.get("/slow", headers={"X-Admin-Token": "secret", "X-Profile": "1"})
+            assert response.json() == {"ok": True}
+        profile_id = response.headers["x-profile-id"]
+        assert [profile["id"] for profile in store.list()] == [profile_id]
+        assert open(store.path(profile_id, "txt")).readline().startswith("GET /slow -> 200")
+        assert store.path("../../etc/passwd", "txt") is None
+
+
+@pytest.mark.asyncio
+async def test_sampled_requests_are_stored(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    app = create_app(store, sample_rate=1.0)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        response = await client.get("/slow")
+    assert response.json() == {"ok": True}
+    assert [profile["id"] for profile in store.list()] == [response.headers["x-profile-id"]]
@@ -0,0 +1,110 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import kitchen_queue
+from app.tools.admission import AdmissionController
+from app.tools.rate_limit import LocalRateLimitStore, RateLimiter, SharedRateLimitStore
+from app.tools.resp_server import RespServer
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_rejects_with_retry_after():
+    limiter = RateLimiter("table", rate=1, burst=3, store=LocalRateLimitStore())
+    for _ in range(3):
+        await limiter.check("1:5")
+    with pytest.raises(HTTPException) as error:
+        await limiter.check("1:5")
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "1"
+
+    # Other tables have their own bucket
+    await limiter.check("1:6")
+
+
+@pytest.mark.asyncio
+async def test_pruning_keeps_buckets_refilling_at_their_own_rate():
+    store = LocalRateLimitStore(max_keys=1)
+    slow = RateLimiter("table", rate=0.01, burst=1, store=store)
+    fast = RateLimiter("ip", rate=1000, burst=1, store=store)
+    await slow.check("1:5")
+    await asyncio.sleep(0.01)
+    # Pruned with the fast limiter's rate, the slow bucket would look full again and be dropped
+    await fast.check("10.0.0.1")
+    with pytest.raises(HTTPException):
+        await slow.check("1:5")
+
+
+@pytest.mark.asyncio
+async def test_shared_store_limits_across_workers():
+    server = RespServer()
+    await server.start(port=0)
+    url = f"redis://127.0.0.1:{server.port}/0"
+    workers = [RateLimiter("ip", rate=1, burst=2, store=SharedRateLimitStore(url)) for _ in range(2)]
+    try:
+        await workers[0].check("10.0.0.1")
+        await workers[1].check("10.0.0.1")
+        with pytest.raises(HTTPException):
+            await workers[0].check("10.0.0.1")
+    finally:
+        for worker in workers:
+            await worker.store.client.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_admission_sheds_when_queue_is_full():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.slot():
+            await release.wait()
+
+    async def wait_in_queue():
+        async with admission.slot():
+            pass
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(wait_in_queue())
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as error:
+        async with admission.slot():
+            pass
+    assert error.value.status_code == 503
+    assert "Retry-After" in error.value.headers
+
+    # The queued request times out as well
+    with pytest.raises(HTTPException):
+        await queued
+    release.set()
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_kitchen_long_poll_holds_no_slot_while_waiting(monkeypatch):
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=0.05)
+
+    @asynccontextmanager
+    async def admitted_session():
+        async with admission.slot():
+            yield None
+
+    async def no_changes(session, restaurant_id, cursor, limit):
+        return []
+
+    monkeypatch.setattr(kitchen_queue, "admitted_session", admitted_session)
+    monkeypatch.setattr(kitchen_queue, "get_basket_changes", no_changes)
+    monkeypatch.setattr(kitchen_queue, "KITCHEN_POLL_INTERVAL", 0.01)
+
+    poll = asyncio.create_task(kitchen_queue.get_kitchen_changes(restaurant_id=1, cursor=7, wait=0.2, limit=100))
+    await asyncio.sleep(0.05)
+    # With no queue, this would be shed if the waiting poll held the only slot
+    async with admission.slot():
+        pass
+    response = await poll
+    assert response.body == b'{"cursor":7,"baskets":[]}'
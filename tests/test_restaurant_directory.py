@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from app.tools.restaurant_directory import DirectoryEntry, RestaurantDirectory
+
+
+def make_directory():
+    directory = RestaurantDirectory()
+    directory.sync([
+        DirectoryEntry(1, "Blue Lagoon Cafe", Decimal("4.2"), None, "USD"),
+        DirectoryEntry(2, "Cafe Roma", Decimal("4.8"), None, "EUR"),
+        DirectoryEntry(3, "Sushi Bar", Decimal("3.9"), None, "USD"),
+        DirectoryEntry(4, "Romantic  Bistro", None, None, "USD"),
+    ])
+    return directory
+
+def test_search_substring_sorted_by_rating():
+    total, entries = make_directory().search("CAFE")
+    assert total == 2
+    assert [entry.id for entry in entries] == [2, 1]
+
+def test_search_short_query_and_name_sort():
+    total, entries = make_directory().search("ro", sort="name")
+    assert total == 2
+    assert [entry.id for entry in entries] == [2, 4]
+
+def test_search_normalizes_whitespace():
+    total, entries = make_directory().search("romantic bistro")
+    assert [entry.id for entry in entries] == [4]
+
+def test_search_paging():
+    directory = make_directory()
+    total, entries = directory.search("", offset=1, limit=2)
+    assert total == 4
+    assert [entry.id for entry in entries] == [1, 3]
+
+def test_sync_applies_only_differences():
+    directory = make_directory()
+    upserted, removed = directory.sync([
+        DirectoryEntry(1, "Blue Lagoon Cafe", Decimal("4.2"), None, "USD"),
+        DirectoryEntry(2, "Trattoria Roma", Decimal("4.8"), None, "EUR"),
+        DirectoryEntry(3, "Sushi Bar", Decimal("3.9"), None, "USD"),
+    ])
+    assert (upserted, removed) == (1, 1)
+    assert directory.search("cafe")[0] == 1
+    assert [entry.id for entry in directory.search("trat")[1]] == [2]
+    assert directory.search("bistro") == (0, [])
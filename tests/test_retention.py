@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import TEST_DB_URL
+from app.database.models import Base
+from app.database.schemas import OrderRequest
+from app.tools.retention import add_months, ensure_partitions, expire_partitions, list_partitions
+
+
+def test_add_months():
+    assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 1), -13) == date(2022, 12, 1)
+
+
+def test_order_times_far_from_the_server_clock_are_rejected():
+    order = {"restaurant_id": 1, "table_id": 1, "order_items": []}
+    OrderRequest(**order, order_datetime=datetime.now() - timedelta(hours=1))
+    for moment in (datetime(9999, 12, 31), datetime.now() - timedelta(days=30)):
+        with pytest.raises(ValidationError):
+            OrderRequest(**order, order_datetime=moment)
+
+
+@pytest.mark.asyncio
+async def test_rows_move_to_monthly_partitions_which_are_archived_when_old():
+    engine = create_async_engine(TEST_DB_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with engine.connect() as conn:
+            # Partition DDL is transactional; everything is rolled back at the end
+            transaction = await conn.begin()
+            # A month of the retention period, one long past and one no partition could even be created for
+            for moment in ("2039-03-05 12:00", "2019-03-05 12:00", "9999-12-31 12:00"):
+                await conn.execute(text(
+                    "INSERT INTO baskets (id, restaurant_id, table_id, order_datetime, total_cost, currency, status) "
+                    "VALUES (gen_random_uuid(), 1, 1, :moment, 10, 'USD', 'served')"
+                ), {"moment": datetime.fromisoformat(moment)})
+
+            created = await ensure_partitions(conn, today=date(2040, 1, 15), months_ahead=1)
+            assert "baskets_y2039m03" in created
+            assert {"baskets_y2040m01", "baskets_y2040m02", "waiter_call_events_y2040m02"} <= set(created)
+            assert not {"baskets_y2019m03", "baskets_y9999m12"} & set(created)
+            moved = await conn.execute(text("SELECT count(*) FROM baskets_y2039m03"))
+            assert moved.scalar_one() == 1
+            # The outliers stay in the DEFAULT partition
+            left = await conn.execute(text(
+                "SELECT count(*) FROM baskets_default WHERE order_datetime < '2020-01-01' OR order_datetime > '9999-01-01'"
+            ))
+            assert left.scalar_one() == 2
+
+            expired = await expire_partitions(conn, today=date(2041, 6, 15), archive=True)
+            assert "baskets_y2039m03" in expired
+            assert "baskets_y2040m01" not in expired
+            assert date(2039, 3, 1) not in await list_partitions(conn, "baskets")
+            archived = await conn.execute(text("SELECT count(*) FROM archive.baskets_y2039m03"))
+            assert archived.scalar_one() == 1
+
+            # A late row of the archived month joins the archived table, even with its columns in another order
+            await conn.execute(text("ALTER TABLE archive.baskets_y2039m03 DROP COLUMN waiter"))
+            await conn.execute(text("ALTER TABLE archive.baskets_y2039m03 ADD COLUMN waiter VARCHAR"))
+            await conn.execute(text(
+                "INSERT INTO baskets (id, restaurant_id, table_id, order_datetime, total_cost, currency, status, waiter) "
+                "VALUES (gen_random_uuid(), 1, 1, '2039-03-20 12:00', 10, 'USD', 'served', 'Ann')"
+            ))
+            await ensure_partitions(conn, today=date(2040, 1, 15), months_ahead=1)
+            assert "baskets_y2039m03" in await expire_partitions(conn, today=date(2041, 6, 15), archive=True)
+            archived = await conn.execute(text("SELECT waiter FROM archive.baskets_y2039m03 ORDER BY order_datetime"))
+            assert archived.scalars().all() == [None, "Ann"]
+            await transaction.rollback()
+    finally:
+        await engine.dispose()
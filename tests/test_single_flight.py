@@ -0,0 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.tools.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_run_once():
+    opened = []
+
+    @asynccontextmanager
+    async def session_factory(bind):
+        opened.append(f"{bind}{len(opened)}")
+        yield opened[-1]
+
+    flight = SingleFlight(session_factory)
+    calls = []
+
+    @flight.coalesce
+    async def load(session, restaurant_id, category_id=None):
+        calls.append((session, restaurant_id, category_id))
+        await asyncio.sleep(0.01)
+        return [restaurant_id]
+
+    work, test = SimpleNamespace(bind="work"), SimpleNamespace(bind="test")
+    results = await asyncio.gather(
+        load(work, 1), load(work, 1), load(work, restaurant_id=1, category_id=None), load(work, 2), load(test, 1)
+    )
+    assert results == [[1], [1], [1], [2], [1]]
+    # Each shared call runs on a session of its own on the callers' bind, never on a caller's session
+    assert sorted(calls) == [("test2", 1, None), ("work0", 1, None), ("work1", 2, None)]
+
+    # Finished calls are not cached
+    await load(work, 1)
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return "menu"
+
+    first = asyncio.create_task(flight.do("key", slow))
+    second = asyncio.create_task(flight.do("key", slow))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "menu"
@@ -0,0 +1,105 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+
+from app.tools.resp import COMPARE_AND_DELETE
+from app.tools.resp_server import RespServer
+from app.tools.table_sessions import (LocalTableSessionStore, SharedTableSessionStore, TableSessions, apply_changes,
+                                      create_store, empty_draft, order_items, reprice)
+
+DISHES = {
+    1: {"id": 1, "price": Decimal("10.00"), "currency": "USD", "extra": {"1": ["Cheese", Decimal("0.50")]}},
+    2: {"id": 2, "price": Decimal("3.25"), "currency": "USD", "extra": None},
+}
+
+
+@pytest_asyncio.fixture
+async def workers():
+    """Two workers' table sessions sharing one stand-in server."""
+    server = RespServer()
+    await server.start(port=0)
+    sessions = [TableSessions(SharedTableSessionStore(f"redis://127.0.0.1:{server.port}/0")) for _ in range(2)]
+    yield sessions
+    for worker in sessions:
+        await worker.store.client.close()
+    await server.stop()
+
+
+def test_changes_update_the_lines_and_the_running_total():
+    draft = apply_changes(empty_draft(7, 15), [{"dish_id": 1, "extras": ["1"], "quantity": 2},
+                                               {"dish_id": 2, "extras": [], "quantity": 1}], DISHES)
+    draft = apply_changes(draft, [{"dish_id": 1, "extras": ["1"], "quantity": -1},
+                                  {"dish_id": 2, "extras": [], "quantity": -5},
+                                  {"dish_id": 1, "extras": [], "quantity": 1}], DISHES)
+
+    assert draft["revision"] == 2 and draft["currency"] == "USD"
+    assert {key: line["quantity"] for key, line in draft["lines"].items()} == {"1:1": 1, "1:": 1}
+    assert draft["total"] == "20.50"
+    assert sorted(item["dish_price"] for item in order_items(draft)) == ["10.00", "10.00"]
+
+    with pytest.raises(HTTPException) as error:
+        apply_changes(draft, [{"dish_id": 3, "extras": [], "quantity": 1}], DISHES)
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException) as error:
+        apply_changes(draft, [{"dish_id": 2, "extras": ["1"], "quantity": 1}], DISHES)
+    assert error.value.status_code == 422
+
+
+def test_reprice_updates_changed_prices_and_drops_removed_dishes():
+    draft = apply_changes(empty_draft(7, 15), [{"dish_id": 1, "extras": ["1"], "quantity": 2},
+                                               {"dish_id": 2, "extras": [], "quantity": 1}], DISHES)
+    assert reprice(draft, DISHES) is draft
+
+    menu = {1: {**DISHES[1], "price": Decimal("11.00")}}
+    repriced = reprice(draft, menu)
+    assert repriced["revision"] == draft["revision"] + 1
+    assert list(repriced["lines"]) == ["1:1"] and repriced["total"] == "23.00"
+
+    menu = {1: {**DISHES[1], "extra": None}, 2: DISHES[2]}
+    assert list(reprice(draft, menu)["lines"]) == ["2:"]
+
+
+def test_local_drafts_refuse_several_workers():
+    with pytest.raises(ValueError):
+        create_store("local", workers=4)
+    assert isinstance(create_store("local", workers=1), LocalTableSessionStore)
+
+
+@pytest.mark.asyncio
+async def test_outdated_revision_is_rejected():
+    sessions = TableSessions(LocalTableSessionStore())
+    draft = await sessions.change(7, 15, [{"dish_id": 2, "extras": [], "quantity": 1}], DISHES, revision=0)
+    with pytest.raises(HTTPException) as error:
+        await sessions.change(7, 15, [{"dish_id": 2, "extras": [], "quantity": 1}], DISHES, revision=0)
+    assert error.value.status_code == 409
+    assert (await sessions.get(7, 15)) == draft
+
+
+@pytest.mark.asyncio
+async def test_shared_drafts_apply_concurrent_changes_and_are_taken_once(workers):
+    await asyncio.gather(*(workers[i % 2].change(7, 15, [{"dish_id": 2, "extras": [], "quantity": 1}], DISHES)
+                           for i in range(20)))
+    draft = await workers[1].get(7, 15)
+    assert draft["lines"]["2:"]["quantity"] == 20 and draft["total"] == "65.00" and draft["revision"] == 20
+
+    taken = await asyncio.gather(workers[0].take(7, 15), workers[1].take(7, 15))
+    assert sorted(len(draft["lines"]) for draft in taken) == [0, 1]
+
+    await workers[0].restore(draft)
+    assert (await workers[1].get(7, 15)) == draft
+
+
+@pytest.mark.asyncio
+async def test_lock_is_released_only_by_its_holder(workers):
+    client = workers[0].store.client
+    await workers[0].change(7, 15, [{"dish_id": 2, "extras": [], "quantity": 1}], DISHES)
+    assert await client.command("GET", "table_session_lock:7:15") is None
+
+    # A lock taken over by another worker after it expired is not released by the first holder
+    await client.command("SET", "table_session_lock:7:15", "theirs")
+    assert await client.command("EVAL", COMPARE_AND_DELETE, 1, "table_session_lock:7:15", "mine") == 0
+    assert await client.command("GET", "table_session_lock:7:15") == b"theirs"
+    assert await client.command("EVAL", COMPARE_AND_DELETE, 1, "table_session_lock:7:15", "theirs") == 1